@@ -0,0 +1,330 @@
+"""动画输出（GIF/WEBP）：滚动、打字机和逐行淡入
+
+只排版一次，各帧在工作进程中按同一份排版并行生成覆盖率遮罩（行图块按位置粘贴）；
+所有帧共用覆盖率画布的调色板。GIF逐帧流式写入，每帧只保存与上一帧不同的矩形区域，
+与上一帧相同的帧合并为前一帧的延时；WEBP交给libwebp的动画编码器，它同样只编码变化区域。
+"""
+from collections import deque
+from PIL import Image, ImageChops
+import struct
+import time
+import io
+import os
+
+import encoder
+import line_tiles
+import renderer
+import strips
+
+# 动画类型
+ANIMATION_TYPES = ["滚动", "打字机", "逐行淡入"]
+
+# 命令行参数对应的动画类型
+ANIMATION_ARGS = {"scroll": "滚动", "typewriter": "打字机", "fade": "逐行淡入"}
+
+# 支持动画的格式
+ANIMATION_FORMATS = {"GIF", "WEBP"}
+
+# 默认时长（秒）和帧率；GIF延时以1/100秒为单位，浏览器把小于2/100秒的延时当作1/10秒，帧率上限为50
+DEFAULT_DURATION = 4.0
+DEFAULT_FPS = 20
+MAX_FPS = 50
+
+# 打字机和淡入效果在最后停留的时长比例（停留的帧与前一帧相同，写入时合并，不增加文件大小）
+HOLD_FRACTION = 0.25
+
+# 未指定编码档位时动画使用的档位：有损WEBP在文字边缘产生大量噪点，动画比无损大数倍且更慢
+DEFAULT_PROFILE = {"WEBP": "无损"}
+
+# 动画WEBP不强制插入关键帧，每帧都只编码变化的区域（文字动画的关键帧比变化区域大得多）
+WEBP_ANIMATION_OPTIONS = {"kmin": 0, "kmax": 0}
+
+# 每个工作进程任务生成的帧数
+FRAMES_PER_TASK = 8
+
+# 工作进程的行图块缓存（打字机效果的每个前缀都是一个图块）
+_tiles = line_tiles.LineTileCache(maxsize=2048)
+
+
+def frame_count(duration=DEFAULT_DURATION, fps=DEFAULT_FPS):
+    """按时长和帧率（限制在1到MAX_FPS）计算帧数，至少两帧"""
+    return max(2, int(round(duration * max(1, min(MAX_FPS, int(fps))))))
+
+
+def webp_buffer_bytes(width, height, frames):
+    """动画WEBP暂存全部帧的内存估计：libwebp的动画编码器要一次拿到所有帧，每帧是每像素1字节的P模式图片"""
+    return width * height * frames
+
+
+def check_options(bg_transparent=False, text_effects=None, format_type=None, width=None, height=None,
+                  duration=DEFAULT_DURATION, fps=DEFAULT_FPS):
+    """动画帧不合成透明背景和文字效果，与动画同时指定时抛出ValueError，而不是静默忽略
+
+    指定WEBP格式和尺寸时，暂存全部帧的内存估计超过内存预算（strips.memory_budget()）也抛出ValueError；
+    GIF逐帧流式写入，不受此限制。
+    """
+    if bg_transparent:
+        raise ValueError("动画不支持透明背景")
+    if text_effects is not None and text_effects.enabled:
+        raise ValueError("动画不支持文字效果（描边、阴影、渐变）")
+    if format_type == "WEBP" and width and height:
+        needed = webp_buffer_bytes(width, height, frame_count(duration, fps))
+        budget = strips.memory_budget()
+        if needed > budget:
+            raise ValueError(f"WEBP动画要在内存中暂存全部帧（约{needed // (1024 * 1024)}MB），超过内存预算"
+                             f"{budget // (1024 * 1024)}MB：请缩短时长、降低帧率或分辨率，改用GIF（逐帧写入），"
+                             f"或用 --memory-budget / TEXT2PIC_MEMORY_MB 提高预算")
+
+
+class Animation:
+    """动画文档：只保存排版结果，帧在保存时生成"""
+
+    def __init__(self, text, width, height, format_type, text_color, bg_color, font_size_param,
+                 kind=ANIMATION_TYPES[0], duration=DEFAULT_DURATION, fps=DEFAULT_FPS, trace=None):
+        if format_type not in ANIMATION_FORMATS:
+            raise ValueError(f"动画只支持GIF和WEBP格式: {format_type}")
+        if kind not in ANIMATION_TYPES:
+            raise ValueError(f"不支持的动画类型: {kind}")
+        if not duration or duration <= 0:
+            raise ValueError("动画时长必须大于0")
+        self.width = width
+        self.height = height
+        self.format_type = format_type
+        self.text_color, self.bg_color = renderer._check_colors(text_color, bg_color, trace)
+        self.kind = kind
+        self.fps = max(1, min(MAX_FPS, int(fps)))
+        self.frame_count = frame_count(duration, self.fps)
+
+        # 滚动效果要排版全部文字，其他效果只需要画布内可见的行
+        max_height = None if kind == "滚动" else height
+        self.text_layout = renderer.compute_layout(text, width, font_size_param, trace, max_height)
+        self.start_y = max(renderer.MARGIN, (height - self.text_layout.total_height) / 2)
+        # 每行的 (文字, 左边x)：与静态渲染相同的水平居中，打字机效果的前缀也从整行的左边开始
+        self.lines = [(line, max(renderer.MARGIN, (width - line_width) / 2))
+                      for line, line_width in self.text_layout.lines]
+
+    @property
+    def frame_duration(self):
+        """每帧的时长（毫秒）"""
+        return 1000 / self.fps
+
+    def _progress(self, index):
+        """第index帧的进度（0到1）；打字机和淡入在最后停留一段时间"""
+        if self.kind == "滚动":
+            return index / (self.frame_count - 1)
+        active = max(1, int((self.frame_count - 1) * (1 - HOLD_FRACTION)))
+        return min(1.0, index / active)
+
+    def placements(self, index):
+        """第index帧要绘制的行：[(行文字, x, y, 覆盖率), ...]，覆盖率255为完全不透明"""
+        progress = self._progress(index)
+        advance = self.text_layout.line_advance
+        if self.kind == "滚动":
+            # 文字块从画布下方进入，直到完全移出上方
+            top = self.height - progress * (self.height + self.text_layout.total_height)
+            result = []
+            for i, (line, x) in enumerate(self.lines):
+                y = top + i * advance
+                if -advance < y < self.height:
+                    result.append((line, x, y, 255))
+            return result
+
+        if self.kind == "打字机":
+            remaining = int(round(progress * sum(len(line) for line, _ in self.lines)))
+            result = []
+            for i, (line, x) in enumerate(self.lines):
+                if remaining <= 0:
+                    break
+                result.append((line[:remaining], x, self.start_y + i * advance, 255))
+                remaining -= len(line)
+            return result
+
+        # 逐行淡入：每行用 1/(行数+1) 的进度从透明变为不透明，依次开始
+        count = len(self.lines)
+        result = []
+        for i, (line, x) in enumerate(self.lines):
+            opacity = min(1.0, max(0.0, progress * (count + 1) - i))
+            if opacity > 0:
+                result.append((line, x, self.start_y + i * advance, int(round(opacity * 255))))
+        return result
+
+    def render_frame(self, index):
+        """生成第index帧的覆盖率遮罩（"L"模式，像素值即共用调色板的下标）"""
+        frame = Image.new("L", (self.width, self.height), 0)
+        font = self.text_layout.font
+        for line, x, y, coverage in self.placements(index):
+            if not line.strip():
+                continue
+            mask, bbox = _tiles.get_tile(font, line)
+            if mask is None:
+                continue
+            frame.paste(coverage, (int(round(x)) + bbox[0], int(round(y)) + bbox[1]), mask)
+        return frame
+
+    def palette(self):
+        """所有帧共用的调色板：第i个颜色是背景色和文字颜色按i/255混合的结果"""
+        return renderer.mask_palette(self.text_color, self.bg_color, False)[0]
+
+    def iter_chunks(self, func, workers=None):
+        """把帧按FRAMES_PER_TASK分段交给func(动画, 起始帧, 结束帧)，按帧序逐个产出它返回的结果
+
+        workers大于1时在工作进程中并行执行，同时在途的任务数有上限，内存不随帧数增长。
+        """
+        workers = workers or os.cpu_count() or 1
+        ranges = [(start, min(self.frame_count, start + FRAMES_PER_TASK))
+                  for start in range(0, self.frame_count, FRAMES_PER_TASK)]
+        if workers == 1 or len(ranges) == 1:
+            for start, stop in ranges:
+                yield from func(self, start, stop)
+            return
+
+        # 进程池只在并行生成帧时导入：界面启动时导入本模块不必加载multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            next_range = 0
+            while next_range < len(ranges) or pending:
+                # 保持最多 2×workers 个任务在途
+                while next_range < len(ranges) and len(pending) < workers * 2:
+                    pending.append(executor.submit(func, self, *ranges[next_range]))
+                    next_range += 1
+                yield from pending.popleft().result()
+
+    def resolve_profile(self, profile=None):
+        """有效的编码档位名称，未指定时使用动画的默认档位"""
+        return encoder.resolve_profile(self.format_type, profile or DEFAULT_PROFILE.get(self.format_type))
+
+    def write(self, fp, profile=None, workers=None, progress_callback=None, should_cancel=None):
+        """生成全部帧并写入二进制文件对象，返回写入的帧数（合并相同的帧之后）
+
+        GIF的每帧在工作进程中与上一帧比较并编码变化的矩形，主进程只按顺序写入；
+        WEBP的帧在工作进程中生成，由libwebp在主进程中编码。
+        """
+        func = _encode_gif_frames if self.format_type == "GIF" else _render_frames
+        profile = self.resolve_profile(profile)
+
+        def frames():
+            for index, item in enumerate(self.iter_chunks(func, workers)):
+                if should_cancel is not None and should_cancel():
+                    raise renderer.RenderCancelled()
+                yield item
+                if progress_callback:
+                    progress_callback((index + 1) / self.frame_count * 100)
+
+        size = (self.width, self.height)
+        if self.format_type == "GIF":
+            return write_gif(fp, frames(), size, self.palette(), self.frame_duration)
+        options = encoder.encoder_options("WEBP", profile)
+        options.update(WEBP_ANIMATION_OPTIONS)
+        return write_webp(fp, frames(), self.palette(), self.frame_duration, options)
+
+    def save(self, filename, profile=None, workers=None, progress_callback=None, should_cancel=None, trace=None):
+        """生成动画并写入文件，返回EncodeResult；trace不为None时记录帧生成和编码的总耗时"""
+        start = time.perf_counter()
+        with open(filename, "wb") as fp:
+            written = self.write(fp, profile, workers, progress_callback, should_cancel)
+        seconds = time.perf_counter() - start
+        size_bytes = os.path.getsize(filename)
+        if trace is not None:
+            trace.stages["animation"] = trace.stages.get("animation", 0.0) + seconds
+            trace.info["output_bytes"] = size_bytes
+            trace.count("frames", self.frame_count)
+            trace.count("frames_written", written)
+        return encoder.EncodeResult(filename, size_bytes, seconds, self.resolve_profile(profile))
+
+
+def _render_frames(animation, start, stop):
+    """工作进程：生成第start到stop-1帧的覆盖率遮罩"""
+    return [animation.render_frame(index) for index in range(start, stop)]
+
+
+def _encode_gif_frames(animation, start, stop):
+    """工作进程：生成第start到stop-1帧，返回每帧 (与上一帧不同的矩形, GIF图像数据)，与上一帧相同时为 (None, None)
+
+    上一段的最后一帧在这里重新生成一次用于比较（生成一帧只是粘贴行图块，比传递整帧便宜）。
+    """
+    previous = animation.render_frame(start - 1) if start > 0 else None
+    result = []
+    for index in range(start, stop):
+        frame = animation.render_frame(index)
+        if previous is None:
+            box = (0, 0) + frame.size
+        else:
+            box = ImageChops.difference(previous, frame).getbbox()
+        result.append((box, _gif_image_data(frame.crop(box)) if box is not None else None))
+        previous = frame
+    return result
+
+
+def _gif_image_data(image):
+    """用Pillow把"L"图块编码为单帧GIF，取出其中的LZW数据（像素值即调色板下标，保持不变）"""
+    buffer = io.BytesIO()
+    image.save(buffer, "GIF", optimize=False, interlace=False)
+    data = buffer.getvalue()
+    pos = 13
+    if data[10] & 0x80:
+        pos += 3 << ((data[10] & 7) + 1)
+    while data[pos] == 0x21:
+        # 跳过扩展块
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    # 跳过图像描述符，去掉结尾的0x3B
+    return data[pos + 10:-1]
+
+
+def write_gif(fp, frames, size, palette, frame_duration, loop=0):
+    """流式写入GIF：共用一个256色全局调色板，每帧只写与上一帧不同的矩形（不清除上一帧），返回写入的帧数
+
+    frames按帧序产出 (矩形, LZW数据)，矩形为None表示与上一帧相同，合并为上一帧的延时。
+    """
+    width, height = size
+    fp.write(b"GIF89a")
+    fp.write(struct.pack("<HHBBB", width, height, 0xF7, 0, 0))  # 有全局调色板，256色
+    fp.write(bytes(palette[:768]).ljust(768, b"\0"))
+    fp.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\0")
+
+    def write_frame(box, data, duration):
+        left, top, right, bottom = box
+        # 图形控制扩展：处置方式1（保留），延时以1/100秒为单位
+        fp.write(b"\x21\xf9\x04\x04" + struct.pack("<H", max(2, int(round(duration / 10)))) + b"\0\0")
+        fp.write(b"\x2c" + struct.pack("<HHHHB", left, top, right - left, bottom - top, 0))
+        fp.write(data)
+
+    count = 0
+    pending = None
+    for box, data in frames:
+        if box is None:
+            pending[2] += frame_duration
+            continue
+        if pending is not None:
+            write_frame(*pending)
+            count += 1
+        pending = [box, data, frame_duration]
+    write_frame(*pending)
+    fp.write(b";")
+    return count + 1
+
+
+def write_webp(fp, frames, palette, frame_duration, options):
+    """写入动画WEBP（libwebp的动画编码器只编码每帧变化的区域），返回写入的帧数
+
+    帧以共用调色板的P模式图片暂存（每像素1字节），连续相同的帧合并为一帧，编码时才展开为RGB。
+    """
+    images, durations = [], []
+    for frame in frames:
+        if images and ImageChops.difference(images[-1], frame).getbbox() is None:
+            durations[-1] += frame_duration
+            continue
+        images.append(frame)
+        durations.append(frame_duration)
+    for image in images:
+        image.putpalette(palette)
+    durations = [int(round(d)) for d in durations]
+    if len(images) == 1:
+        # 只有一帧时Pillow按静态图片写入
+        images.append(images[0])
+        durations = [durations[0] // 2, durations[0] - durations[0] // 2]
+    images[0].save(fp, "WEBP", save_all=True, append_images=images[1:], duration=durations, loop=0, **options)
+    return len(images)
@@ -0,0 +1,158 @@
+"""批量转换：把文本文件并行渲染为图片（每个CPU核心一个工作进程）"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+import animation
+import export
+import font_index
+import instrumentation
+import presets
+import render_cache
+import renderer
+import strips
+
+# 命令行页面模式参数对应的界面选项
+PAGE_MODE_ARGS = {"fixed": "固定尺寸", "auto": "自动高度", "pages": "分页"}
+PAGE_EXPORT_ARGS = {"sequence": "图片序列", "tiff": "TIFF", "pdf": "PDF"}
+
+
+def collect_text_files(paths):
+    """展开输入路径（目录中的.txt文件或单个文件），返回排序后的文件列表"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path) and name.lower().endswith(".txt"):
+                    files.append(full_path)
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise ValueError(f"输入路径不存在: {path}")
+    return files
+
+
+def apply_process_options(options):
+    """工作进程不继承主进程中修改过的模块变量，按选项重新设置"""
+    instrumentation.set_verbose(options.get("verbose", False))
+    instrumentation.set_timings_dir(options.get("timings_dir"))
+    if "cache_dir" in options:
+        render_cache.set_cache_dir(options["cache_dir"])
+    if options.get("memory_budget"):
+        strips.set_memory_budget(options["memory_budget"])
+
+
+def render_file(path, output_dir, options):
+    """渲染单个文本文件并保存，返回输出文件路径（在工作进程中执行）"""
+    apply_process_options(options)
+
+    with open(path, "r", encoding=options.get("encoding", "utf-8")) as f:
+        text = f.read().strip()
+    if not text:
+        raise ValueError(f"文件内容为空: {path}")
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return render_text(text, output_dir, name, options)
+
+
+def render_text(text, output_dir, name, options):
+    """渲染一段文字并保存为 output_dir/name.扩展名，返回输出文件路径"""
+    format_type = options["format_type"]
+    bg_transparent = (format_type == "PNG" and options["bg_transparent"])
+    filename = os.path.join(output_dir, name + renderer.FORMAT_EXTENSIONS[format_type])
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    page_mode = options.get("page_mode", "固定尺寸")
+    trace = instrumentation.RenderTrace(os.path.basename(name))
+
+    if options.get("all_presets"):
+        # 排版一次，按全部预设分辨率依次光栅化（批量模式已按文件并行）
+        results = presets.render_presets(text, output_dir, name, options, workers=1, trace=trace)
+        failed = [f"{width}x{height}: {error}" for width, height, _, error in results if error]
+        if failed:
+            raise ValueError("; ".join(failed))
+        return results[0][2]
+
+    if options.get("animation"):
+        animation.check_options(options.get("bg_transparent"), options.get("effects"), format_type, options["width"],
+                                options["height"], options.get("animation_duration", animation.DEFAULT_DURATION),
+                                options.get("animation_fps", animation.DEFAULT_FPS))
+        # 动画只排版一次，帧在本进程内顺序生成（批量模式已按文件并行）
+        clip = animation.Animation(text, options["width"], options["height"], format_type, options["text_color"],
+                                   options["bg_color"], options["font_size"], options["animation"],
+                                   options.get("animation_duration", animation.DEFAULT_DURATION),
+                                   options.get("animation_fps", animation.DEFAULT_FPS), trace)
+        clip.save(filename, options.get("profile"), workers=1, trace=trace)
+        trace.export()
+        return filename
+
+    if page_mode == "分页":
+        document = renderer.PagedDocument(text, options["width"], options["height"], format_type,
+                                          options["text_color"], options["bg_color"], bg_transparent,
+                                          options["font_size"], trace=trace, effects=options.get("effects"))
+        # 批量模式已按文件并行，单个文件内的页面在本进程内顺序生成
+        export_type = options.get("page_export", "图片序列")
+        if export_type == "TIFF":
+            filename = os.path.join(output_dir, name + ".tif")
+        elif export_type == "PDF":
+            filename = os.path.join(output_dir, name + ".pdf")
+        with trace.stage("pages"):
+            filenames = export.export_document(document, filename, export_type, workers=1,
+                                               profile=options.get("profile"))
+        trace.export()
+        return filenames[0]
+
+    # 相同参数渲染过时直接复制缓存的编码结果
+    cache = render_cache.get_cache()
+    if cache is not None:
+        key = render_cache.render_key(text, options["width"], options["height"], format_type, options["text_color"],
+                                      options["bg_color"], bg_transparent, options["font_size"], page_mode,
+                                      options.get("profile"), effects=options.get("effects"))
+        with trace.stage("cache"):
+            data = cache.get(key)
+            if data is not None:
+                with open(filename, "wb") as f:
+                    f.write(data)
+        if data is not None:
+            trace.count("cache_hit")
+            trace.export()
+            return filename
+
+    # 超出内存预算的画布逐条渲染并流式写入
+    image = strips.render_or_strips(text, options["width"], options["height"], format_type, options["text_color"],
+                                    options["bg_color"], bg_transparent, options["font_size"],
+                                    auto_height=(page_mode == "自动高度"), trace=trace,
+                                    effects=options.get("effects"))
+    if isinstance(image, strips.StripDocument):
+        image.save(filename, options.get("profile"), trace=trace)
+    else:
+        renderer.save_image(image, filename, format_type, options["bg_color"], options.get("profile"), trace=trace)
+    if cache is not None:
+        cache.put_file(key, filename)
+    trace.export()
+    return filename
+
+
+def run_batch(paths, output_dir, options, workers=None, on_result=None):
+    """并行渲染所有输入文件，返回(成功数, 失败列表)"""
+    files = collect_text_files(paths)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # 先在本进程刷新并保存字体索引，工作进程直接读取，不必各自解析字体文件
+    font_index.get_index().scan()
+
+    succeeded = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(render_file, path, output_dir, options): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                filename = future.result()
+                succeeded += 1
+                if on_result:
+                    on_result(path, filename, None)
+            except Exception as e:
+                failed.append((path, str(e)))
+                if on_result:
+                    on_result(path, None, str(e))
+    return succeeded, failed
@@ -0,0 +1,247 @@
+"""渲染性能基准：无界面运行，记录耗时、峰值内存和输出大小，并与基准文件比较找出性能回退
+
+用法：
+    python bench.py --save bench_baseline.json            # 生成基准文件
+    python bench.py --compare bench_baseline.json         # 与基准比较，有回退时返回码为1
+    python bench.py --sweep quick                         # 只跑少量用例
+    python bench.py --filter startup/                     # 只测启动和导入耗时
+"""
+from multiprocessing import get_context
+import subprocess
+import itertools
+import argparse
+import platform
+import time
+import json
+import sys
+import os
+
+import PIL
+
+import encoder
+import line_tiles
+import preview
+import renderer
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不记录峰值内存
+    resource = None
+
+# 扫描参数
+SWEEPS = {
+    "full": {
+        "resolutions": renderer.PRESET_RESOLUTIONS,
+        "line_counts": [1, 10, 100, 1000, 10000],
+        "font_sizes": [10, 40, 100, 300],
+        "formats": list(renderer.FORMAT_EXTENSIONS),
+    },
+    "quick": {
+        "resolutions": ["1920×1080 (Full HD)", "3840×2160 (4K)"],
+        "line_counts": [1, 100, 1000],
+        "font_sizes": [10, 40, 300],
+        "formats": ["PNG", "JPG"],
+    },
+}
+
+# 启动用例：在新的解释器中导入这些模块并计时；命令行入口不应加载tkinter
+IMPORT_MODULES = ["main", "renderer", "batch", "service", "gui"]
+TKINTER_FREE_MODULES = {"main", "renderer", "batch", "service"}
+
+# 默认的回退判定阈值：耗时增加超过20%且超过5毫秒
+DEFAULT_THRESHOLD = 0.2
+MIN_TIME_DELTA = 0.005
+
+
+def sample_text(line_count):
+    """生成固定内容的测试文字（中英文混合，每次运行都相同）"""
+    return "\n".join(f"第{i}行 The quick brown fox jumps over the lazy dog 0123456789" for i in range(line_count))
+
+
+def build_cases(sweep):
+    """生成用例列表，每个用例是一个参数字典"""
+    config = SWEEPS[sweep]
+    cases = []
+    for resolution, line_count, font_size, format_type in itertools.product(
+            config["resolutions"], config["line_counts"], config["font_sizes"], config["formats"]):
+        transparencies = [False, True] if format_type == "PNG" else [False]
+        for transparent in transparencies:
+            cases.append({"kind": "render", "resolution": resolution, "lines": line_count,
+                          "font_size": font_size, "format": format_type, "transparent": transparent})
+    # 预览：每个分辨率和字号各一次（预览不随格式变化）
+    for resolution, font_size in itertools.product(config["resolutions"], config["font_sizes"]):
+        cases.append({"kind": "preview", "resolution": resolution, "lines": 10,
+                      "font_size": font_size, "format": "PNG", "transparent": False})
+    cases.extend({"kind": "import", "module": module} for module in IMPORT_MODULES)
+    if has_display():
+        cases.append({"kind": "first_frame"})
+    return cases
+
+
+def has_display():
+    """是否可以打开窗口（Linux下需要DISPLAY或WAYLAND_DISPLAY）"""
+    if sys.platform.startswith("linux"):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
+
+
+def case_id(case):
+    """用例的唯一名称，用作基准文件中的键"""
+    if case["kind"] == "import":
+        return f"startup/import/{case['module']}"
+    if case["kind"] == "first_frame":
+        return "startup/first_frame"
+    width, height = renderer.parse_resolution(case["resolution"])
+    suffix = "-transparent" if case["transparent"] else ""
+    return f"{case['kind']}/{width}x{height}/lines{case['lines']}/size{case['font_size']}/{case['format']}{suffix}"
+
+
+def peak_rss_kb():
+    """当前进程的峰值常驻内存（KB）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS单位为字节
+
+
+def run_python(code):
+    """在新的解释器中执行代码，返回最后一行输出解析出的JSON"""
+    output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_startup_case(case, repeat=1):
+    """启动用例：导入耗时（或界面首帧耗时），取多次运行中的最短耗时"""
+    if case["kind"] == "import":
+        code = ("import time\nstart = time.perf_counter()\n"
+                f"import {case['module']}\n"
+                "elapsed = time.perf_counter() - start\n"
+                "import sys, json\nprint(json.dumps({'seconds': elapsed, 'tkinter': 'tkinter' in sys.modules}))")
+    else:
+        code = "import main\nmain.main(exit_after_startup=True)"
+    best = None
+    tkinter_loaded = None
+    for _ in range(repeat):
+        data = run_python(code)
+        if case["kind"] == "import":
+            elapsed, tkinter_loaded = data["seconds"], data["tkinter"]
+        else:
+            elapsed = data["info"]["startup_seconds"]
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak = peak // 1024 if sys.platform == "darwin" else peak
+    result = {"wall": round(best, 6), "peak_rss_kb": peak, "output_bytes": None}
+    if tkinter_loaded is not None:
+        result["tkinter"] = tkinter_loaded
+    return result
+
+
+def run_case(case, repeat=1):
+    """在独立进程中执行一个用例，返回测量结果（取多次运行中的最短耗时）"""
+    if case["kind"] in ("import", "first_frame"):
+        return run_startup_case(case, repeat)
+    width, height = renderer.parse_resolution(case["resolution"])
+    text = sample_text(case["lines"])
+    best = None
+    output_bytes = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if case["kind"] == "preview":
+            image = preview.render_preview(text, width, height, case["format"], (0, 0, 0), (255, 255, 255),
+                                           case["transparent"], case["font_size"],
+                                           line_tiles.IncrementalCompositor())
+            output_bytes = None
+        else:
+            image = renderer.render_text_image(text, width, height, case["format"], (0, 0, 0), (255, 255, 255),
+                                               case["transparent"], case["font_size"])
+            output_bytes = len(encoder.encode_image(image, case["format"]))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"wall": round(best, 6), "peak_rss_kb": peak_rss_kb(), "output_bytes": output_bytes}
+
+
+def run_suite(cases, repeat=1, on_result=None):
+    """逐个用例运行（每个用例一个新进程，峰值内存互不影响），返回 {用例名: 结果}"""
+    results = {}
+    context = get_context("spawn")
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        for case in cases:
+            result = pool.apply(run_case, (case, repeat))
+            results[case_id(case)] = result
+            if on_result:
+                on_result(case, result)
+    return results
+
+
+def environment():
+    """运行环境信息，写入基准文件便于对照"""
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """与基准比较，返回回退列表 [(用例名, 指标, 基准值, 当前值), ...]"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if (current["wall"] > base["wall"] * (1 + threshold) and
+                current["wall"] - base["wall"] > MIN_TIME_DELTA):
+            regressions.append((name, "wall", base["wall"], current["wall"]))
+        for metric in ("peak_rss_kb", "output_bytes"):
+            if current.get(metric) and base.get(metric) and current[metric] > base[metric] * (1 + threshold):
+                regressions.append((name, metric, base[metric], current[metric]))
+    # 命令行入口的导入路径不能加载tkinter
+    for name, current in results.items():
+        module = name.rsplit("/", 1)[-1]
+        if name.startswith("startup/import/") and module in TKINTER_FREE_MODULES and current.get("tkinter"):
+            regressions.append((name, "tkinter", False, True))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文字转图片渲染性能基准")
+    parser.add_argument("--sweep", default="full", choices=list(SWEEPS), help="扫描范围")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--repeat", type=int, default=1, help="每个用例重复次数（取最短耗时）")
+    parser.add_argument("--save", default=None, help="把结果保存为基准文件")
+    parser.add_argument("--compare", default=None, help="与指定的基准文件比较")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="回退判定阈值（比例）")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in build_cases(args.sweep) if args.filter in case_id(case)]
+    print(f"共 {len(cases)} 个用例")
+
+    def report(case, result):
+        size = f"{result['output_bytes']} B" if result["output_bytes"] is not None else "-"
+        print(f"{case_id(case):60s} {result['wall'] * 1000:10.1f} ms  {result['peak_rss_kb'] or '-':>8} KB  {size}")
+
+    results = run_suite(cases, args.repeat, report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "sweep": args.sweep, "results": results},
+                      f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"基准已保存到: {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for name, metric, before, after in regressions:
+            print(f"回退: {name} {metric}: {before} -> {after}")
+        print(f"与基准比较: {len(regressions)} 处回退")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""数据批量转换：从CSV或JSONL逐行读取（每行一张图片），并行渲染，记录清单和检查点以便中断后继续
+
+检查点记录“此前所有行都已处理”的行号；在途的行数有上限，中断后最多重做这么多行。
+清单（manifest.jsonl）逐行追加每一行的输出文件或错误信息。
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import json
+import time
+import csv
+import os
+
+import animation
+import batch
+import effects
+import font_index
+import renderer
+
+# 清单和检查点文件名（位于输出目录中）
+MANIFEST_NAME = "manifest.jsonl"
+CHECKPOINT_NAME = "checkpoint.json"
+
+# 每处理多少行写一次检查点
+CHECKPOINT_EVERY = 100
+
+# 行中的布尔值
+TRUE_VALUES = {"1", "true", "yes", "y", "是"}
+
+
+def iter_rows(path, encoding="utf-8"):
+    """逐行读取CSV（首行为列名）或JSONL（每行一个JSON对象），产出 (行号, 字典)，行号从1开始"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding=encoding, newline="") as f:
+        if ext in (".jsonl", ".ndjson"):
+            row_number = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = {"__error__": f"JSON格式错误: {e}"}
+                yield row_number, row
+        else:
+            for row_number, row in enumerate(csv.DictReader(f), 1):
+                yield row_number, row
+
+
+def _is_set(value):
+    return value is not None and value != ""
+
+
+def row_job(row_number, row, defaults, output_dir="."):
+    """把一行数据映射为 (文字, 输出名, 渲染选项)；行中的列覆盖命令行给出的默认设置"""
+    if "__error__" in row:
+        raise ValueError(row["__error__"])
+    text = str(row.get("text") or "").strip()
+    if not text:
+        raise ValueError("文字内容为空")
+
+    options = dict(defaults)
+    if _is_set(row.get("resolution")):
+        options["width"], options["height"] = renderer.parse_resolution(str(row["resolution"]))
+    for column in ("width", "height", "font_size"):
+        if _is_set(row.get(column)):
+            try:
+                options[column] = int(row[column])
+            except (TypeError, ValueError):
+                raise ValueError(f"{column} 必须是整数: {row[column]}")
+    if not (renderer.MIN_RESOLUTION <= options["width"] <= renderer.MAX_RESOLUTION and
+            renderer.MIN_RESOLUTION <= options["height"] <= renderer.MAX_RESOLUTION):
+        raise ValueError(f"分辨率必须在{renderer.MIN_RESOLUTION}到{renderer.MAX_RESOLUTION}之间")
+    if _is_set(row.get("format")):
+        options["format_type"] = str(row["format"]).upper()
+        if options["format_type"] not in renderer.FORMAT_EXTENSIONS:
+            raise ValueError(f"不支持的格式: {row['format']}")
+    if _is_set(row.get("profile")):
+        options["profile"] = row["profile"]
+    for column in ("text_color", "bg_color"):
+        if _is_set(row.get(column)):
+            options[column] = renderer.parse_color(str(row[column]))
+    if _is_set(row.get("transparent")):
+        options["bg_transparent"] = str(row["transparent"]).strip().lower() in TRUE_VALUES
+    if _is_set(row.get("page_mode")):
+        page_mode = batch.PAGE_MODE_ARGS.get(row["page_mode"], row["page_mode"])
+        if page_mode not in renderer.PAGE_MODES:
+            raise ValueError(f"不支持的页面模式: {row['page_mode']}")
+        options["page_mode"] = page_mode
+    if _is_set(row.get("pages_as")):
+        options["page_export"] = batch.PAGE_EXPORT_ARGS.get(row["pages_as"], row["pages_as"])
+    if _is_set(row.get("all_presets")):
+        options["all_presets"] = str(row["all_presets"]).strip().lower() in TRUE_VALUES
+    if _is_set(row.get("animate")):
+        kind = animation.ANIMATION_ARGS.get(row["animate"], row["animate"])
+        if kind not in animation.ANIMATION_TYPES:
+            raise ValueError(f"不支持的动画类型: {row['animate']}")
+        options["animation"] = kind
+    for column, key, convert in (("duration", "animation_duration", float), ("fps", "animation_fps", int)):
+        if _is_set(row.get(column)):
+            try:
+                options[key] = convert(row[column])
+            except (TypeError, ValueError):
+                raise ValueError(f"{column} 必须是数字: {row[column]}")
+    columns = {name: row[name] for name in effects.OPTION_NAMES if _is_set(row.get(name))}
+    if columns:
+        # 行中的效果列覆盖默认效果的对应参数
+        base = options["effects"].to_dict() if options.get("effects") else {}
+        options["effects"] = effects.from_options({**base, **columns})
+    if options.get("animation"):
+        animation.check_options(options.get("bg_transparent"), options.get("effects"), options["format_type"],
+                                options["width"], options["height"],
+                                options.get("animation_duration", animation.DEFAULT_DURATION),
+                                options.get("animation_fps", animation.DEFAULT_FPS))
+
+    name = str(row.get("output") or "").strip()
+    if name:
+        # 输出名可以带子目录，但不能跳出输出目录；扩展名由格式决定
+        name = os.path.splitext(os.path.normpath(name))[0]
+        root = os.path.abspath(output_dir)
+        resolved = os.path.abspath(os.path.join(root, name))
+        try:
+            inside = resolved != root and os.path.commonpath([root, resolved]) == root
+        except ValueError:
+            # Windows上不同盘符的路径没有公共部分
+            inside = False
+        if not inside:
+            raise ValueError(f"输出名无效: {row['output']}")
+    else:
+        name = f"row_{row_number:06d}"
+    return text, name, options
+
+
+def render_row(row_number, row, output_dir, defaults):
+    """工作进程：渲染一行，返回输出文件路径"""
+    batch.apply_process_options(defaults)
+    text, name, options = row_job(row_number, row, defaults, output_dir)
+    return batch.render_text(text, output_dir, name, options)
+
+
+def load_checkpoint(output_dir, input_path):
+    """读取检查点，返回 (下一个要处理的行号, 此前成功数, 此前失败数)（没有检查点或输入文件不同时从第1行开始）"""
+    path = os.path.join(output_dir, CHECKPOINT_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 1, 0, 0
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        return 1, 0, 0
+    return checkpoint.get("next_row", 1), checkpoint.get("succeeded", 0), checkpoint.get("failed", 0)
+
+
+def save_checkpoint(output_dir, input_path, next_row, succeeded, failed):
+    """原子写入检查点"""
+    path = os.path.join(output_dir, CHECKPOINT_NAME)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "next_row": next_row, "succeeded": succeeded,
+                   "failed": failed, "updated": time.time()}, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def run_bulk(input_path, output_dir, defaults, workers=None, resume=False, on_result=None,
+             checkpoint_every=CHECKPOINT_EVERY):
+    """并行渲染输入文件的每一行，返回 (成功数, 失败数, 跳过的行数)
+
+    resume为True时从检查点继续，成功数和失败数包含检查点之前的行；在途的行数不超过 2×workers，内存不随行数增长。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start_row, succeeded, failed = load_checkpoint(output_dir, input_path) if resume else (1, 0, 0)
+    # 先在本进程刷新并保存字体索引，工作进程直接读取，不必各自解析字体文件
+    font_index.get_index().scan()
+
+    manifest = open(os.path.join(output_dir, MANIFEST_NAME), "a" if resume else "w", encoding="utf-8")
+    # 已完成的行号和结果：检查点只能推进到连续完成的最后一行之后，
+    # 检查点中的成功数和失败数也只统计这些行（之后的行继续时会重做）
+    next_row = start_row
+    completed_ahead = {}
+    done = {"succeeded": succeeded, "failed": failed}
+    processed = 0
+
+    def record(row_number, filename, error):
+        nonlocal succeeded, failed, next_row, processed
+        if error is None:
+            succeeded += 1
+        else:
+            failed += 1
+        processed += 1
+        manifest.write(json.dumps({"row": row_number, "output": filename, "error": error}, ensure_ascii=False) + "\n")
+        if on_result:
+            on_result(row_number, filename, error)
+        completed_ahead[row_number] = error is None
+        while next_row in completed_ahead:
+            done["succeeded" if completed_ahead.pop(next_row) else "failed"] += 1
+            next_row += 1
+        if processed % checkpoint_every == 0:
+            manifest.flush()
+            save_checkpoint(output_dir, input_path, next_row, done["succeeded"], done["failed"])
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for row_number, row in iter_rows(input_path, defaults.get("encoding", "utf-8")):
+                if row_number < start_row:
+                    continue
+                pending.append((row_number, executor.submit(render_row, row_number, row, output_dir, defaults)))
+                # 保持最多 2×workers 行在途，先提交的先收取
+                while len(pending) >= workers * 2:
+                    _collect(pending.popleft(), record)
+            while pending:
+                _collect(pending.popleft(), record)
+    finally:
+        manifest.close()
+        save_checkpoint(output_dir, input_path, next_row, done["succeeded"], done["failed"])
+    return succeeded, failed, start_row - 1
+
+
+def _collect(item, record):
+    row_number, future = item
+    try:
+        record(row_number, future.result(), None)
+    except Exception as e:
+        record(row_number, None, str(e))
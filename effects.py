@@ -0,0 +1,244 @@
+"""文字效果：描边、阴影和渐变填充，在覆盖率遮罩（文字为255的L图）上用Pillow的整幅图像运算合成
+
+描边是圆形结构元素的灰度膨胀（平移后取最大值），阴影是平移加高斯模糊，渐变是一行（列）着色后拉伸到整个范围；
+全部是C实现的整幅运算，不逐像素循环。效果只在文字包围盒加外扩范围内计算，再贴回整幅画布。
+"""
+from PIL import Image, ImageChops, ImageColor, ImageFilter, ImageOps
+import math
+import copy
+
+# from_options接受的参数名（命令行、CSV列、JSON键）
+OPTION_NAMES = ["outline", "outline_color", "shadow", "shadow_blur", "shadow_color", "shadow_opacity",
+                "gradient", "bg_gradient", "gradient_direction"]
+
+# 渐变方向
+GRADIENT_DIRECTIONS = ["vertical", "horizontal"]
+
+# 阴影模糊的影响范围（模糊半径的倍数；高斯模糊由三次盒式模糊近似，实际范围略大于3倍半径）
+BLUR_EXTENT = 4
+
+# 模糊半径不小于这个值时在一半分辨率上模糊
+HALF_RES_BLUR = 2
+
+
+def parse_color(value):
+    """颜色参数：RGB元组、"#RRGGBB"或颜色名"""
+    if isinstance(value, (tuple, list)):
+        return tuple(int(v) for v in value[:3])
+    return ImageColor.getrgb(str(value).strip())[:3]
+
+
+def parse_color_pair(value):
+    """渐变颜色："#RRGGBB,#RRGGBB" 或两个颜色的列表"""
+    if isinstance(value, str):
+        value = value.split(",")
+    if len(value) != 2:
+        raise ValueError(f"渐变需要两个颜色: {value}")
+    return parse_color(value[0]), parse_color(value[1])
+
+
+class TextEffects:
+    """文字效果参数；outline_width为0、shadow_offset为None、渐变为None时对应的效果关闭"""
+
+    def __init__(self, outline_width=0, outline_color=(255, 255, 255), shadow_offset=None, shadow_blur=0,
+                 shadow_color=(0, 0, 0), shadow_opacity=0.6, text_gradient=None, bg_gradient=None,
+                 gradient_direction="vertical"):
+        if gradient_direction not in GRADIENT_DIRECTIONS:
+            raise ValueError(f"不支持的渐变方向: {gradient_direction}")
+        self.outline_width = max(0, int(outline_width))
+        self.outline_color = parse_color(outline_color)
+        self.shadow_offset = tuple(int(v) for v in shadow_offset) if shadow_offset is not None else None
+        self.shadow_blur = max(0.0, float(shadow_blur))
+        self.shadow_color = parse_color(shadow_color)
+        self.shadow_opacity = min(1.0, max(0.0, float(shadow_opacity)))
+        self.text_gradient = parse_color_pair(text_gradient) if text_gradient else None
+        self.bg_gradient = parse_color_pair(bg_gradient) if bg_gradient else None
+        self.gradient_direction = gradient_direction
+
+    @property
+    def enabled(self):
+        return bool(self.outline_width or self.shadow_offset is not None or self.text_gradient or self.bg_gradient)
+
+    @property
+    def padding(self):
+        """效果超出文字本身的最大距离（像素），分条渲染时每条上下多渲染这么多行"""
+        pad = self.outline_width
+        if self.shadow_offset is not None:
+            pad += max(abs(v) for v in self.shadow_offset) + int(math.ceil(self.shadow_blur * BLUR_EXTENT))
+        return pad
+
+    def to_dict(self):
+        """参数字典（用于缓存键和日志），键与from_options相同，可以再传回from_options"""
+        return {
+            "outline": self.outline_width,
+            "outline_color": list(self.outline_color),
+            "shadow": list(self.shadow_offset) if self.shadow_offset is not None else None,
+            "shadow_blur": self.shadow_blur,
+            "shadow_color": list(self.shadow_color),
+            "shadow_opacity": self.shadow_opacity,
+            "gradient": [list(c) for c in self.text_gradient] if self.text_gradient else None,
+            "bg_gradient": [list(c) for c in self.bg_gradient] if self.bg_gradient else None,
+            "gradient_direction": self.gradient_direction,
+        }
+
+    def scaled(self, factor):
+        """按比例缩放距离参数的副本（预览按缩小的画布合成），启用的描边至少保留1像素"""
+        scaled = copy.copy(self)
+        if self.outline_width:
+            scaled.outline_width = max(1, int(round(self.outline_width * factor)))
+        if self.shadow_offset is not None:
+            scaled.shadow_offset = tuple(int(round(v * factor)) for v in self.shadow_offset)
+            scaled.shadow_blur = self.shadow_blur * factor
+        return scaled
+
+    def apply(self, mask, text_color, bg_color, bg_transparent, origin_y=0, canvas_height=None, text_box=None):
+        """把覆盖率遮罩合成为带效果的RGB（透明背景时RGBA）图片
+
+        mask可以是整幅画布中从origin_y开始的一条（分条渲染），canvas_height为整幅画布高度；
+        text_box为文字块在整幅画布中的 (左, 上, 右, 下)，文字渐变沿它展开，默认整幅画布。
+        """
+        width, height = mask.size
+        canvas_height = canvas_height or height
+        text_box = text_box or (0, 0, width, canvas_height)
+
+        if bg_transparent:
+            canvas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        elif self.bg_gradient:
+            canvas = gradient((0, 0, width, height), self.bg_gradient, self.gradient_direction,
+                              (0, 0, width, canvas_height), origin_y)
+        else:
+            canvas = Image.new("RGB", (width, height), tuple(bg_color[:3]))
+
+        box = mask.getbbox()
+        if box is not None:
+            pad = self.padding
+            # 四边对齐到偶数坐标（origin_y也是偶数）：半分辨率模糊在分条和整幅渲染时取同样的像素块、
+            # 按同样的比例放大；超出画布的部分贴回时被裁掉
+            left, top = max(0, box[0] - pad), max(0, box[1] - pad)
+            right, bottom = min(width, box[2] + pad), min(height, box[3] + pad)
+            box = (left - left % 2, top - top % 2, right + right % 2, bottom + bottom % 2)
+            region = mask.crop(box)
+            body = dilate(region, self.outline_width) if self.outline_width else region
+
+            layers = []
+            if self.shadow_offset is not None:
+                shadow = shift(body, *self.shadow_offset)
+                if self.shadow_blur:
+                    shadow = blur(shadow, self.shadow_blur)
+                if self.shadow_opacity < 1:
+                    shadow = shadow.point([int(v * self.shadow_opacity + 0.5) for v in range(256)])
+                layers.append((self.shadow_color, shadow))
+            if self.outline_width:
+                layers.append((self.outline_color, body))
+            if self.text_gradient:
+                fill = gradient(box, self.text_gradient, self.gradient_direction, text_box, origin_y)
+            else:
+                fill = tuple(text_color[:3])
+            layers.append((fill, region))
+
+            part = canvas.crop(box)
+            for fill, alpha in layers:
+                if not bg_transparent:
+                    # 不透明背景上按遮罩混合即为alpha合成；贴整幅纯色图比按遮罩贴纯色值快约一倍
+                    if not isinstance(fill, Image.Image):
+                        fill = Image.new("RGB", alpha.size, fill)
+                    part.paste(fill, (0, 0), alpha)
+                    continue
+                if isinstance(fill, Image.Image):
+                    layer = fill.convert("RGBA")
+                else:
+                    layer = Image.new("RGBA", alpha.size, (*fill, 255))
+                layer.putalpha(alpha)
+                part = Image.alpha_composite(part, layer)
+            canvas.paste(part, box[:2])
+        return canvas
+
+
+def shift(image, dx, dy):
+    """平移图片，移出的部分丢弃，空出的部分为0"""
+    if dx == 0 and dy == 0:
+        return image
+    shifted = Image.new(image.mode, image.size, 0)
+    shifted.paste(image, (dx, dy))
+    return shifted
+
+
+def blur(mask, radius):
+    """高斯模糊；半径较大时在一半分辨率上模糊再放大（阴影本身很柔和，看不出差别，耗时约为四分之一）"""
+    if radius < HALF_RES_BLUR:
+        return mask.filter(ImageFilter.GaussianBlur(radius))
+    small = mask.reduce(2).filter(ImageFilter.GaussianBlur(radius / 2))
+    return small.resize(mask.size, Image.BILINEAR)
+
+
+def dilate(mask, radius):
+    """圆形结构元素的灰度膨胀：先得到各半宽的水平膨胀，再按圆的每一行纵向平移后取最大值
+
+    半宽k的水平膨胀等于半宽k-1的结果左右各平移1后取最大值，每多一个像素只需一次取最大值。
+    """
+    if radius <= 0:
+        return mask
+    horizontal = ImageChops.lighter(mask, ImageChops.lighter(shift(mask, 1, 0), shift(mask, -1, 0)))
+    rows = [mask, horizontal]
+    for k in range(2, radius + 1):
+        horizontal = ImageChops.lighter(shift(horizontal, 1, 0), shift(horizontal, -1, 0))
+        rows.append(horizontal)
+    result = rows[radius]
+    for dy in range(1, radius + 1):
+        half = int(math.sqrt(radius * radius - dy * dy) + 0.5)
+        result = ImageChops.lighter(result, ImageChops.lighter(shift(rows[half], 0, dy), shift(rows[half], 0, -dy)))
+    return result
+
+
+def gradient(box, colors, direction, span, origin_y=0):
+    """box范围（相对当前图片）的RGB渐变：在span=(左, 上, 右, 下)（整幅画布坐标）内从colors[0]过渡到colors[1]
+
+    只按一行（或一列）计算灰度并着色，再拉伸到整个范围。
+    """
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    if direction == "horizontal":
+        start, end = span[0], span[2]
+        positions = range(left, right)
+    else:
+        start, end = span[1], span[3]
+        positions = range(top + origin_y, bottom + origin_y)
+    length = max(1, end - start)
+    ramp = bytes(min(255, max(0, int((p - start) * 255 / length))) for p in positions)
+    if direction == "horizontal":
+        line = Image.frombytes("L", (width, 1), ramp)
+    else:
+        line = Image.frombytes("L", (1, height), ramp)
+    return ImageOps.colorize(line, colors[0], colors[1]).resize((width, height), Image.NEAREST)
+
+
+def from_options(options):
+    """从字符串参数字典（命令行、CSV列、JSON）创建TextEffects，没有启用任何效果时返回None
+
+    键：outline（描边宽度）、outline_color、shadow（"dx,dy"）、shadow_blur、shadow_color、shadow_opacity、
+    gradient（文字渐变"颜色1,颜色2"）、bg_gradient（背景渐变）、gradient_direction（vertical/horizontal）
+    """
+    def value(name):
+        v = options.get(name)
+        return None if v is None or v == "" else v
+
+    try:
+        shadow = value("shadow")
+        if isinstance(shadow, str):
+            shadow = [int(v) for v in shadow.split(",")]
+        if shadow is not None and len(shadow) != 2:
+            raise ValueError(f"阴影偏移应为 dx,dy: {options.get('shadow')}")
+        effects = TextEffects(
+            outline_width=int(value("outline") or 0),
+            outline_color=value("outline_color") or (255, 255, 255),
+            shadow_offset=shadow,
+            shadow_blur=float(value("shadow_blur") or 0),
+            shadow_color=value("shadow_color") or (0, 0, 0),
+            shadow_opacity=float(value("shadow_opacity") if value("shadow_opacity") is not None else 0.6),
+            text_gradient=value("gradient"),
+            bg_gradient=value("bg_gradient"),
+            gradient_direction=value("gradient_direction") or "vertical",
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"效果参数无效: {e}")
+    return effects if effects.enabled else None
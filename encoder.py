@@ -0,0 +1,144 @@
+"""图片编码：按格式选择速度/体积档位，在后台线程中编码保存并报告耗时和文件大小"""
+from PIL import Image
+import threading
+import queue
+import time
+import io
+
+# 各格式的编码档位（界面下拉框显示档位名称）
+ENCODER_PROFILES = {
+    "PNG": {
+        "快速": {"compress_level": 1},
+        "均衡": {"compress_level": 6},
+        "最小": {"compress_level": 9, "optimize": True},
+    },
+    "WEBP": {
+        "快速": {"quality": 90, "method": 0},
+        "均衡": {"quality": 90, "method": 4},
+        "最小": {"quality": 80, "method": 6},
+        "无损": {"lossless": True, "quality": 100, "method": 4},
+    },
+    "JPG": {
+        "快速": {"quality": 90, "optimize": False, "subsampling": "4:2:0"},
+        "均衡": {"quality": 95, "optimize": False},
+        "清晰": {"quality": 95, "optimize": True, "subsampling": "4:4:4"},
+        "最小": {"quality": 85, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+    },
+    "BMP": {"默认": {}},
+    "GIF": {"默认": {}},
+}
+
+DEFAULT_PROFILE = {"PNG": "均衡", "WEBP": "均衡", "JPG": "均衡", "BMP": "默认", "GIF": "默认"}
+
+# 界面格式名对应的Pillow格式名
+PIL_FORMATS = {"JPG": "JPEG", "PNG": "PNG", "BMP": "BMP", "GIF": "GIF", "WEBP": "WEBP"}
+
+# 可以直接写入调色板（P模式）图片的格式，其他格式在编码前展开为RGB/RGBA
+PALETTE_FORMATS = {"PNG", "BMP", "GIF", "TIFF"}
+
+
+def profile_names(format_type):
+    """格式可选的档位名称"""
+    return list(ENCODER_PROFILES.get(format_type, {"默认": {}}))
+
+
+def resolve_profile(format_type, profile=None):
+    """返回有效的档位名称，未指定或无效时使用默认档位"""
+    if profile in ENCODER_PROFILES.get(format_type, {}):
+        return profile
+    return DEFAULT_PROFILE.get(format_type, "默认")
+
+
+def encoder_options(format_type, profile=None):
+    """档位对应的Pillow保存参数"""
+    profiles = ENCODER_PROFILES.get(format_type, {})
+    return dict(profiles.get(resolve_profile(format_type, profile), {}))
+
+
+def prepare_for_format(image, format_type, bg_color=(255, 255, 255)):
+    """转换为目标格式支持的模式（JPG不支持透明通道，JPG/WEBP不写调色板图片）"""
+    if image.mode == "P":
+        # 调色板图片在编码时才着色为RGB/RGBA；带透明度的调色板只有PNG能直接写入
+        has_alpha = image.palette.mode == "RGBA" or "transparency" in image.info
+        if format_type not in PALETTE_FORMATS or (has_alpha and format_type != "PNG"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+    if format_type == "JPG" and image.mode == "RGBA":
+        alpha = image.getchannel("A")
+        if alpha.getextrema() == (255, 255):
+            # 完全不透明：直接丢弃透明通道，只复制一次
+            return image.convert("RGB")
+        # 使用当前选择的背景颜色作为JPG背景
+        rgb_image = Image.new("RGB", image.size, tuple(bg_color[:3]))
+        rgb_image.paste(image, mask=alpha)
+        return rgb_image
+    return image
+
+
+class EncodeResult:
+    """一次编码保存的结果"""
+
+    def __init__(self, filename, size_bytes, encode_seconds, profile):
+        self.filename = filename
+        self.size_bytes = size_bytes
+        self.encode_seconds = encode_seconds
+        self.profile = profile
+
+    def summary(self):
+        """用于状态栏的简短说明"""
+        return f"{self.size_bytes / 1024:.1f} KB, 编码 {self.encode_seconds:.2f} 秒 ({self.profile})"
+
+
+def encode_image(image, format_type, profile=None, bg_color=(255, 255, 255)):
+    """把图片编码为字节串"""
+    image = prepare_for_format(image, format_type, bg_color)
+    buffer = io.BytesIO()
+    image.save(buffer, PIL_FORMATS.get(format_type, format_type), **encoder_options(format_type, profile))
+    return buffer.getvalue()
+
+
+def save_image(image, filename, format_type, profile=None, bg_color=(255, 255, 255), progress_callback=None,
+               trace=None):
+    """编码并写入文件，返回EncodeResult；trace不为None时记录编码阶段耗时"""
+    if progress_callback:
+        progress_callback(10)
+    start = time.perf_counter()
+    data = encode_image(image, format_type, profile, bg_color)
+    encode_seconds = time.perf_counter() - start
+    if trace is not None:
+        trace.stages["encode"] = trace.stages.get("encode", 0.0) + encode_seconds
+        trace.info["output_bytes"] = len(data)
+    if progress_callback:
+        progress_callback(90)
+    with open(filename, "wb") as f:
+        f.write(data)
+    if progress_callback:
+        progress_callback(100)
+    return EncodeResult(filename, len(data), encode_seconds, resolve_profile(format_type, profile))
+
+
+class BackgroundEncoder:
+    """后台编码线程：按提交顺序依次执行保存任务，不阻塞界面线程"""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, job, on_progress=None, on_done=None):
+        """提交任务；job(progress_callback)返回结果，完成后调用on_done(结果, 错误信息)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._jobs.put((job, on_progress, on_done))
+
+    def _run(self):
+        while True:
+            job, on_progress, on_done = self._jobs.get()
+            try:
+                result = job(on_progress or (lambda value: None))
+                error = None
+            except Exception as e:
+                result, error = None, str(e)
+            if on_done:
+                on_done(result, error)
@@ -0,0 +1,155 @@
+"""多页导出：页面在工作进程中并行生成，按页序流式写入多页TIFF/PDF或编号图片序列"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from PIL import PdfParser, TiffImagePlugin, features
+import io
+import os
+
+import encoder
+import renderer
+
+# 多页导出类型
+EXPORT_TYPES = ["TIFF", "PDF", "图片序列"]
+
+
+def export_type_for(filename):
+    """根据文件扩展名判断导出类型"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in (".tif", ".tiff"):
+        return "TIFF"
+    if ext == ".pdf":
+        return "PDF"
+    return "图片序列"
+
+
+def _render_page(text_layout, document, index, export_type, filename):
+    """工作进程：生成一页并按导出类型返回结果"""
+    image = renderer.render_page_layout(text_layout, document["width"], document["height"],
+                                        document["format_type"], document["text_color"],
+                                        document["bg_color"], document["bg_transparent"],
+                                        effects=document["effects"])
+    if export_type == "图片序列":
+        # 图片序列直接在工作进程中编码保存，主进程只收文件名
+        page_file = renderer.page_filename(filename, index, document["page_count"])
+        renderer.save_image(image, page_file, document["format_type"], document["bg_color"], document["profile"])
+        return page_file
+    if export_type == "PDF":
+        # PDF页面在工作进程中按JPG档位编码为JPEG
+        return _encode_pdf_page(image, document["bg_color"], document["profile"])
+    return image
+
+
+def _encode_pdf_page(image, bg_color, profile=None):
+    """把页面编码为PDF可直接嵌入的JPEG数据，返回(数据, 宽, 高)；profile为JPG档位名称，无效时用默认档位"""
+    image = encoder.prepare_for_format(image, "JPG", bg_color)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", **encoder.encoder_options("JPG", profile))
+    return buffer.getvalue(), image.width, image.height
+
+
+def iter_rendered_pages(document, export_type, filename, workers=None, profile=None):
+    """并行生成页面，按页序逐个产出；同时在途的页面数有上限，内存不随页数增长"""
+    workers = workers or os.cpu_count() or 1
+    state = {
+        "width": document.width,
+        "height": document.height,
+        "format_type": document.format_type,
+        "text_color": document.text_color,
+        "bg_color": document.bg_color,
+        "bg_transparent": document.bg_transparent,
+        "page_count": document.page_count,
+        "effects": document.effects,
+        "profile": profile,
+    }
+
+    if workers == 1:
+        for index in range(document.page_count):
+            yield _render_page(document.page_layout(index), state, index, export_type, filename)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_index = 0
+        while next_index < document.page_count or pending:
+            # 保持最多 2×workers 个页面在途
+            while next_index < document.page_count and len(pending) < workers * 2:
+                pending.append(executor.submit(_render_page, document.page_layout(next_index), state,
+                                               next_index, export_type, filename))
+                next_index += 1
+            yield pending.popleft().result()
+
+
+def _write_tiff(pages, filename, page_count, progress_callback):
+    """逐页追加写入多页TIFF"""
+    compression = "tiff_deflate" if features.check("libtiff") else None
+    with open(filename, "w+b") as fp:
+        with TiffImagePlugin.AppendingTiffWriter(fp) as writer:
+            for index, page in enumerate(pages):
+                page = encoder.prepare_for_format(page, "TIFF")
+                if compression:
+                    page.save(writer, "TIFF", compression=compression)
+                else:
+                    page.save(writer, "TIFF")
+                writer.newFrame()
+                if progress_callback:
+                    progress_callback((index + 1) / page_count * 100)
+
+
+def _write_pdf(pages, filename, page_count, progress_callback):
+    """逐页写入PDF（页数预先已知，先分配对象编号再流式写入页面）"""
+    with open(filename, "w+b") as fp:
+        pdf = PdfParser.PdfParser(f=fp, filename=filename, mode="w+b")
+        pdf.start_writing()
+        pdf.write_header()
+        pdf.write_comment("created by text-to-pic")
+
+        image_refs, page_refs, contents_refs = [], [], []
+        for _ in range(page_count):
+            image_refs.append(pdf.next_object_id(0))
+            page_refs.append(pdf.next_object_id(0))
+            contents_refs.append(pdf.next_object_id(0))
+            pdf.pages.append(page_refs[-1])
+        pdf.write_catalog()
+
+        for index, (data, width, height) in enumerate(pages):
+            pdf.write_obj(image_refs[index], stream=data,
+                          Type=PdfParser.PdfName("XObject"),
+                          Subtype=PdfParser.PdfName("Image"),
+                          Width=width,
+                          Height=height,
+                          Filter=PdfParser.PdfName("DCTDecode"),
+                          BitsPerComponent=8,
+                          ColorSpace=PdfParser.PdfName("DeviceRGB"))
+            pdf.write_page(page_refs[index],
+                           Resources=PdfParser.PdfDict(
+                               ProcSet=[PdfParser.PdfName("PDF"), PdfParser.PdfName("ImageC")],
+                               XObject=PdfParser.PdfDict(image=image_refs[index])),
+                           MediaBox=[0, 0, width, height],
+                           Contents=contents_refs[index])
+            pdf.write_obj(contents_refs[index], stream=b"q %d 0 0 %d 0 0 cm /image Do Q\n" % (width, height))
+            if progress_callback:
+                progress_callback((index + 1) / page_count * 100)
+
+        pdf.write_xref_and_trailer()
+        pdf.close()
+
+
+def export_document(document, filename, export_type=None, workers=None, profile=None, progress_callback=None):
+    """导出分页文档，返回写出的文件名列表"""
+    export_type = export_type or export_type_for(filename)
+    page_count = document.page_count
+    pages = iter_rendered_pages(document, export_type, filename, workers, profile)
+
+    if export_type == "TIFF":
+        _write_tiff(pages, filename, page_count, progress_callback)
+        return [filename]
+    if export_type == "PDF":
+        _write_pdf(pages, filename, page_count, progress_callback)
+        return [filename]
+
+    filenames = []
+    for index, page_file in enumerate(pages):
+        filenames.append(page_file)
+        if progress_callback:
+            progress_callback((index + 1) / page_count * 100)
+    return filenames
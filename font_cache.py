@@ -0,0 +1,204 @@
+"""进程级字体缓存：按(字体路径, 字体索引, 字号)缓存已加载的字体，LRU淘汰；
+主字体缺少的字符按字体索引逐字符选择回退字体"""
+from collections import OrderedDict
+from PIL import ImageFont
+import threading
+import os
+
+import font_index
+import instrumentation
+
+# 系统默认字体路径（不存在时从字体索引中选择）
+if os.name == 'nt':
+    DEFAULT_FONT_PATH = "C:/Windows/Fonts/msyh.ttc"  # 微软雅黑
+else:
+    DEFAULT_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+_default_font = None
+
+
+class FontCache:
+    """带命中/未命中计数的LRU字体缓存（线程安全）"""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_errors = 0  # 字体文件不可用、改用默认字体的次数
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_font(self, font_path, font_size, index=0):
+        """获取字体，未缓存时加载；字体文件不可用时返回默认字体"""
+        key = (font_path, index, font_size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self.hits += 1
+                self._fonts.move_to_end(key)
+                return font
+            self.misses += 1
+
+        # 在锁外加载，避免解析大字体文件（如.ttc）时阻塞其他线程
+        font = self._load(font_path, font_size, index)
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.maxsize:
+                self._fonts.popitem(last=False)
+                self.evictions += 1
+        return font
+
+    def _load(self, font_path, font_size, index):
+        """从磁盘加载字体"""
+        try:
+            if font_path and os.path.exists(font_path):
+                font = ImageFont.truetype(font_path, font_size, index=index)
+                if instrumentation.VERBOSE:
+                    print(f"加载字体成功: {font_path}, 大小: {font_size}")
+                return font
+            error = "字体文件不存在"
+        except Exception as e:
+            error = f"字体加载异常: {e}"
+        with self._lock:
+            self.load_errors += 1
+        if instrumentation.VERBOSE:
+            print(f"{error}: {font_path}，使用默认字体")
+        return ImageFont.load_default()
+
+    def clear(self):
+        """清空缓存和计数"""
+        with self._lock:
+            self._fonts.clear()
+            self.hits = self.misses = self.evictions = self.load_errors = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._fonts),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_errors": self.load_errors,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class FontChain:
+    """主字体加回退字体：主字体没有的字符使用字体索引中第一个包含它的字体（同一字号，基线对齐）"""
+
+    def __init__(self, font):
+        self.font = font
+        self.ascent = font.getmetrics()[0]
+        self.face = font_index.get_index().face(font.path, font.index)
+        self._primary = (font, (font.path, font.index, font.size), 0)
+        self._fonts = {}  # 字符 -> (字体, 缓存键, 纵向偏移)
+
+    def font_for(self, ch):
+        """绘制该字符的 (字体, 缓存键, 相对主字体的纵向偏移)"""
+        entry = self._fonts.get(ch)
+        if entry is None:
+            entry = self._fonts[ch] = self._resolve(ch)
+        return entry
+
+    def _resolve(self, ch):
+        if self.face is None or self.face.covers(ch) or ch.isspace():
+            return self._primary
+        face = font_index.get_index().fallback_for(ch)
+        if face is None:
+            return self._primary  # 没有字体包含该字符，用主字体（显示缺字方框）
+        font = font_cache.get_font(face.path, self.font.size, face.index)
+        if not isinstance(font, ImageFont.FreeTypeFont):
+            return self._primary
+        if instrumentation.VERBOSE:
+            print(f"字符 {ch!r} 使用回退字体: {face.family} {face.style}")
+        return (font, (font.path, font.index, font.size), self.ascent - font.getmetrics()[0])
+
+    def getlength(self, text):
+        """文字的步进宽度（各字符用各自的字体测量）"""
+        return sum(self.font_for(ch)[0].getlength(ch) for ch in text)
+
+    def runs(self, text):
+        """把文字按字体分段，返回 [(字体, 纵向偏移, 文字段), ...]"""
+        runs = []
+        start = 0
+        current = None
+        for i, ch in enumerate(text):
+            entry = self.font_for(ch)
+            if current is not None and entry[0] is not current[0]:
+                runs.append((current[0], current[2], text[start:i]))
+                start = i
+            current = entry
+        if current is not None:
+            runs.append((current[0], current[2], text[start:]))
+        return runs
+
+    def getbbox(self, text):
+        """文字的包围盒（相对主字体的绘制原点）"""
+        left = top = right = bottom = None
+        x = 0
+        for font, dy, run in self.runs(text):
+            box = font.getbbox(run)
+            if box[2] > box[0] and box[3] > box[1]:
+                box = (box[0] + x, box[1] + dy, box[2] + x, box[3] + dy)
+                if left is None:
+                    left, top, right, bottom = box
+                else:
+                    left, top = min(left, box[0]), min(top, box[1])
+                    right, bottom = max(right, box[2]), max(bottom, box[3])
+            x += font.getlength(run)
+        if left is None:
+            return (0, 0, 0, 0)
+        return (int(left), int(top), int(right), int(bottom))
+
+
+# 进程共享的字体缓存（预览和最终渲染共用）
+font_cache = FontCache()
+
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def default_font():
+    """默认字体 (路径, 索引)：系统默认字体不存在时从字体索引中选择"""
+    global _default_font
+    if _default_font is None:
+        if os.path.exists(DEFAULT_FONT_PATH):
+            _default_font = (DEFAULT_FONT_PATH, 0)
+        else:
+            face = font_index.get_index().default_face()
+            if face is None:
+                _default_font = (DEFAULT_FONT_PATH, 0)
+            else:
+                if instrumentation.VERBOSE:
+                    print(f"默认字体 {DEFAULT_FONT_PATH} 不存在，使用: {face.family} {face.style} ({face.path})")
+                _default_font = (face.path, face.index)
+    return _default_font
+
+
+def get_font(font_size, font_path=None, index=0):
+    """从共享缓存获取字体，默认使用系统字体"""
+    if font_path is None:
+        font_path, index = default_font()
+    return font_cache.get_font(font_path, font_size, index)
+
+
+def get_chain(font):
+    """字体对应的共享回退链，非FreeType字体（如Pillow内置字体）返回None"""
+    if not isinstance(font, ImageFont.FreeTypeFont) or not isinstance(font.path, str):
+        return None
+    key = (font.path, font.index, font.size)
+    chain = _chains.get(key)
+    if chain is None:
+        with _chains_lock:
+            chain = _chains.get(key)
+            if chain is None:
+                if len(_chains) >= font_cache.maxsize * 2:
+                    _chains.clear()
+                chain = _chains[key] = FontChain(font)
+    return chain
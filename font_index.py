@@ -0,0 +1,414 @@
+"""字体索引：扫描系统字体目录，记录每个字体的家族、样式和字符覆盖，保存为JSON
+
+字符覆盖直接用struct解析字体的cmap表（格式4和12）得到，不需要加载字体；
+按256个码位一块存为位图，查询一个字符只需一次字典查找和一次移位。
+再次启动时按文件大小和修改时间增量刷新，只重新解析新增或修改过的字体文件。
+"""
+import threading
+import struct
+import zlib
+import json
+import os
+import sys
+
+import instrumentation
+
+# 索引格式版本，解析方式改变时加1让旧索引失效
+INDEX_VERSION = 1
+
+# 字体文件扩展名
+FONT_EXTENSIONS = {".ttf", ".otf", ".ttc", ".otc"}
+
+
+def _default_font_dirs():
+    """各平台的系统和用户字体目录"""
+    home = os.path.expanduser("~")
+    if os.name == "nt":
+        windir = os.environ.get("WINDIR", "C:/Windows")
+        local = os.environ.get("LOCALAPPDATA", os.path.join(home, "AppData", "Local"))
+        return [os.path.join(windir, "Fonts"), os.path.join(local, "Microsoft", "Windows", "Fonts")]
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    return ["/usr/share/fonts", "/usr/local/share/fonts", os.path.join(home, ".fonts"),
+            os.path.join(home, ".local", "share", "fonts")]
+
+
+# 扫描的字体目录，可用环境变量 TEXT2PIC_FONT_DIRS 设置（多个目录用os.pathsep分隔）
+FONT_DIRS = [d for d in os.environ.get("TEXT2PIC_FONT_DIRS", "").split(os.pathsep) if d] or _default_font_dirs()
+
+# 索引文件路径，可用环境变量 TEXT2PIC_FONT_INDEX 设置，设为0表示不保存
+INDEX_PATH = os.environ.get("TEXT2PIC_FONT_INDEX",
+                            os.path.join(os.path.expanduser("~"), ".cache", "text2pic", "font_index.json"))
+if INDEX_PATH == "0":
+    INDEX_PATH = ""
+
+# 回退字体的优先顺序（家族名小写，前缀匹配）：先中文字体，再覆盖面广的西文字体
+PREFERRED_FAMILIES = ["microsoft yahei", "pingfang sc", "noto sans cjk sc", "noto sans sc", "source han sans sc",
+                      "source han sans cn", "wenquanyi micro hei", "wenquanyi zen hei", "droid sans fallback",
+                      "simhei", "simsun", "noto sans cjk", "source han sans", "noto sans", "dejavu sans",
+                      "segoe ui", "arial", "helvetica", "liberation sans"]
+
+# 视为常规字重的样式名
+REGULAR_STYLES = {"regular", "normal", "book", "roman", "standard"}
+
+# cmap子表的优先顺序：(平台, 编码)
+_CMAP_PREFERENCE = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]
+
+
+def _read(f, offset, length):
+    f.seek(offset)
+    data = f.read(length)
+    if len(data) < length:
+        raise ValueError("字体文件不完整")
+    return data
+
+
+def _face_offsets(f):
+    """文件中各字体的表目录偏移（.ttc可包含多个字体）"""
+    tag = _read(f, 0, 4)
+    if tag == b"ttcf":
+        count = struct.unpack(">I", _read(f, 8, 4))[0]
+        return struct.unpack(f">{count}I", _read(f, 12, 4 * count))
+    if tag in (b"\x00\x01\x00\x00", b"OTTO", b"true"):
+        return (0,)
+    raise ValueError("不是TrueType/OpenType字体")
+
+
+def _table_directory(f, offset):
+    """表目录 {表名: (偏移, 长度)}"""
+    num_tables = struct.unpack(">H", _read(f, offset + 4, 2))[0]
+    data = _read(f, offset + 12, 16 * num_tables)
+    tables = {}
+    for tag, _, table_offset, length in struct.iter_unpack(">4sIII", data):
+        tables[tag.decode("latin-1")] = (table_offset, length)
+    return tables
+
+
+def _parse_names(data):
+    """name表中的家族名和样式名 {名称ID: 文字}，优先英文名"""
+    _, count, string_offset = struct.unpack_from(">HHH", data, 0)
+    names = {}
+    ranks = {}
+    for i in range(count):
+        platform, encoding, language, name_id, length, offset = struct.unpack_from(">6H", data, 6 + 12 * i)
+        if name_id not in (1, 2, 16, 17):
+            continue
+        raw = data[string_offset + offset:string_offset + offset + length]
+        if platform in (0, 3):
+            text = raw.decode("utf-16-be", "replace")
+            rank = 0 if platform == 0 or language == 0x409 else 1
+        elif platform == 1 and encoding == 0:
+            text = raw.decode("mac_roman", "replace")
+            rank = 2
+        else:
+            continue
+        if name_id not in ranks or rank < ranks[name_id]:
+            names[name_id] = text
+            ranks[name_id] = rank
+    return names
+
+
+def _cmap_format12(data, offset):
+    """格式12（分段覆盖，支持全部Unicode）：返回码位区间列表"""
+    count = struct.unpack_from(">I", data, offset + 12)[0]
+    ranges = []
+    for start, end, glyph in struct.iter_unpack(">III", data[offset + 16:offset + 16 + 12 * count]):
+        if glyph == 0:
+            start += 1  # 映射到0号字形（缺字）的码位不算覆盖
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+def _cmap_format4(data, offset):
+    """格式4（基本多文种平面的分段映射）：返回码位区间列表"""
+    seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+    ends = struct.unpack_from(f">{seg_count}H", data, offset + 14)
+    starts_at = offset + 16 + 2 * seg_count
+    starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+    deltas = struct.unpack_from(f">{seg_count}H", data, starts_at + 2 * seg_count)
+    range_offsets_at = starts_at + 4 * seg_count
+    range_offsets = struct.unpack_from(f">{seg_count}H", data, range_offsets_at)
+
+    ranges = []
+    for i in range(seg_count):
+        start, end, delta = starts[i], ends[i], deltas[i]
+        if start > end or start == 0xFFFF:
+            continue
+        if range_offsets[i] == 0:
+            # 字形号为 (码位 + delta) & 0xFFFF，区间内最多一个码位映射到0号字形
+            missing = -delta & 0xFFFF
+            if start <= missing <= end:
+                if start < missing:
+                    ranges.append((start, missing - 1))
+                if missing < end:
+                    ranges.append((missing + 1, end))
+            else:
+                ranges.append((start, end))
+            continue
+        # 字形号从glyphIdArray中查，逐个码位判断
+        glyphs_at = range_offsets_at + 2 * i + range_offsets[i]
+        count = min(end - start + 1, max(0, (len(data) - glyphs_at) // 2))
+        run_start = None
+        for code, glyph in zip(range(start, start + count), struct.unpack_from(f">{count}H", data, glyphs_at)):
+            covered = glyph != 0 and (glyph + delta) & 0xFFFF != 0
+            if covered and run_start is None:
+                run_start = code
+            elif not covered and run_start is not None:
+                ranges.append((run_start, code - 1))
+                run_start = None
+        if run_start is not None:
+            ranges.append((run_start, start + count - 1))
+    return ranges
+
+
+def _parse_cmap(data):
+    """按优先顺序选一个Unicode子表，返回覆盖的码位区间列表"""
+    _, count = struct.unpack_from(">HH", data, 0)
+    subtables = {}
+    for platform, encoding, offset in struct.iter_unpack(">HHI", data[4:4 + 8 * count]):
+        subtables.setdefault((platform, encoding), offset)
+    for key in _CMAP_PREFERENCE:
+        offset = subtables.get(key)
+        if offset is None:
+            continue
+        table_format = struct.unpack_from(">H", data, offset)[0]
+        if table_format == 12:
+            return _cmap_format12(data, offset)
+        if table_format == 4:
+            return _cmap_format4(data, offset)
+    return []
+
+
+def ranges_to_blocks(ranges):
+    """码位区间列表转换为位图 {块号: 256位整数}，块号为码位右移8位"""
+    blocks = {}
+    for start, end in ranges:
+        for block in range(start >> 8, (end >> 8) + 1):
+            base = block << 8
+            low = max(start, base) - base
+            high = min(end, base + 255) - base
+            blocks[block] = blocks.get(block, 0) | (((1 << (high - low + 1)) - 1) << low)
+    return blocks
+
+
+class FontFace:
+    """字体文件中的一个字体：路径、在文件中的序号、家族名、样式名和字符覆盖位图"""
+
+    __slots__ = ("path", "index", "family", "style", "blocks", "glyph_count")
+
+    def __init__(self, path, index, family, style, blocks):
+        self.path = path
+        self.index = index
+        self.family = family
+        self.style = style
+        self.blocks = blocks
+        self.glyph_count = sum(bin(bits).count("1") for bits in blocks.values())
+
+    def covers(self, ch):
+        """字体是否包含该字符"""
+        code = ord(ch)
+        return (self.blocks.get(code >> 8, 0) >> (code & 255)) & 1 == 1
+
+    def to_json(self):
+        return {"index": self.index, "family": self.family, "style": self.style,
+                "blocks": {str(block): format(bits, "x") for block, bits in self.blocks.items()}}
+
+    @classmethod
+    def from_json(cls, path, data):
+        blocks = {int(block): int(bits, 16) for block, bits in data["blocks"].items()}
+        return cls(path, data["index"], data["family"], data["style"], blocks)
+
+    def __repr__(self):
+        return f"FontFace({self.family!r}, {self.style!r}, {self.path!r}, {self.index})"
+
+
+def parse_font_file(path):
+    """解析字体文件，返回其中可缩放字体的FontFace列表（只有位图的字体如彩色表情不收录）"""
+    faces = []
+    with open(path, "rb") as f:
+        for index, offset in enumerate(_face_offsets(f)):
+            tables = _table_directory(f, offset)
+            if "cmap" not in tables or not tables.keys() & {"glyf", "CFF ", "CFF2"}:
+                continue
+            names = _parse_names(_read(f, *tables["name"])) if "name" in tables else {}
+            family = names.get(16) or names.get(1) or os.path.splitext(os.path.basename(path))[0]
+            style = names.get(17) or names.get(2) or "Regular"
+            blocks = ranges_to_blocks(_parse_cmap(_read(f, *tables["cmap"])))
+            faces.append(FontFace(path, index, family, style, blocks))
+    return faces
+
+
+def _family_rank(family):
+    family = family.lower()
+    for rank, preferred in enumerate(PREFERRED_FAMILIES):
+        if family.startswith(preferred):
+            return rank
+    return len(PREFERRED_FAMILIES)
+
+
+def _order_key(face):
+    """回退顺序：优先家族、常规字重、覆盖字符多的在前"""
+    return (_family_rank(face.family), face.style.lower() not in REGULAR_STYLES, -face.glyph_count,
+            face.path, face.index)
+
+
+class FontIndex:
+    """系统字体索引（线程安全）；字体目录在第一次需要回退字体时才扫描"""
+
+    def __init__(self, path=INDEX_PATH, font_dirs=None):
+        self.path = path
+        self.font_dirs = list(font_dirs or FONT_DIRS)
+        self.parsed = 0  # 本进程解析过的字体文件数
+        self._files = {}  # 路径 -> (大小, 修改时间, [FontFace, ...])
+        self._ordered = None
+        self._fallbacks = {}  # 码位 -> 覆盖它的第一个FontFace（或None）
+        self._scanned = False
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        """读取保存的索引（版本不符或损坏时忽略）"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return
+            for path, entry in data["files"].items():
+                faces = [FontFace.from_json(path, face) for face in entry["faces"]]
+                self._files[path] = (entry["size"], entry["mtime"], faces)
+        except (OSError, ValueError, KeyError, TypeError):
+            self._files = {}
+
+    def save(self):
+        """原子写入索引文件"""
+        if not self.path:
+            return
+        data = {"version": INDEX_VERSION, "files": {
+            path: {"size": size, "mtime": mtime, "faces": [face.to_json() for face in faces]}
+            for path, (size, mtime, faces) in self._files.items()}}
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"保存字体索引失败: {e}")
+
+    def _faces_of(self, path, stat):
+        """文件中的字体；大小和修改时间与索引一致时直接返回，否则重新解析"""
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2]
+        try:
+            faces = parse_font_file(path)
+        except (OSError, ValueError, struct.error) as e:
+            faces = []
+            if instrumentation.VERBOSE:
+                print(f"解析字体失败: {path}: {e}")
+        self._files[path] = (stat.st_size, stat.st_mtime, faces)
+        self._dirty = True
+        self.parsed += 1
+        return faces
+
+    def face(self, path, index=0):
+        """指定字体文件中第index个字体（不在索引中时只解析这一个文件），找不到时返回None"""
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            faces = self._faces_of(path, stat)
+            if self._dirty:
+                self.save()
+        for face in faces:
+            if face.index == index:
+                return face
+        return None
+
+    def scan(self):
+        """扫描字体目录：新增或修改过的文件重新解析，已删除的文件移出索引，有变化时保存"""
+        with self._lock:
+            for directory in self.font_dirs:
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        if os.path.splitext(name)[1].lower() not in FONT_EXTENSIONS:
+                            continue
+                        path = os.path.join(root, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        self._faces_of(path, stat)
+            for path in list(self._files):
+                if not os.path.exists(path):
+                    del self._files[path]
+                    self._dirty = True
+            self._scanned = True
+            self._ordered = None
+            self._fallbacks.clear()
+            if self._dirty:
+                self.save()
+
+    def faces(self):
+        """所有字体，按回退顺序排列"""
+        with self._lock:
+            if not self._scanned:
+                self.scan()
+            if self._ordered is None:
+                self._ordered = sorted((face for _, _, faces in self._files.values() for face in faces),
+                                       key=_order_key)
+            return self._ordered
+
+    def fallback_for(self, ch):
+        """按回退顺序第一个包含该字符的字体，没有时返回None"""
+        code = ord(ch)
+        with self._lock:
+            if code not in self._fallbacks:
+                self._fallbacks[code] = next((face for face in self.faces() if face.covers(ch)), None)
+            return self._fallbacks[code]
+
+    def default_face(self):
+        """系统默认字体不存在时使用的字体：第一个同时包含常用汉字和拉丁字母的字体，都没有时取第一个"""
+        faces = self.faces()
+        for face in faces:
+            if face.covers("中") and face.covers("A"):
+                return face
+        return faces[0] if faces else None
+
+    def signature(self):
+        """已安装字体的摘要，字体增减或修改后改变（回退字体影响渲染结果，用作缓存键的一部分）"""
+        with self._lock:
+            if not self._scanned:
+                self.scan()
+            files = sorted((path, size, mtime) for path, (size, mtime, _) in self._files.items())
+        return format(zlib.crc32(json.dumps(files).encode("utf-8")), "08x")
+
+    def stats(self):
+        """返回索引统计信息"""
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "faces": sum(len(faces) for _, _, faces in self._files.values()),
+                "parsed": self.parsed,
+                "scanned": self._scanned,
+                "fallback_lookups": len(self._fallbacks),
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """进程共享的字体索引"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FontIndex()
+        return _index
@@ -0,0 +1,141 @@
+"""字形位图缓存：每个(字体, 字号, 字符)只光栅化一次，按字距贴图拼出整行文字；
+主字体缺少的字符用回退字体的字形"""
+from collections import OrderedDict
+from PIL import ImageFont
+import threading
+import math
+
+import font_cache
+
+# 需要整行排版（连字/变形）的文字范围：希伯来文、阿拉伯文、印度系文字、泰文、缅甸文等
+_SHAPING_RANGES = ((0x0590, 0x08FF), (0x0900, 0x0DFF), (0x0E00, 0x0FFF), (0x1000, 0x109F),
+                   (0x1780, 0x17FF), (0xFB1D, 0xFDFF), (0xFE70, 0xFEFF))
+
+
+def needs_shaping(text):
+    """判断文字是否包含需要整行排版的字符（这类文字不能逐字贴图）"""
+    for ch in text:
+        code = ord(ch)
+        if code >= 0x0590:
+            for start, end in _SHAPING_RANGES:
+                if start <= code <= end:
+                    return True
+    return False
+
+
+def draw_runs(draw, xy, text, fill, font):
+    """按字体分段用ImageDraw.text绘制（回退字体与主字体基线对齐）"""
+    chain = font_cache.get_chain(font)
+    if chain is None:
+        draw.text(xy, text, fill=fill, font=font)
+        return
+    x, y = xy
+    for run_font, dy, run in chain.runs(text):
+        draw.text((x, y + dy), run, fill=fill, font=run_font)
+        x += run_font.getlength(run)
+
+
+def font_key(font):
+    """返回字体的缓存键 (路径, 索引, 字号)，非FreeType字体返回None"""
+    if not isinstance(font, ImageFont.FreeTypeFont):
+        return None
+    return (font.path, font.index, font.size)
+
+
+class GlyphAtlas:
+    """字形遮罩图集：缓存单个字符的遮罩、偏移和步进宽度，以及字符对的字距修正"""
+
+    def __init__(self, maxsize=8192):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._glyphs = OrderedDict()
+        self._kerning = {}
+        self._lock = threading.Lock()
+
+    def get_glyph(self, font, key, ch, mode="L"):
+        """获取字形 (遮罩, 偏移, 步进宽度)，未缓存时光栅化"""
+        glyph_key = (key, mode, ch)
+        with self._lock:
+            glyph = self._glyphs.get(glyph_key)
+            if glyph is not None:
+                self.hits += 1
+                self._glyphs.move_to_end(glyph_key)
+                return glyph
+            self.misses += 1
+
+        mask, offset = font.getmask2(ch, mode)
+        if mask.size[0] == 0 or mask.size[1] == 0:
+            mask = None  # 空白字符（如空格）只占步进宽度
+        glyph = (mask, offset, font.getlength(ch))
+
+        with self._lock:
+            self._glyphs[glyph_key] = glyph
+            while len(self._glyphs) > self.maxsize:
+                self._glyphs.popitem(last=False)
+        return glyph
+
+    def get_kerning(self, font, key, prev_ch, ch, prev_advance, advance):
+        """获取字符对的字距修正（整对宽度减去单字宽度之和）"""
+        pair_key = (key, prev_ch, ch)
+        kerning = self._kerning.get(pair_key)
+        if kerning is None:
+            kerning = font.getlength(prev_ch + ch) - prev_advance - advance
+            with self._lock:
+                if len(self._kerning) >= self.maxsize * 4:
+                    self._kerning.clear()
+                self._kerning[pair_key] = kerning
+        return kerning
+
+    def draw_text(self, draw, xy, text, fill, font):
+        """用缓存的字形绘制一行文字，无法逐字贴图时退回ImageDraw.text"""
+        chain = font_cache.get_chain(font)
+        if chain is None or needs_shaping(text):
+            draw_runs(draw, xy, text, fill, font)
+            return
+
+        ink = draw._getink(fill)[0]
+        mode = draw.fontmode
+        # 与ImageDraw.text取整方式相同：起点按FreeType的26.6定点数取到1/64像素（步进宽度本来就是1/64的整数倍），
+        # 字形的横坐标四舍五入、纵坐标五舍六入，居中行的半像素起点也与直接绘制逐像素一致
+        x, y = math.floor(xy[0] * 64 + 0.5) / 64, math.floor(xy[1] * 64 + 0.5) / 64
+        top = math.ceil(y - 0.5)
+        font_for = chain.font_for
+        prev_ch = None
+        prev_font = None
+        prev_advance = 0
+        for ch in text:
+            ch_font, key, dy = font_for(ch)
+            mask, offset, advance = self.get_glyph(ch_font, key, ch, mode)
+            if ch_font is prev_font:
+                # 字距只在同一字体的字符之间修正
+                x += self.get_kerning(ch_font, key, prev_ch, ch, prev_advance, advance)
+            if mask is not None:
+                draw.draw.draw_bitmap((math.floor(x + 0.5) + offset[0], top + offset[1] + dy), mask, ink)
+            x += advance
+            prev_ch = ch
+            prev_font = ch_font
+            prev_advance = advance
+
+    def clear(self):
+        """清空缓存和计数"""
+        with self._lock:
+            self._glyphs.clear()
+            self._kerning.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "glyphs": len(self._glyphs),
+                "kerning_pairs": len(self._kerning),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# 进程共享的字形图集
+glyph_atlas = GlyphAtlas()
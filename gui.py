@@ -0,0 +1,1035 @@
+"""图形界面：只在启动界面时导入tkinter，渲染模块和命令行不依赖本模块"""
+import tkinter as tk
+from tkinter import ttk
+import time
+import io
+import os
+
+import encoder
+import instrumentation
+import job_queue
+import preview
+import renderer
+
+class PreviewSurface:
+    """预览画布上常驻的一张PhotoImage和一个图片项：尺寸和模式不变时原地paste，只在变化时重新分配
+
+    提示文字也复用同一个文字项；stats()返回更新次数、PhotoImage分配次数和显示耗时。
+    """
+    
+    def __init__(self, canvas, default_size):
+        self.canvas = canvas
+        self.default_size = default_size
+        self.photo = None
+        self.photo_key = None  # (模式, 尺寸)
+        self.image_item = canvas.create_image(0, 0, anchor=tk.NW, state=tk.HIDDEN)
+        self.text_item = canvas.create_text(default_size[0] // 2, default_size[1] // 2, state=tk.HIDDEN)
+        self.updates = 0
+        self.allocations = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+    
+    def canvas_size(self):
+        """画布当前尺寸（尚未显示时用默认尺寸）"""
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return self.default_size
+        return width, height
+    
+    def show_image(self, image):
+        """显示预览图，居中放置"""
+        from PIL import ImageTk
+        start = time.perf_counter()
+        # PhotoImage只支持这几种模式，其他模式先转换，保证paste时不再逐次转换
+        if image.mode not in ("1", "L", "RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        key = (image.mode, image.size)
+        if key != self.photo_key:
+            # 尺寸或模式变化：重新分配PhotoImage并换到图片项上
+            self.photo = ImageTk.PhotoImage(image.mode, image.size)
+            self.photo_key = key
+            self.allocations += 1
+            self.canvas.itemconfig(self.image_item, image=self.photo)
+        self.photo.paste(image)
+        
+        canvas_width, canvas_height = self.canvas_size()
+        self.canvas.coords(self.image_item, (canvas_width - image.width) // 2, (canvas_height - image.height) // 2)
+        self.canvas.itemconfig(self.image_item, state=tk.NORMAL)
+        self.canvas.itemconfig(self.text_item, state=tk.HIDDEN)
+        
+        elapsed = time.perf_counter() - start
+        self.updates += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+    
+    def show_message(self, text, fill, font):
+        """隐藏预览图，显示提示文字（PhotoImage保留，下次同尺寸的预览直接paste）"""
+        canvas_width, canvas_height = self.canvas_size()
+        self.canvas.coords(self.text_item, canvas_width // 2, canvas_height // 2)
+        self.canvas.itemconfig(self.text_item, text=text, fill=fill, font=font, state=tk.NORMAL)
+        self.canvas.itemconfig(self.image_item, state=tk.HIDDEN)
+    
+    def stats(self):
+        """返回预览显示统计信息"""
+        return {
+            "updates": self.updates,
+            "allocations": self.allocations,
+            "mean_ms": round(self.total_seconds / self.updates * 1000, 3) if self.updates else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+class TextToImageApp:
+    def __init__(self, root):
+        import animation
+        self.root = root
+        self.root.title("文字转图片工具")
+        self.root.geometry("1400x680")
+        
+        # 居中窗口
+        self.center_window()
+        
+        # 存储生成的图片对象、渲染参数（用于查找缓存）和对应的计时记录
+        self.generated_image = None
+        self.render_params = None
+        self.last_trace = None
+        
+        # 当前选择的图片格式和编码档位
+        self.image_format = tk.StringVar(value="PNG")
+        self.encoder_profile = tk.StringVar(value=encoder.DEFAULT_PROFILE["PNG"])
+        
+        # 后台编码保存线程
+        self.background_encoder = encoder.BackgroundEncoder()
+        
+        # 转换任务队列（最多同时运行两个转换）
+        self.job_queue = job_queue.JobQueue(workers=2, on_update=self.on_job_update)
+        
+        # 当前选择的分辨率类型
+        self.resolution_type = tk.StringVar(value="预设")
+        self.preset_resolution = tk.StringVar(value="1920×1080 (Full HD)")
+        self.custom_width = tk.StringVar(value="1920")
+        self.custom_height = tk.StringVar(value="1080")
+        
+        # 颜色设置
+        self.text_color = (0, 0, 0)  # 默认黑色
+        self.bg_color = (255, 255, 255)  # 默认白色
+        self.text_color_hex = "#000000"
+        self.bg_color_hex = "#FFFFFF"
+        self.bg_transparent = False
+        
+        # 字体大小设置
+        self.font_size = tk.IntVar(value=40)
+        
+        # 页面模式（固定尺寸 / 自动高度 / 分页）
+        self.page_mode = tk.StringVar(value=renderer.PAGE_MODES[0])
+        
+        # 文字效果（描边 / 阴影 / 渐变填充）
+        self.outline_var = tk.BooleanVar(value=False)
+        self.shadow_var = tk.BooleanVar(value=False)
+        self.gradient_var = tk.BooleanVar(value=False)
+        
+        # 动画（仅GIF/WEBP）
+        self.animation_type = tk.StringVar(value="无")
+        self.animation_duration = tk.StringVar(value=str(animation.DEFAULT_DURATION))
+        
+        # 预览相关
+        self.preview_canvas = None
+        self.preview_surface = None
+        self.preview_update_timer = None
+        self.preview_worker = preview.PreviewWorker(self.on_preview_ready)
+        
+        # 设置UI
+        self.setup_ui()
+    
+    def center_window(self):
+        """居中显示窗口"""
+        self.root.update_idletasks()
+        width = self.root.winfo_width()
+        height = self.root.winfo_height()
+        x = (self.root.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.root.winfo_screenheight() // 2) - (height // 2)
+        self.root.geometry(f'{width}x{height}+{x}+{y}')
+    
+    def setup_ui(self):
+        """创建所有UI组件"""
+        # 创建主布局容器（左右分割）
+        self.setup_main_layout()
+    
+    def setup_main_layout(self):
+        """设置主布局（左右分割）"""
+        # 创建主容器Frame
+        main_container = tk.Frame(self.root)
+        main_container.pack(fill=tk.BOTH, expand=True)
+        
+        # 左侧容器
+        left_frame = tk.Frame(main_container)
+        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # 右侧预览容器
+        right_frame = tk.Frame(main_container, width=600)
+        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, padx=10, pady=10)
+        right_frame.pack_propagate(False)  # 保持固定宽度
+        
+        # 设置左侧UI
+        self.setup_left_ui(left_frame)
+        
+        # 设置右侧预览UI
+        self.setup_preview_area(right_frame)
+        
+        # 初始化预览（延迟执行，确保所有组件已创建）
+        self.root.after(100, self.update_preview)
+    
+    def setup_left_ui(self, parent):
+        """设置左侧UI组件"""
+        import animation
+        # 标题
+        title_label = tk.Label(parent, text="文字转图片工具", font=("Arial", 20, "bold"))
+        title_label.pack(pady=10)
+        
+        # 文字输入区域
+        input_frame = tk.LabelFrame(parent, text="输入文字", padx=10, pady=10)
+        input_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.text_input = tk.Text(input_frame, wrap=tk.WORD, font=("Arial", 12), height=10)
+        self.text_input.pack(fill=tk.BOTH, expand=True)
+        
+        scrollbar = tk.Scrollbar(self.text_input)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text_input.config(yscrollcommand=scrollbar.set)
+        scrollbar.config(command=self.text_input.yview)
+        
+        # 绑定文字输入变化事件，触发预览更新
+        self.text_input.bind('<KeyRelease>', lambda e: self.schedule_preview_update())
+        self.text_input.bind('<Button-1>', lambda e: self.schedule_preview_update())
+        
+        # 控制区域
+        control_frame = tk.Frame(parent)
+        control_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        # 图片格式选择
+        format_frame = tk.LabelFrame(control_frame, text="图片格式", padx=10, pady=10)
+        format_frame.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        formats = [("JPG", "JPG"), ("PNG", "PNG"), ("BMP", "BMP"), ("GIF", "GIF"), ("WEBP", "WEBP")]
+        for text, value in formats:
+            rb = tk.Radiobutton(format_frame, text=text, variable=self.image_format, value=value, 
+                              command=self.on_image_format_change)
+            rb.pack(side=tk.LEFT, padx=5)
+        
+        # 编码档位选择（速度/体积）
+        profile_label = tk.Label(format_frame, text="编码:")
+        profile_label.pack(side=tk.LEFT, padx=(10, 2))
+        self.profile_combo = ttk.Combobox(format_frame, textvariable=self.encoder_profile,
+                                          values=encoder.profile_names("PNG"), state="readonly", width=6)
+        self.profile_combo.pack(side=tk.LEFT, padx=2)
+        
+        # 分辨率选择
+        resolution_frame = tk.LabelFrame(control_frame, text="分辨率", padx=10, pady=10)
+        resolution_frame.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        preset_resolutions = renderer.PRESET_RESOLUTIONS + ["自定义"]
+        resolution_combo = ttk.Combobox(resolution_frame, textvariable=self.preset_resolution, 
+                                       values=preset_resolutions, state="readonly", width=20)
+        resolution_combo.pack(side=tk.LEFT, padx=5)
+        resolution_combo.bind("<<ComboboxSelected>>", self.on_resolution_change)
+        
+        # 自定义分辨率输入区域
+        self.custom_resolution_frame = tk.Frame(resolution_frame)
+        
+        width_label = tk.Label(self.custom_resolution_frame, text="宽:")
+        width_label.pack(side=tk.LEFT, padx=2)
+        width_entry = tk.Entry(self.custom_resolution_frame, textvariable=self.custom_width, width=8)
+        width_entry.pack(side=tk.LEFT, padx=2)
+        width_entry.bind('<KeyRelease>', lambda e: self.schedule_preview_update())
+        
+        height_label = tk.Label(self.custom_resolution_frame, text="高:")
+        height_label.pack(side=tk.LEFT, padx=2)
+        height_entry = tk.Entry(self.custom_resolution_frame, textvariable=self.custom_height, width=8)
+        height_entry.pack(side=tk.LEFT, padx=2)
+        height_entry.bind('<KeyRelease>', lambda e: self.schedule_preview_update())
+        
+        # 颜色选择区域
+        color_frame = tk.LabelFrame(parent, text="颜色设置", padx=10, pady=10)
+        color_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        # 文字颜色选择
+        text_color_frame = tk.Frame(color_frame)
+        text_color_frame.pack(side=tk.LEFT, padx=10)
+        
+        text_color_label = tk.Label(text_color_frame, text="文字颜色:")
+        text_color_label.pack(side=tk.LEFT, padx=5)
+        
+        self.text_color_button = tk.Button(text_color_frame, text="#000000", bg="#000000", fg="white",
+                                          command=self.choose_text_color, width=12, height=1)
+        self.text_color_button.pack(side=tk.LEFT, padx=5)
+        
+        # 背景颜色选择
+        bg_color_frame = tk.Frame(color_frame)
+        bg_color_frame.pack(side=tk.LEFT, padx=10)
+        
+        bg_color_label = tk.Label(bg_color_frame, text="背景颜色:")
+        bg_color_label.pack(side=tk.LEFT, padx=5)
+        
+        self.bg_color_button = tk.Button(bg_color_frame, text="#FFFFFF", bg="#FFFFFF", fg="black",
+                                        command=self.choose_bg_color, width=12, height=1)
+        self.bg_color_button.pack(side=tk.LEFT, padx=5)
+        
+        # 透明背景复选框
+        self.bg_transparent_var = tk.BooleanVar(value=False)
+        self.bg_transparent_check = tk.Checkbutton(color_frame, text="透明背景 (仅PNG)", 
+                                                   variable=self.bg_transparent_var,
+                                                   command=self.on_bg_transparent_change)
+        self.bg_transparent_check.pack(side=tk.LEFT, padx=10)
+        
+        # 文字大小选择区域
+        font_frame = tk.LabelFrame(parent, text="文字设置", padx=10, pady=10)
+        font_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        font_size_label = tk.Label(font_frame, text="文字大小:")
+        font_size_label.pack(side=tk.LEFT, padx=5)
+        
+        font_size_spinbox = tk.Spinbox(font_frame, from_=10, to=200, textvariable=self.font_size,
+                                       width=10, command=self.on_font_size_change)
+        font_size_spinbox.pack(side=tk.LEFT, padx=5)
+        font_size_spinbox.bind('<KeyRelease>', lambda e: self.on_font_size_change())
+        
+        font_size_unit_label = tk.Label(font_frame, text="像素")
+        font_size_unit_label.pack(side=tk.LEFT, padx=5)
+        
+        # 页面模式选择
+        page_mode_label = tk.Label(font_frame, text="页面模式:")
+        page_mode_label.pack(side=tk.LEFT, padx=(20, 5))
+        
+        page_mode_combo = ttk.Combobox(font_frame, textvariable=self.page_mode, values=renderer.PAGE_MODES,
+                                       state="readonly", width=10)
+        page_mode_combo.pack(side=tk.LEFT, padx=5)
+        page_mode_combo.bind("<<ComboboxSelected>>", lambda e: self.update_preview())
+        
+        # 文字效果
+        effects_frame = tk.Frame(parent)
+        effects_frame.pack(fill=tk.X, padx=20)
+        
+        effects_label = tk.Label(effects_frame, text="文字效果:")
+        effects_label.pack(side=tk.LEFT, padx=5)
+        
+        for text, variable in (("描边", self.outline_var), ("阴影", self.shadow_var), ("渐变填充", self.gradient_var)):
+            check = tk.Checkbutton(effects_frame, text=text, variable=variable,
+                                   command=self.schedule_preview_update)
+            check.pack(side=tk.LEFT, padx=5)
+        
+        # 动画类型和时长（仅GIF/WEBP）
+        animation_label = tk.Label(effects_frame, text="动画 (GIF/WEBP):")
+        animation_label.pack(side=tk.LEFT, padx=(20, 5))
+        
+        animation_combo = ttk.Combobox(effects_frame, textvariable=self.animation_type,
+                                       values=["无"] + animation.ANIMATION_TYPES, state="readonly", width=8)
+        animation_combo.pack(side=tk.LEFT, padx=5)
+        animation_combo.bind("<<ComboboxSelected>>", lambda e: self.on_animation_change())
+        
+        duration_spinbox = tk.Spinbox(effects_frame, from_=0.5, to=60, increment=0.5,
+                                      textvariable=self.animation_duration, width=5)
+        duration_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        duration_unit_label = tk.Label(effects_frame, text="秒")
+        duration_unit_label.pack(side=tk.LEFT)
+        
+        # 操作区域
+        action_frame = tk.Frame(parent)
+        action_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        # 转换按钮
+        self.convert_button = tk.Button(action_frame, text="转换", command=self.on_convert_click, 
+                                       font=("Arial", 12), bg="#4CAF50", fg="white", padx=20, pady=5)
+        self.convert_button.pack(side=tk.LEFT, padx=5)
+        
+        # 按全部预设分辨率输出（排版一次，多核并行光栅化）
+        presets_button = tk.Button(action_frame, text="全部预设", command=self.on_presets_click,
+                                   font=("Arial", 12), padx=10, pady=5)
+        presets_button.pack(side=tk.LEFT, padx=5)
+        
+        # 进度条
+        self.progress_bar = ttk.Progressbar(action_frame, mode='determinate', length=300)
+        self.progress_bar.pack(side=tk.LEFT, padx=10)
+        self.progress_bar.pack_forget()  # 初始隐藏
+        
+        # 保存按钮
+        self.save_button = tk.Button(action_frame, text="保存", command=self.on_save_click, 
+                                    font=("Arial", 12), bg="#2196F3", fg="white", padx=20, pady=5, 
+                                    state=tk.DISABLED)
+        self.save_button.pack(side=tk.LEFT, padx=5)
+        
+        # 取消和移除任务按钮
+        self.cancel_button = tk.Button(action_frame, text="取消", command=self.on_cancel_click,
+                                       font=("Arial", 12), padx=10, pady=5)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        remove_button = tk.Button(action_frame, text="移除", command=self.on_remove_click,
+                                  font=("Arial", 12), padx=10, pady=5)
+        remove_button.pack(side=tk.LEFT, padx=5)
+        
+        # 转换任务列表（选中已完成的任务后可保存其结果）
+        self.job_list = ttk.Treeview(parent, columns=("name", "status", "detail"), show="headings", height=4)
+        self.job_list.heading("name", text="任务")
+        self.job_list.heading("status", text="状态")
+        self.job_list.heading("detail", text="进度/耗时")
+        self.job_list.column("name", width=360)
+        self.job_list.column("status", width=80, anchor=tk.CENTER)
+        self.job_list.column("detail", width=100, anchor=tk.CENTER)
+        self.job_list.pack(fill=tk.X, padx=10)
+        self.job_list.bind("<<TreeviewSelect>>", self.on_job_select)
+        
+        # 状态标签
+        self.status_label = tk.Label(parent, text="请输入文字并选择格式和分辨率，然后点击转换", 
+                                     fg="gray", font=("Arial", 10))
+        self.status_label.pack(pady=5)
+    
+    def setup_preview_area(self, parent):
+        """设置右侧预览区域"""
+        # 预览标题
+        preview_title = tk.Label(parent, text="预览", font=("Arial", 16, "bold"))
+        preview_title.pack(pady=10)
+        
+        # 预览Canvas
+        preview_frame = tk.Frame(parent, relief=tk.SUNKEN, borderwidth=2)
+        preview_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        self.preview_canvas = tk.Canvas(preview_frame, width=580, height=400, bg="white")
+        self.preview_canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.preview_surface = PreviewSurface(self.preview_canvas, preview.PREVIEW_SIZE)
+        
+        # 分辨率信息标签
+        self.resolution_label = tk.Label(parent, text="分辨率: 1920 × 1080", 
+                                         fg="gray", font=("Arial", 10))
+        self.resolution_label.pack(pady=5)
+    
+    def on_font_size_change(self, event=None):
+        """字体大小变化处理"""
+        # 延迟更新预览（防抖）
+        self.schedule_preview_update()
+    
+    def schedule_preview_update(self, delay=300):
+        """安排预览更新（防抖）"""
+        if self.preview_update_timer:
+            self.root.after_cancel(self.preview_update_timer)
+        self.preview_update_timer = self.root.after(delay, self.update_preview)
+    
+    def collect_preview_params(self):
+        """在界面线程中读取预览所需的设置，没有可预览的内容时返回None"""
+        # 获取当前设置
+        text = self.text_input.get("1.0", tk.END).strip()
+        if not text:
+            return None
+        
+        try:
+            width, height = self.get_resolution()
+            font_size = self.font_size.get()
+        except:
+            return None
+        
+        format_type = self.image_format.get()
+        return {
+            "text": text,
+            "width": width,
+            "height": height,
+            "format_type": format_type,
+            "text_color": self.text_color,
+            "bg_color": self.bg_color,
+            "bg_transparent": (format_type == "PNG" and self.bg_transparent_var.get()),
+            "font_size": font_size,
+            "page_mode": self.page_mode.get(),
+            "effects": self.current_effects(),
+        }
+    
+    def update_preview(self):
+        """提交预览请求，渲染在后台线程中进行，完成后由show_preview显示"""
+        try:
+            self.preview_worker.submit(self.collect_preview_params())
+        except Exception as e:
+            print(f"预览生成错误: {e}")
+    
+    def on_preview_ready(self, token, preview_image, error):
+        """预览线程回调：切回界面线程显示结果"""
+        self.root.after(0, lambda: self.show_preview(token, preview_image, error))
+    
+    def show_preview(self, token, preview_image, error):
+        """显示预览图（只显示最新请求的结果）"""
+        if not self.preview_worker.is_current(token):
+            return
+        try:
+            if error:
+                raise RuntimeError(error)
+            
+            if preview_image:
+                # 原地更新常驻的PhotoImage和图片项
+                self.preview_surface.show_image(preview_image)
+                
+                # 更新分辨率信息
+                try:
+                    width, height = self.get_resolution()
+                    self.resolution_label.config(text=f"分辨率: {width} × {height}")
+                except:
+                    pass
+            else:
+                # 显示占位提示
+                self.preview_surface.show_message("请输入文字以查看预览", "gray", ("Arial", 14))
+                self.resolution_label.config(text="分辨率: -- × --")
+                
+        except Exception as e:
+            print(f"预览更新错误: {e}")
+            self.preview_surface.show_message("预览生成失败", "red", ("Arial", 12))
+    
+    def on_resolution_change(self, event=None):
+        """处理分辨率选择变化"""
+        selected = self.preset_resolution.get()
+        if selected == "自定义":
+            self.custom_resolution_frame.pack(side=tk.LEFT, padx=5)
+        else:
+            self.custom_resolution_frame.pack_forget()
+        # 更新预览
+        self.schedule_preview_update()
+    
+    def rgb_to_hex(self, rgb):
+        """将RGB元组转换为十六进制字符串"""
+        return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}".upper()
+    
+    def choose_text_color(self):
+        """选择文字颜色"""
+        from tkinter import colorchooser, messagebox
+        # 确保当前颜色值正确
+        initial_rgb = tuple(map(int, self.text_color[:3])) if isinstance(self.text_color, (tuple, list)) and len(self.text_color) >= 3 else (0, 0, 0)
+        
+        # 确保十六进制字符串格式正确（必须是大写）
+        initial_hex = self.rgb_to_hex(initial_rgb)
+        self.text_color_hex = initial_hex  # 同步更新十六进制值
+        
+        # 使用十六进制字符串格式作为初始颜色（确保格式正确）
+        color = colorchooser.askcolor(initialcolor=initial_hex, title="选择文字颜色")
+        if color and color[0] is not None:  # 用户没有取消
+            try:
+                rgb = tuple(map(int, color[0]))
+                self.text_color = rgb
+                self.text_color_hex = color[1] if color[1] else self.rgb_to_hex(rgb)
+                self.update_color_preview()
+                # 更新预览
+                self.schedule_preview_update()
+                print(f"文字颜色已更新: RGB={rgb}, HEX={self.text_color_hex}")
+            except Exception as e:
+                print(f"颜色选择错误: {e}")
+                messagebox.showerror("错误", f"颜色选择失败: {e}")
+    
+    def choose_bg_color(self):
+        """选择背景颜色"""
+        from tkinter import colorchooser, messagebox
+        # 确保当前颜色值正确
+        initial_rgb = tuple(map(int, self.bg_color[:3])) if isinstance(self.bg_color, (tuple, list)) and len(self.bg_color) >= 3 else (255, 255, 255)
+        
+        # 确保十六进制字符串格式正确（必须是大写）
+        initial_hex = self.rgb_to_hex(initial_rgb)
+        self.bg_color_hex = initial_hex  # 同步更新十六进制值
+        
+        # 使用十六进制字符串格式作为初始颜色（确保格式正确）
+        color = colorchooser.askcolor(initialcolor=initial_hex, title="选择背景颜色")
+        if color and color[0] is not None:  # 用户没有取消
+            try:
+                rgb = tuple(map(int, color[0]))
+                self.bg_color = rgb
+                self.bg_color_hex = color[1] if color[1] else self.rgb_to_hex(rgb)
+                self.update_color_preview()
+                # 更新预览
+                self.schedule_preview_update()
+                print(f"背景颜色已更新: RGB={rgb}, HEX={self.bg_color_hex}")
+            except Exception as e:
+                print(f"背景颜色选择错误: {e}")
+                messagebox.showerror("错误", f"背景颜色选择失败: {e}")
+    
+    def update_color_preview(self):
+        """更新颜色预览按钮"""
+        self.text_color_button.config(text=self.text_color_hex, bg=self.text_color_hex,
+                                     fg="white" if sum(self.text_color) < 382 else "black")
+        if not self.bg_transparent_var.get():
+            self.bg_color_button.config(text=self.bg_color_hex, bg=self.bg_color_hex,
+                                       fg="white" if sum(self.bg_color) < 382 else "black")
+    
+    def on_bg_transparent_change(self):
+        """处理透明背景复选框变化"""
+        self.bg_transparent = self.bg_transparent_var.get()
+        if self.bg_transparent:
+            self.bg_color_button.config(state=tk.DISABLED)
+        else:
+            self.bg_color_button.config(state=tk.NORMAL)
+            self.update_color_preview()
+        # 更新预览
+        self.schedule_preview_update()
+    
+    def on_image_format_change(self):
+        """处理图片格式变化"""
+        format_type = self.image_format.get()
+        if format_type == "PNG":
+            self.bg_transparent_check.config(state=tk.NORMAL)
+        else:
+            # 非PNG格式时禁用透明背景选项
+            self.bg_transparent_var.set(False)
+            self.bg_transparent = False
+            self.bg_transparent_check.config(state=tk.DISABLED)
+            self.bg_color_button.config(state=tk.NORMAL)
+            self.update_color_preview()
+        # 更新可选的编码档位
+        self.profile_combo.config(values=encoder.profile_names(format_type))
+        self.encoder_profile.set(encoder.DEFAULT_PROFILE.get(format_type, "默认"))
+        # 更新预览
+        self.schedule_preview_update()
+    
+    def on_animation_change(self):
+        """选择动画时WEBP改用动画的默认编码档位（无损）"""
+        import animation
+        format_type = self.image_format.get()
+        if self.animation_type.get() != "无" and format_type in animation.DEFAULT_PROFILE:
+            self.encoder_profile.set(animation.DEFAULT_PROFILE[format_type])
+    
+    def collect_animation_params(self, format_type, width, height):
+        """在界面线程中读取动画设置，返回 (动画类型, 时长秒)；未选择动画或格式不支持时返回None"""
+        import animation
+        kind = self.animation_type.get()
+        if kind == "无" or format_type not in animation.ANIMATION_FORMATS:
+            return None
+        try:
+            duration = float(self.animation_duration.get())
+        except ValueError:
+            raise ValueError(f"无效的动画时长: {self.animation_duration.get()}")
+        animation.check_options(False, self.current_effects(), format_type, width, height, duration)
+        return kind, duration
+    
+    def get_resolution(self):
+        """获取当前选择的分辨率，返回(width, height)元组"""
+        selected = self.preset_resolution.get()
+        if selected == "自定义":
+            try:
+                width = int(self.custom_width.get())
+                height = int(self.custom_height.get())
+                # 验证分辨率范围
+                if (width < renderer.MIN_RESOLUTION or width > renderer.MAX_RESOLUTION or
+                        height < renderer.MIN_RESOLUTION or height > renderer.MAX_RESOLUTION):
+                    raise ValueError("分辨率超出有效范围")
+                return (width, height)
+            except ValueError as e:
+                raise ValueError(f"无效的自定义分辨率: {e}")
+        else:
+            # 解析预设分辨率
+            return renderer.parse_resolution(selected)
+    
+    def current_effects(self):
+        """按复选框生成文字效果，描边和阴影的粗细随文字大小变化，颜色由文字颜色推出；都未选中时返回None"""
+        import effects
+        font_size = self.font_size.get()
+        text_color = tuple(self.text_color[:3])
+        # 深色文字用白色描边，浅色文字用黑色描边
+        dark = sum(text_color) < 384
+        options = {}
+        if self.outline_var.get():
+            options["outline"] = max(1, font_size // 20)
+            options["outline_color"] = (255, 255, 255) if dark else (0, 0, 0)
+        if self.shadow_var.get():
+            offset = max(1, font_size // 16)
+            options["shadow"] = (offset, offset)
+            options["shadow_blur"] = offset
+        if self.gradient_var.get():
+            options["gradient"] = (text_color, tuple(255 - c for c in text_color))
+        return effects.from_options(options)
+    
+    def validate_inputs(self):
+        """验证用户输入"""
+        text = self.text_input.get("1.0", tk.END).strip()
+        if not text:
+            raise ValueError("请输入要转换的文字")
+        
+        try:
+            width, height = self.get_resolution()
+        except ValueError as e:
+            raise ValueError(str(e))
+        
+        return text, width, height
+    
+    def generate_text_image(self, text, width, height, format_type, text_color, bg_color, bg_transparent, font_size_param, progress_callback, trace=None, should_cancel=None, effects=None):
+        """生成文字图片"""
+        return renderer.render_text_image(text, width, height, format_type, text_color, bg_color,
+                                          bg_transparent, font_size_param, progress_callback, trace=trace,
+                                          should_cancel=should_cancel, effects=effects)
+    
+    def render_image(self, params, progress_callback=None, trace=None, should_cancel=None):
+        """按渲染参数生成单张图片（固定尺寸或自动高度）；超出内存预算时返回保存时才分条渲染的StripDocument"""
+        import strips
+        auto_height = params["page_mode"] == "自动高度"
+        if auto_height or strips.use_strips(params["width"], params["height"], params["format_type"], params["effects"]):
+            # 自动高度要排版后才知道画布大小，由strips按内存预算选择整幅渲染或分条渲染
+            return strips.render_or_strips(params["text"], params["width"], params["height"], params["format_type"],
+                                           params["text_color"], params["bg_color"], params["bg_transparent"],
+                                           params["font_size"], auto_height, progress_callback, trace,
+                                           should_cancel, params["effects"])
+        return self.generate_text_image(params["text"], params["width"], params["height"], params["format_type"],
+                                        params["text_color"], params["bg_color"], params["bg_transparent"],
+                                        params["font_size"], progress_callback, trace, should_cancel,
+                                        params["effects"])
+    
+    def load_cached_image(self, params, profile):
+        """从渲染缓存读取已编码的图片，未启用缓存或未命中时返回None"""
+        import render_cache
+        cache = render_cache.get_cache()
+        if cache is None:
+            return None
+        data = cache.get(render_cache.render_key(profile=profile, **params))
+        if data is None:
+            return None
+        from PIL import Image
+        return Image.open(io.BytesIO(data))
+    
+    def collect_convert_params(self):
+        """在界面线程中读取转换所需的全部设置"""
+        # 验证输入
+        text, width, height = self.validate_inputs()
+        
+        # 获取选择的格式
+        format_type = self.image_format.get()
+        
+        # 获取颜色设置
+        text_color = self.text_color
+        bg_color = self.bg_color
+        # 判断是否使用透明背景（需要是PNG格式且选中了透明背景选项）
+        bg_transparent = (format_type == "PNG" and self.bg_transparent_var.get())
+        
+        # 获取字体大小
+        font_size = self.font_size.get()
+        
+        # 验证颜色值
+        if not isinstance(text_color, (tuple, list)) or len(text_color) < 3:
+            print(f"警告: 文字颜色格式错误，重置为黑色")
+            text_color = (0, 0, 0)
+        if not isinstance(bg_color, (tuple, list)) or len(bg_color) < 3:
+            print(f"警告: 背景颜色格式错误，重置为白色")
+            bg_color = (255, 255, 255)
+        
+        return {
+            "text": text,
+            "width": width,
+            "height": height,
+            "format_type": format_type,
+            "text_color": text_color,
+            "bg_color": bg_color,
+            "bg_transparent": bg_transparent,
+            "font_size": font_size,
+            "page_mode": self.page_mode.get(),
+            "effects": self.current_effects(),
+        }
+    
+    def convert_job(self, job, params, profile, animation_params=None):
+        """转换任务（在任务队列的工作线程中执行），返回 (图片、分页文档或动画, 渲染参数, 计时记录)"""
+        import animation
+        print(f"转换任务 #{job.job_id} - 文字颜色: {params['text_color']}, 背景颜色: {params['bg_color']}, 字体大小: {params['font_size']}")
+        
+        # 生成图片（记录各阶段耗时）
+        trace = instrumentation.RenderTrace("convert")
+        if animation_params is not None:
+            # 只排版，帧在保存时并行生成
+            kind, duration = animation_params
+            clip = animation.Animation(params["text"], params["width"], params["height"], params["format_type"],
+                                       params["text_color"], params["bg_color"], params["font_size"], kind,
+                                       duration, trace=trace)
+            job.report_progress(100)
+            result = (clip, None, trace)
+        elif params["page_mode"] == "分页":
+            # 只排版，页面在保存时逐页生成
+            document = renderer.PagedDocument(params["text"], params["width"], params["height"],
+                                              params["format_type"], params["text_color"], params["bg_color"],
+                                              params["bg_transparent"], params["font_size"], trace=trace,
+                                              effects=params["effects"])
+            job.report_progress(100)
+            result = (document, None, trace)
+        else:
+            # 相同参数和档位渲染过时直接使用缓存的编码结果
+            with trace.stage("cache"):
+                image = self.load_cached_image(params, profile)
+            if image is not None:
+                trace.count("cache_hit")
+                job.report_progress(100)
+            else:
+                image = self.render_image(params, job.report_progress, trace, job.should_cancel)
+            result = (image, params, trace)
+        trace.log(f"转换完成: {trace.summary()}")
+        trace.export()
+        return result
+    
+    def on_convert_click(self):
+        """转换按钮点击事件处理：把当前设置加入转换队列"""
+        from tkinter import messagebox
+        try:
+            params = self.collect_convert_params()
+            animation_params = self.collect_animation_params(params["format_type"], params["width"], params["height"])
+        except Exception as e:
+            self.status_label.config(text=f"转换失败: {e}", fg="red")
+            messagebox.showerror("错误", str(e))
+            return
+        
+        profile = self.encoder_profile.get()
+        name = f"{params['text'][:12]} ({params['width']}×{params['height']} {params['format_type']})"
+        if animation_params is not None:
+            name = f"{name} {animation_params[0]}动画"
+        job = self.job_queue.submit(lambda job: self.convert_job(job, params, profile, animation_params), name,
+                                    job_queue.PRIORITY_INTERACTIVE)
+        self.status_label.config(text=f"已加入转换队列: 任务 #{job.job_id}", fg="blue")
+    
+    def on_presets_click(self):
+        """全部预设按钮点击事件处理：选择输出目录后把当前文字按全部预设分辨率输出"""
+        import presets
+        from tkinter import filedialog, messagebox
+        try:
+            params = self.collect_convert_params()
+            if params["page_mode"] not in presets.PRESET_PAGE_MODES:
+                raise ValueError(f"全部预设只支持{'/'.join(presets.PRESET_PAGE_MODES)}模式")
+        except Exception as e:
+            self.status_label.config(text=f"转换失败: {e}", fg="red")
+            messagebox.showerror("错误", str(e))
+            return
+        directory = filedialog.askdirectory(title="选择输出目录")
+        if not directory:
+            return
+        
+        # 当前分辨率和字号作为参考，其他尺寸按宽度等比缩放
+        options = dict(params, profile=self.encoder_profile.get())
+        name = time.strftime("text_%Y%m%d_%H%M%S")
+        total = len(presets.preset_sizes())
+        
+        def presets_job(job):
+            trace = instrumentation.RenderTrace("presets")
+            finished = []
+            
+            def on_result(width, height, filename, error):
+                finished.append(filename)
+                job.report_progress(len(finished) / total * 100)
+            
+            results = presets.render_presets(params["text"], directory, name, options, on_result=on_result,
+                                             trace=trace)
+            failed = [f"{width}×{height}: {error}" for width, height, _, error in results if error]
+            if failed:
+                raise ValueError("; ".join(failed))
+            trace.info["summary"] = f"已输出 {len(results)} 个尺寸到 {directory}"
+            trace.export()
+            return (None, None, trace)
+        
+        # 多个尺寸的批量输出排在交互转换之后
+        job = self.job_queue.submit(presets_job, f"{params['text'][:12]} (全部预设 {params['format_type']})",
+                                    job_queue.PRIORITY_BATCH)
+        self.status_label.config(text=f"已加入转换队列: 任务 #{job.job_id}", fg="blue")
+    
+    def on_job_update(self, job):
+        """任务队列回调（工作线程中调用）：切回界面线程刷新任务列表"""
+        status = job.status
+        self.root.after(0, lambda: self.refresh_job(job, status))
+    
+    def refresh_job(self, job, status):
+        """刷新任务列表中的一行；status为回调时的状态，任务结束的那次回调更新状态栏"""
+        from tkinter import messagebox
+        item = str(job.job_id)
+        if job.status == job_queue.JOB_RUNNING:
+            detail = f"{int(job.progress)}%"
+        elif job.elapsed is not None and job.status != job_queue.JOB_PENDING:
+            detail = f"{job.elapsed:.2f} 秒"
+        else:
+            detail = ""
+        values = (f"#{job.job_id} {job.name}", job.status, detail)
+        if self.job_list.exists(item):
+            self.job_list.item(item, values=values)
+        elif self.job_queue.get(job.job_id) is not None:
+            self.job_list.insert("", tk.END, iid=item, values=values)
+        
+        # 进度条显示正在运行的任务
+        running = [j for j in self.job_queue.jobs() if j.status == job_queue.JOB_RUNNING]
+        if running:
+            self.progress_bar.pack(side=tk.LEFT, padx=10, after=self.convert_button)
+            self.progress_bar.config(value=running[0].progress)
+        else:
+            self.progress_bar.pack_forget()
+        
+        if status == job_queue.JOB_DONE and job.result[0] is None:
+            # 全部预设任务已直接写出文件，没有可保存的结果
+            self.status_label.config(text=f"任务 #{job.job_id} 完成: {job.result[2].info['summary']}", fg="green")
+        elif status == job_queue.JOB_DONE:
+            # 新完成的任务成为当前可保存的结果
+            self.job_list.selection_set(item)
+            self.select_job(job)
+            self.status_label.config(text=f"任务 #{job.job_id} 转换完成！请点击保存按钮保存图片", fg="green")
+        elif status == job_queue.JOB_FAILED:
+            self.status_label.config(text=f"任务 #{job.job_id} 转换失败: {job.error}", fg="red")
+            messagebox.showerror("错误", job.error)
+        elif status == job_queue.JOB_CANCELLED:
+            self.status_label.config(text=f"任务 #{job.job_id} 已取消", fg="gray")
+    
+    def select_job(self, job):
+        """把已完成任务的结果设为当前可保存的图片"""
+        if job.result[0] is None:
+            return
+        self.generated_image, self.render_params, self.last_trace = job.result
+        self.save_button.config(state=tk.NORMAL)
+    
+    def on_job_select(self, event=None):
+        """在任务列表中选择已完成的任务"""
+        for item in self.job_list.selection():
+            job = self.job_queue.get(int(item))
+            if job is not None and job.status == job_queue.JOB_DONE:
+                self.select_job(job)
+    
+    def on_cancel_click(self):
+        """取消选中的任务；未选中时取消所有未完成的任务"""
+        items = self.job_list.selection()
+        jobs = [self.job_queue.get(int(item)) for item in items] if items else self.job_queue.jobs()
+        for job in jobs:
+            if job is not None and job.status in (job_queue.JOB_PENDING, job_queue.JOB_RUNNING):
+                self.job_queue.cancel(job.job_id)
+    
+    def on_remove_click(self):
+        """从列表中移除选中的已结束任务，释放其图片"""
+        for item in self.job_list.selection():
+            job = self.job_queue.get(int(item))
+            if job is not None and self.job_queue.remove(job.job_id):
+                self.job_list.delete(item)
+                if job.result is not None and job.result[0] is self.generated_image:
+                    self.generated_image = self.render_params = self.last_trace = None
+                    self.save_button.config(state=tk.DISABLED)
+    
+    def on_save_click(self):
+        """保存按钮点击事件处理"""
+        from tkinter import filedialog, messagebox
+        import animation
+        import export
+        import render_cache
+        import strips
+        if self.generated_image is None:
+            messagebox.showwarning("警告", "没有可保存的图片")
+            return
+        
+        # 获取文件扩展名
+        ext = renderer.FORMAT_EXTENSIONS.get(self.image_format.get(), ".png")
+        
+        # 打开文件保存对话框（分页文档还可以导出为多页TIFF/PDF）
+        filetypes = [(f"{self.image_format.get()} files", f"*{ext}")]
+        if isinstance(self.generated_image, renderer.PagedDocument):
+            filetypes += [("多页 TIFF", "*.tif"), ("PDF", "*.pdf")]
+        filename = filedialog.asksaveasfilename(
+            defaultextension=ext,
+            filetypes=filetypes + [("All files", "*.*")],
+            title="保存图片"
+        )
+        
+        if filename:
+            # 在后台线程中编码保存，界面保持响应
+            image = self.generated_image
+            format_type = self.image_format.get()
+            profile = self.encoder_profile.get()
+            bg_color = self.bg_color
+            params = self.render_params
+            trace = self.last_trace
+            
+            def save_job(progress_callback):
+                if isinstance(image, animation.Animation):
+                    # 动画按转换时的格式并行生成帧，流式写入
+                    if image.format_type != format_type:
+                        raise ValueError(f"动画只能按转换时的格式（{image.format_type}）保存，请重新转换")
+                    result = image.save(filename, profile, progress_callback=progress_callback, trace=trace)
+                    if trace is not None:
+                        trace.export()
+                    return result
+                if isinstance(image, renderer.PagedDocument):
+                    # 分页文档并行生成页面，按扩展名导出为多页TIFF/PDF或编号图片
+                    start = time.perf_counter()
+                    filenames = export.export_document(image, filename, profile=profile,
+                                                       progress_callback=progress_callback)
+                    size_bytes = sum(os.path.getsize(name) for name in filenames)
+                    saved = filenames[0] if len(filenames) == 1 else f"{filenames[0]} 等 {len(filenames)} 个文件"
+                    return encoder.EncodeResult(saved, size_bytes, time.perf_counter() - start,
+                                                encoder.resolve_profile(format_type, profile))
+                rendered = image
+                cache = render_cache.get_cache() if params is not None else None
+                if cache is not None:
+                    # 按保存时选择的格式建键（转换后可能换了格式）
+                    key = render_cache.render_key(profile=profile, **dict(params, format_type=format_type))
+                    data = cache.get(key)
+                    if data is not None:
+                        # 缓存命中：直接写入已编码的字节串
+                        with open(filename, "wb") as f:
+                            f.write(data)
+                        progress_callback(100)
+                        return encoder.EncodeResult(filename, len(data), 0.0,
+                                                    encoder.resolve_profile(format_type, profile))
+                    if getattr(rendered, "format", None) is not None:
+                        # 图片是按其他档位缓存的编码结果，重新渲染以免有损格式二次压缩
+                        rendered = self.render_image(params, trace=trace)
+                if isinstance(rendered, strips.StripDocument):
+                    # 大画布逐条渲染并直接写入文件
+                    if rendered.format_type != format_type:
+                        raise ValueError(f"大画布只能按转换时的格式（{rendered.format_type}）保存，请重新转换")
+                    result = rendered.save(filename, profile, progress_callback, trace=trace)
+                else:
+                    result = encoder.save_image(rendered, filename, format_type, profile, bg_color, progress_callback,
+                                                trace)
+                if cache is not None:
+                    cache.put_file(key, filename)
+                if trace is not None:
+                    trace.export()
+                return result
+            
+            self.save_button.config(state=tk.DISABLED)
+            self.progress_bar.pack(side=tk.LEFT, padx=10, after=self.convert_button)
+            self.progress_bar.config(value=0)
+            self.status_label.config(text="正在保存...", fg="blue")
+            self.background_encoder.submit(
+                save_job,
+                on_progress=self.update_save_progress,
+                on_done=lambda result, error: self.root.after(0, lambda: self.on_save_complete(result, error)))
+    
+    def update_save_progress(self, value):
+        """线程安全的保存进度更新"""
+        self.root.after(0, lambda: self.progress_bar.config(value=value))
+        self.root.after(0, lambda: self.status_label.config(text=f"保存中... {int(value)}%"))
+    
+    def on_save_complete(self, result, error):
+        """后台保存完成后的UI更新"""
+        from tkinter import messagebox
+        self.progress_bar.pack_forget()
+        if error:
+            error_msg = f"保存失败: {error}"
+            self.save_button.config(state=tk.NORMAL)
+            self.status_label.config(text=error_msg, fg="red")
+            messagebox.showerror("错误", error_msg)
+            return
+        
+        # 显示成功消息（含编码耗时和文件大小）
+        print(f"保存完成: {result.filename}, {result.summary()}")
+        self.status_label.config(text=f"图片已保存到: {result.filename} ({result.summary()})", fg="green")
+        messagebox.showinfo("成功", f"图片已成功保存到:\n{result.filename}\n{result.summary()}")
+        
+        # 任务结果保留在任务列表中，可以换个格式或档位再次保存
+        self.save_button.config(state=tk.NORMAL)
+
+def main(started=None, exit_after_startup=False):
+    """启动界面；started为进程入口处的time.perf_counter()，用于记录启动耗时"""
+    started = started or time.perf_counter()
+    trace = instrumentation.RenderTrace("startup")
+    trace.stages["import"] = time.perf_counter() - started
+    
+    with trace.stage("tk_init"):
+        root = tk.Tk()
+    with trace.stage("build_ui"):
+        app = TextToImageApp(root)
+    
+    # 等到窗口第一次显示并绘制完成
+    with trace.stage("first_frame"):
+        root.wait_visibility(root)
+        root.update_idletasks()
+    trace.info["startup_seconds"] = round(time.perf_counter() - started, 6)
+    trace.log(f"启动完成: {trace.summary()}")
+    trace.export()
+    
+    if exit_after_startup:
+        # 只测量启动耗时（bench.py使用）
+        print(trace.to_json())
+        root.destroy()
+        return trace
+    root.mainloop()
+    trace.log(f"预览显示: {app.preview_surface.stats()}")
+    return trace
@@ -0,0 +1,101 @@
+"""渲染计时：记录画布分配、字体加载、排版、光栅化和编码各阶段耗时，可导出为JSON"""
+from contextlib import contextmanager
+import threading
+import time
+import json
+import os
+
+# 详细日志开关（逐行日志只在开启时输出），可用环境变量 TEXT2PIC_VERBOSE=1 打开
+VERBOSE = os.environ.get("TEXT2PIC_VERBOSE", "") not in ("", "0")
+
+# 计时JSON的输出目录，为空时不导出；可用环境变量 TEXT2PIC_TIMINGS 设置
+TIMINGS_DIR = os.environ.get("TEXT2PIC_TIMINGS", "")
+
+_counter_lock = threading.Lock()
+_trace_counter = 0
+
+
+def set_verbose(verbose):
+    """设置详细日志开关"""
+    global VERBOSE
+    VERBOSE = bool(verbose)
+
+
+def set_timings_dir(path):
+    """设置计时JSON的输出目录（None或空字符串表示不导出）"""
+    global TIMINGS_DIR
+    TIMINGS_DIR = path or ""
+
+
+class RenderTrace:
+    """一次渲染的各阶段计时和计数"""
+
+    def __init__(self, name="render", verbose=None):
+        global _trace_counter
+        with _counter_lock:
+            _trace_counter += 1
+            self.trace_id = _trace_counter
+        self.name = name
+        self.verbose = VERBOSE if verbose is None else verbose
+        self.created = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.info = {}
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段，同名阶段的耗时累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        """累加计数"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def log(self, message):
+        """详细日志；热点循环中应先判断 trace.verbose 再拼接消息"""
+        if self.verbose:
+            print(message)
+
+    @property
+    def total(self):
+        """各阶段耗时之和"""
+        return sum(self.stages.values())
+
+    def to_dict(self):
+        """转换为可序列化的字典"""
+        return {
+            "name": self.name,
+            "created": self.created,
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "total": round(self.total, 6),
+            "counters": self.counters,
+            "info": self.info,
+        }
+
+    def to_json(self):
+        """导出为JSON字符串"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def summary(self):
+        """单行摘要，例如 "排版 0.012s, 光栅化 0.230s" """
+        return ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.stages.items())
+
+    def export(self, directory=None):
+        """把计时写入目录下的JSON文件，返回文件路径；未设置目录时不写入"""
+        directory = directory or TIMINGS_DIR
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}-{os.getpid()}-{self.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+        return path
+
+
+def ensure_trace(trace, name="render"):
+    """trace为None时创建一个新的RenderTrace"""
+    return trace if trace is not None else RenderTrace(name)
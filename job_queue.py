@@ -0,0 +1,160 @@
+"""转换任务队列：按优先级排队，固定数量的工作线程执行，每个任务可单独取消并保留自己的结果"""
+import itertools
+import threading
+import queue
+import time
+
+import renderer
+
+# 优先级（数值越小越先执行）：界面上的交互转换先于批量任务
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# 任务状态
+JOB_PENDING = "等待中"
+JOB_RUNNING = "转换中"
+JOB_DONE = "已完成"
+JOB_FAILED = "失败"
+JOB_CANCELLED = "已取消"
+
+
+class Job:
+    """一个转换任务；func(job)在工作线程中执行，应在循环中检查job.should_cancel()"""
+
+    def __init__(self, job_id, name, func, priority, on_update=None):
+        self.job_id = job_id
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.status = JOB_PENDING
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel_event = threading.Event()
+        self._on_update = on_update
+
+    def cancel(self):
+        """请求取消：等待中的任务不再执行，运行中的任务在下一次检查时中止"""
+        self._cancel_event.set()
+
+    def should_cancel(self):
+        """是否已请求取消"""
+        return self._cancel_event.is_set()
+
+    def report_progress(self, value):
+        """更新任务进度（0-100），可直接作为渲染函数的progress_callback"""
+        self.progress = value
+        if self._on_update:
+            self._on_update(self)
+
+    @property
+    def elapsed(self):
+        """运行耗时（秒），未开始时为None"""
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+class JobQueue:
+    """优先级任务队列；on_update(job)在状态或进度变化时于工作线程中调用"""
+
+    def __init__(self, workers=1, on_update=None):
+        self.workers = max(1, workers)
+        self.on_update = on_update
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._job_ids = itertools.count(1)
+        self._jobs = {}
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, name="", priority=PRIORITY_INTERACTIVE):
+        """提交任务，返回Job；同优先级按提交顺序执行"""
+        with self._lock:
+            job = Job(next(self._job_ids), name, func, priority, self._notify)
+            self._jobs[job.job_id] = job
+            # 工作线程按需启动，最多workers个
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put((priority, next(self._sequence), job))
+        self._notify(job)
+        return job
+
+    def cancel(self, job_id):
+        """取消任务，返回是否找到该任务"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        # 状态在锁内比较并设置：工作线程同时开始执行时只有一方能改变等待中的状态
+        with self._lock:
+            cancelled = job.status == JOB_PENDING
+            if cancelled:
+                # 等待中的任务直接标记为已取消，轮到它时跳过
+                job.status = JOB_CANCELLED
+                job.finished = time.time()
+        if cancelled:
+            self._notify(job)
+        return True
+
+    def get(self, job_id):
+        """按编号查找任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """所有任务（按编号排序）"""
+        with self._lock:
+            return [self._jobs[job_id] for job_id in sorted(self._jobs)]
+
+    def remove(self, job_id):
+        """移除已结束的任务（释放其结果），返回是否移除"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in (JOB_PENDING, JOB_RUNNING):
+                return False
+            del self._jobs[job_id]
+            return True
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                if job.status != JOB_PENDING:
+                    continue  # 等待时已被取消
+                if job.should_cancel():
+                    job.status = JOB_CANCELLED
+                    job.finished = time.time()
+                else:
+                    job.status = JOB_RUNNING
+                    job.started = time.time()
+            self._notify(job)
+            if job.status == JOB_CANCELLED:
+                continue
+            try:
+                result = job.func(job)
+                status, error = JOB_DONE, None
+            except renderer.RenderCancelled:
+                status, error = JOB_CANCELLED, None
+            except Exception as e:
+                status, error = JOB_FAILED, str(e)
+            with self._lock:
+                if job.should_cancel():
+                    # 执行期间请求了取消：即使func没有检查should_cancel()也按已取消处理，丢弃结果
+                    job.status = JOB_CANCELLED
+                else:
+                    job.status = status
+                    job.error = error
+                    if status == JOB_DONE:
+                        job.result = result
+                job.finished = time.time()
+            self._notify(job)
@@ -0,0 +1,168 @@
+"""自动换行排版：按字体缓存每个字符的步进宽度（主字体缺少的字符按回退字体测量），用前缀和定位换行点；
+整行的折行结果保存在共享的测量缓存中"""
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+import threading
+
+import font_cache
+import glyph_cache
+import measure_cache
+
+# 不能出现在行首的标点（避头）
+NO_BREAK_BEFORE = set("，。、！？；：」』）》〉】〕〗’”…‥・ー々〻ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ"
+                      ",.!?;:)]}%")
+# 不能出现在行尾的标点（避尾）
+NO_BREAK_AFTER = set("「『（《〈【〔〖‘“([{$")
+
+
+def is_cjk(ch):
+    """判断是否为中日韩文字或全角符号（这些字符之间可以换行）"""
+    code = ord(ch)
+    return (0x2E80 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7AF or 0xF900 <= code <= 0xFAFF or
+            0xFF00 <= code <= 0xFFEF or 0x20000 <= code <= 0x2FFFF)
+
+
+class AdvanceCache:
+    """单个字体的字符步进宽度缓存"""
+
+    def __init__(self, font):
+        self.font = font
+        self._widths = {}
+        chain = font_cache.get_chain(font)
+        if chain is not None:
+            self._measure = chain.getlength
+        elif hasattr(font, "getlength"):
+            self._measure = font.getlength
+        else:
+            self._measure = lambda ch: font.getbbox(ch)[2]
+
+    def width_of(self, ch):
+        """单个字符的步进宽度"""
+        width = self._widths.get(ch)
+        if width is None:
+            width = self._widths[ch] = self._measure(ch)
+        return width
+
+    def prefix_sums(self, text):
+        """返回前缀和列表，P[i]为text[:i]的宽度"""
+        widths = self._widths
+        measure = self.width_of
+        return list(accumulate((widths[ch] if ch in widths else measure(ch) for ch in text), initial=0))
+
+    def text_width(self, text):
+        """文字总宽度（步进宽度之和）"""
+        return self.prefix_sums(text)[-1]
+
+
+# 最多保留的步进宽度缓存数（每个字体和字号一个），超出时淘汰最久未用的
+MAX_ADVANCE_CACHES = font_cache.font_cache.maxsize * 2
+
+_advance_caches = OrderedDict()
+_advance_lock = threading.Lock()
+_advance_evictions = 0
+
+
+def get_advance_cache(font):
+    """获取字体对应的共享步进宽度缓存（LRU）"""
+    global _advance_evictions
+    key = glyph_cache.font_key(font) or id(font)
+    with _advance_lock:
+        cache = _advance_caches.get(key)
+        if cache is not None:
+            _advance_caches.move_to_end(key)
+            return cache
+        cache = _advance_caches[key] = AdvanceCache(font)
+        while len(_advance_caches) > MAX_ADVANCE_CACHES:
+            _advance_caches.popitem(last=False)
+            _advance_evictions += 1
+    return cache
+
+
+def advance_cache_stats():
+    """步进宽度缓存的数量、上限和淘汰次数"""
+    with _advance_lock:
+        return {"size": len(_advance_caches), "maxsize": MAX_ADVANCE_CACHES, "evictions": _advance_evictions}
+
+
+def break_opportunities(text):
+    """返回可以在其前换行的位置列表（升序）"""
+    breaks = []
+    for i in range(1, len(text)):
+        prev, ch = text[i - 1], text[i]
+        if ch in NO_BREAK_BEFORE or prev in NO_BREAK_AFTER:
+            continue
+        if prev.isspace() != ch.isspace():
+            # 空格段的两侧：单词结束处或下一个单词开始处
+            breaks.append(i)
+        elif is_cjk(prev) or is_cjk(ch):
+            breaks.append(i)
+    return breaks
+
+
+def _strip_end(text, start, end):
+    """去掉行尾空格后的结束位置"""
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def wrap_line(text, font, max_width, trace=None):
+    """把一行文字按最大宽度折行，返回 [(行文字, 行宽), ...]；单词过长时按字符强制断开
+
+    结果按(字体, 字号, 行文字)缓存，同一行再次排版（继续编辑、预览后转换）时不再测量。
+    """
+    key = glyph_cache.font_key(font)
+    if key is not None:
+        lines = measure_cache.measure_cache.get(key, text, max_width)
+        if lines is not None:
+            return lines
+    prefix = get_advance_cache(font).prefix_sums(text)
+    lines = _break_line(text, prefix, max_width)
+    if key is not None:
+        measure_cache.measure_cache.put(key, text, prefix[-1], max_width, lines)
+    if trace is not None:
+        trace.count("measured_lines")
+    return lines
+
+
+def _break_line(text, prefix, max_width):
+    """按前缀和在换行点处折行"""
+    if prefix[-1] <= max_width:
+        return [(text, prefix[-1])]
+
+    breaks = break_opportunities(text)
+    n = len(text)
+    lines = []
+    start = 0
+    while start < n:
+        # 跳过行首空格
+        while start < n and text[start].isspace():
+            start += 1
+        if start >= n:
+            break
+        # 能放下的最远位置
+        end = bisect_right(prefix, prefix[start] + max_width) - 1
+        if end >= n:
+            end = n
+        else:
+            # 在 (start, end] 中找最后一个换行点，找不到则强制断开
+            k = bisect_right(breaks, end) - 1
+            if k >= 0 and breaks[k] > start:
+                end = breaks[k]
+            else:
+                end = max(end, start + 1)
+        stripped = _strip_end(text, start, end)
+        lines.append((text[start:stripped], prefix[stripped] - prefix[start]))
+        start = end
+    return lines
+
+
+def wrap_text(lines, font, max_width, max_lines=None, trace=None):
+    """对多行文字逐行折行，返回 [(行文字, 行宽), ...]；达到max_lines行后不再继续"""
+    wrapped = []
+    for line in lines:
+        wrapped.extend(wrap_line(line, font, max_width, trace))
+        if max_lines is not None and len(wrapped) >= max_lines:
+            return wrapped[:max_lines]
+    return wrapped
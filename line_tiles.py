@@ -0,0 +1,133 @@
+"""行级图块缓存：预览时只重新光栅化改动过的行，未改动的行复用缓存图块"""
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+import threading
+
+import font_cache
+import glyph_cache
+
+
+class LineTileCache:
+    """按(字体, 行文字)缓存整行文字的遮罩图块（"L"模式）"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_tile(self, font, line):
+        """获取行图块，返回(遮罩, bbox)；bbox为相对文字原点的(left, top, right, bottom)"""
+        key = (glyph_cache.font_key(font) or id(font), line)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self.hits += 1
+                self._tiles.move_to_end(key)
+                return tile
+            self.misses += 1
+
+        chain = font_cache.get_chain(font)
+        bbox = chain.getbbox(line) if chain is not None else font.getbbox(line)
+        width = bbox[2] - bbox[0]
+        height = bbox[3] - bbox[1]
+        if width <= 0 or height <= 0:
+            tile = (None, bbox)
+        else:
+            mask = Image.new("L", (width, height), 0)
+            draw = ImageDraw.Draw(mask)
+            glyph_cache.glyph_atlas.draw_text(draw, (-bbox[0], -bbox[1]), line, 255, font)
+            tile = (mask, bbox)
+
+        with self._lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > self.maxsize:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "tiles": len(self._tiles),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def _intersect(a, b):
+    """两个矩形的交集，不相交时返回None"""
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    return box
+
+
+class IncrementalCompositor:
+    """增量合成预览帧：画布参数不变时只重绘内容或位置改变的行"""
+
+    def __init__(self, tile_cache=None):
+        self.tile_cache = tile_cache or LineTileCache()
+        self.last_redrawn = 0  # 上一帧重绘的行数（用于性能观察）
+        self._frame = None
+        self._frame_key = None
+        self._placed = []  # 每行的 (行文字, 绘制位置, 遮罩, 屏幕矩形)
+
+    def compose(self, size, mode, bg, fill, font, placements):
+        """合成一帧；placements为[(行文字, (x, y)), ...]，返回新图片"""
+        frame_key = (size, mode, bg, fill, glyph_cache.font_key(font) or id(font))
+        placed = [self._place(font, line, xy) for line, xy in placements]
+
+        if self._frame is None or frame_key != self._frame_key:
+            # 画布参数改变：重新合成整帧（图块仍然来自缓存）
+            self._frame = Image.new(mode, size, bg)
+            for item in placed:
+                self._paste(item, fill, None)
+            self.last_redrawn = len(placed)
+        else:
+            # 找出改变的行，清除其新旧区域后重贴与这些区域相交的图块
+            dirty = []
+            for i in range(max(len(placed), len(self._placed))):
+                old = self._placed[i] if i < len(self._placed) else None
+                new = placed[i] if i < len(placed) else None
+                if old is not None and new is not None and old[:2] == new[:2]:
+                    continue
+                for item in (old, new):
+                    if item is not None and item[3] is not None:
+                        dirty.append(item[3])
+            for box in dirty:
+                box = _intersect(box, (0, 0) + size)
+                if box is None:
+                    continue
+                self._frame.paste(bg, box)
+                for item in placed:
+                    if item[3] is not None and _intersect(item[3], box):
+                        self._paste(item, fill, box)
+            self.last_redrawn = len(dirty)
+
+        self._frame_key = frame_key
+        self._placed = placed
+        return self._frame.copy()
+
+    def _place(self, font, line, xy):
+        """计算行图块在画布上的位置"""
+        mask, bbox = self.tile_cache.get_tile(font, line)
+        if mask is None:
+            return (line, xy, None, None)
+        left = int(round(xy[0])) + bbox[0]
+        top = int(round(xy[1])) + bbox[1]
+        return (line, xy, mask, (left, top, left + mask.width, top + mask.height))
+
+    def _paste(self, item, fill, clip):
+        """把行图块以文字颜色贴到帧上，clip不为None时只贴相交部分"""
+        mask, box = item[2], item[3]
+        if mask is None:
+            return
+        if clip is not None:
+            part = _intersect(box, clip)
+            mask = mask.crop((part[0] - box[0], part[1] - box[1], part[2] - box[0], part[3] - box[1]))
+            box = part
+        self._frame.paste(fill, box, mask)
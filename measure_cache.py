@@ -0,0 +1,78 @@
+"""文字测量缓存：按(字体, 字号, 行文字)缓存整行宽度和折行结果，预览和最终渲染共用，编辑时未改动的行不再重新测量"""
+from collections import OrderedDict
+import threading
+
+# 每个条目除文字外的固定开销（按字符数计）
+ENTRY_OVERHEAD = 64
+
+
+class MeasureCache:
+    """LRU测量缓存（线程安全）；按缓存的字符总数限制内存"""
+
+    def __init__(self, max_chars=4_000_000):
+        self.max_chars = max_chars
+        self.chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (字体键, 行文字) -> [整行宽度, {最大宽度: 折行结果}, 占用字符数]
+        self._lock = threading.Lock()
+
+    def get(self, key, text, max_width):
+        """缓存的折行结果 [(行文字, 行宽), ...]，未缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get((key, text))
+            if entry is not None:
+                if entry[0] <= max_width:
+                    result = [(text, entry[0])]
+                else:
+                    result = entry[1].get(max_width)
+                if result is not None:
+                    self.hits += 1
+                    self._entries.move_to_end((key, text))
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, key, text, width, max_width, lines):
+        """保存整行宽度和按max_width折行的结果（整行放得下时只保存宽度）"""
+        with self._lock:
+            entry = self._entries.get((key, text))
+            if entry is None:
+                entry = self._entries[(key, text)] = [width, {}, len(text) + ENTRY_OVERHEAD]
+                self.chars += entry[2]
+            if width > max_width and max_width not in entry[1]:
+                entry[1][max_width] = lines
+                cost = sum(len(line) for line, _ in lines) + ENTRY_OVERHEAD
+                entry[2] += cost
+                self.chars += cost
+            self._entries.move_to_end((key, text))
+            while self.chars > self.max_chars and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.chars -= evicted[2]
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存和计数"""
+        with self._lock:
+            self._entries.clear()
+            self.chars = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "chars": self.chars,
+                "max_chars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# 进程共享的测量缓存（预览和最终渲染共用）
+measure_cache = MeasureCache()
@@ -0,0 +1,94 @@
+"""多分辨率输出：同一段文字只排版一次（RelativeLayout），按各预设分辨率并行光栅化并保存
+
+字号和文字效果（描边、阴影）在参考分辨率下指定，其他分辨率按宽度等比缩放，各尺寸的断行位置相同。
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+import font_index
+import instrumentation
+import renderer
+import strips
+
+# 全部预设只支持这两种页面模式（分页模式每个尺寸的页数不同，请逐个转换）
+PRESET_PAGE_MODES = ["固定尺寸", "自动高度"]
+
+
+def preset_sizes(resolutions=None):
+    """预设分辨率的 (宽, 高) 列表，按面积从大到小排列（最慢的先开始，并行时总耗时最短）"""
+    sizes = [renderer.parse_resolution(value) for value in (resolutions or renderer.PRESET_RESOLUTIONS)]
+    return sorted(set(sizes), key=lambda size: size[0] * size[1], reverse=True)
+
+
+def preset_filename(output_dir, name, width, height, format_type):
+    """某个尺寸的输出文件名：name_1920x1080.png"""
+    return os.path.join(output_dir, f"{name}_{width}x{height}{renderer.FORMAT_EXTENSIONS[format_type]}")
+
+
+def render_preset(relative_layout, width, height, filename, options):
+    """工作进程：把共享的排版缩放到一个尺寸并保存，返回文件名"""
+    trace = instrumentation.RenderTrace(os.path.basename(filename))
+    format_type = options["format_type"]
+    bg_transparent = format_type == "PNG" and options["bg_transparent"]
+    text_layout = relative_layout.at_width(width, trace)
+    if options.get("page_mode", "固定尺寸") == "自动高度":
+        height = renderer.auto_height(text_layout, format_type)
+    # 效果参数和字号一样在参考宽度下指定，按宽度等比缩放
+    text_effects = options.get("effects")
+    if text_effects is not None:
+        text_effects = text_effects.scaled(width / relative_layout.width)
+    image = strips.layout_or_strips(text_layout, width, height, format_type, options["text_color"],
+                                    options["bg_color"], bg_transparent, trace=trace, effects=text_effects)
+    if isinstance(image, strips.StripDocument):
+        image.save(filename, options.get("profile"), trace=trace)
+    else:
+        renderer.save_image(image, filename, format_type, options["bg_color"], options.get("profile"), trace=trace)
+    trace.export()
+    return filename
+
+
+def render_presets(text, output_dir, name, options, resolutions=None, workers=None, on_result=None, trace=None):
+    """按全部预设分辨率输出同一段文字，返回 [(宽, 高, 文件名或None, 错误信息或None), ...]
+
+    options与batch相同，其中的width和字号作为参考：先在参考宽度上排版一次，
+    各尺寸在工作进程中缩放排版后光栅化；on_result(宽, 高, 文件名, 错误信息) 每完成一个尺寸调用一次。
+    """
+    page_mode = options.get("page_mode", "固定尺寸")
+    if page_mode not in PRESET_PAGE_MODES:
+        raise ValueError(f"全部预设只支持{'/'.join(PRESET_PAGE_MODES)}模式")
+    if options.get("animation"):
+        raise ValueError("全部预设不支持动画")
+    os.makedirs(output_dir, exist_ok=True)
+    relative_layout = renderer.compute_relative_layout(text, options["width"], options["font_size"], trace)
+    sizes = preset_sizes(resolutions)
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    results = []
+
+    def record(width, height, filename, error):
+        results.append((width, height, filename, error))
+        if on_result:
+            on_result(width, height, filename, error)
+
+    if workers == 1:
+        for width, height in sizes:
+            filename = preset_filename(output_dir, name, width, height, options["format_type"])
+            try:
+                record(width, height, render_preset(relative_layout, width, height, filename, options), None)
+            except Exception as e:
+                record(width, height, None, str(e))
+        return results
+
+    # 先在本进程刷新并保存字体索引，工作进程直接读取
+    font_index.get_index().scan()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for width, height in sizes:
+            filename = preset_filename(output_dir, name, width, height, options["format_type"])
+            futures[executor.submit(render_preset, relative_layout, width, height, filename, options)] = (width, height)
+        for future in as_completed(futures):
+            width, height = futures[future]
+            try:
+                record(width, height, future.result(), None)
+            except Exception as e:
+                record(width, height, None, str(e))
+    return results
@@ -0,0 +1,202 @@
+"""预览图生成：与最终渲染相同的排版按预览比例缩放，先出低分辨率草稿再出精细图，通过行图块缓存增量合成，在后台线程中渲染（不依赖tkinter）"""
+from PIL import Image
+import threading
+import math
+
+import line_tiles
+import renderer
+
+# 预览区域大小
+PREVIEW_SIZE = (580, 400)
+
+# 草稿阶段相对预览比例的缩放
+DRAFT_FACTOR = 0.5
+
+
+class PreviewCancelled(Exception):
+    """预览请求已过期（有更新的编辑），渲染中止"""
+
+
+class PreviewLayout:
+    """预览用的排版结果：与最终渲染相同的折行和行位置（原始分辨率坐标）"""
+
+    def __init__(self, text_layout, width, height, first, last, start_y):
+        self.text_layout = text_layout
+        self.width = width
+        self.height = height  # 画布高度（自动高度模式下随文字变化）
+        self.first = first
+        self.last = last
+        self.start_y = start_y
+
+
+def compute_preview_layout(text, width, height, font_size, page_mode=renderer.PAGE_MODES[0]):
+    """按最终渲染的规则排版；固定尺寸和分页模式只排到画布（第一页）排满为止"""
+    if page_mode == "自动高度":
+        text_layout = renderer.compute_layout(text, width, font_size)
+        total_height = text_layout.total_height
+        # 预览不受格式高度上限约束，超限在转换时才报错
+        height = max(renderer.MIN_RESOLUTION, int(math.ceil(total_height + 2 * renderer.MARGIN)))
+        start_y = max(renderer.MARGIN, (height - total_height) / 2)
+        return PreviewLayout(text_layout, width, height, 0, len(text_layout.lines), start_y)
+
+    text_layout = renderer.compute_layout(text, width, font_size, max_height=height)
+    if page_mode == "分页":
+        # 预览第一页
+        last = min(text_layout.lines_per_page(height), len(text_layout.lines))
+        return PreviewLayout(text_layout, width, height, 0, last, renderer.MARGIN)
+
+    # 计算总高度和起始位置（与render_layout相同）
+    start_y = max(renderer.MARGIN, (height - text_layout.total_height) / 2)
+    return PreviewLayout(text_layout, width, height, 0, len(text_layout.lines), start_y)
+
+
+def preview_scale(width, height, preview_size=PREVIEW_SIZE):
+    """计算缩放比例（保持宽高比，留10%边距）"""
+    preview_width, preview_height = preview_size
+    return min(preview_width / width, preview_height / height) * 0.9
+
+
+def rasterize_preview(preview_layout, scale, format_type, text_color, bg_color, bg_transparent, compositor,
+                      should_cancel=None, effects=None):
+    """按缩放比例把预览排版合成为图片（行图块缓存 + 增量合成）
+
+    有文字效果时先合成覆盖率遮罩，再按预览比例缩放效果参数后合成颜色。
+    """
+    text_layout = preview_layout.text_layout
+    image_width = max(1, int(preview_layout.width * scale))
+    image_height = max(1, int(preview_layout.height * scale))
+
+    # 预览图模式和背景
+    if format_type == "PNG" and bg_transparent:
+        mode, bg = "RGBA", (0, 0, 0, 0)
+    elif format_type == "PNG":
+        mode, bg = "RGBA", (*bg_color[:3], 255)
+    else:
+        mode, bg = "RGB", tuple(bg_color[:3])
+
+    # 根据图片模式确定文字颜色格式
+    if mode == "RGBA":
+        text_color_rgba = (*text_color[:3], 255)
+    else:
+        text_color_rgba = tuple(text_color[:3])
+
+    # 按比例缩放字体大小（经由共享字体缓存）
+    font = renderer.load_font(max(1, int(round(text_layout.font_size * scale))))
+
+    # 行位置与最终渲染一致，只是整体缩放
+    placements = []
+    for i in range(preview_layout.first, preview_layout.last):
+        if should_cancel is not None and should_cancel():
+            raise PreviewCancelled()
+        line, text_width = text_layout.lines[i]
+        if not line.strip():
+            continue
+        y = preview_layout.start_y + (i - preview_layout.first) * text_layout.line_advance
+        if y < 0 or y >= preview_layout.height:
+            continue
+        text_x = max(renderer.MARGIN, (preview_layout.width - text_width) / 2)
+        placements.append((line, (text_x * scale, y * scale)))
+
+    if effects is None:
+        # 增量合成：只重新光栅化和重绘改变的行
+        return compositor.compose((image_width, image_height), mode, bg, text_color_rgba, font, placements)
+
+    mask = compositor.compose((image_width, image_height), "L", 0, 255, font, placements)
+    box = renderer.text_block_box(text_layout.subset(preview_layout.first, preview_layout.last),
+                                  preview_layout.width, preview_layout.start_y)
+    image = effects.scaled(scale).apply(mask, text_color, bg_color, format_type == "PNG" and bg_transparent,
+                                        text_box=tuple(int(v * scale) for v in box))
+    return image.convert(mode)
+
+
+def render_preview(text, width, height, format_type, text_color, bg_color, bg_transparent, font_size,
+                   compositor=None, preview_size=PREVIEW_SIZE, should_cancel=None,
+                   page_mode=renderer.PAGE_MODES[0], draft_callback=None, draft_compositor=None, effects=None):
+    """生成与最终渲染排版一致的预览图片
+
+    compositor为IncrementalCompositor，传入同一个对象可复用上一帧；should_cancel()返回True时抛出
+    PreviewCancelled；指定draft_callback时先以低分辨率合成草稿并回调，再生成精细预览；
+    effects为TextEffects时按预览比例合成文字效果。
+    """
+    if compositor is None:
+        compositor = line_tiles.IncrementalCompositor()
+
+    # 验证颜色值
+    if not isinstance(text_color, (tuple, list)) or len(text_color) < 3:
+        text_color = (0, 0, 0)
+    if not isinstance(bg_color, (tuple, list)) or len(bg_color) < 3:
+        bg_color = (255, 255, 255)
+
+    preview_layout = compute_preview_layout(text, width, height, font_size, page_mode)
+    scale = preview_scale(width, preview_layout.height, preview_size)
+    size = (max(1, int(width * scale)), max(1, int(preview_layout.height * scale)))
+
+    if draft_callback is not None:
+        # 第一阶段：低分辨率草稿，放大到预览尺寸后立即显示
+        draft_compositor = draft_compositor or line_tiles.IncrementalCompositor(compositor.tile_cache)
+        draft = rasterize_preview(preview_layout, scale * DRAFT_FACTOR, format_type, text_color, bg_color,
+                                  bg_transparent, draft_compositor, should_cancel, effects)
+        draft_callback(draft.resize(size, Image.BILINEAR))
+        if should_cancel is not None and should_cancel():
+            raise PreviewCancelled()
+
+    # 第二阶段：按预览比例精细合成
+    return rasterize_preview(preview_layout, scale, format_type, text_color, bg_color, bg_transparent,
+                             compositor, should_cancel, effects)
+
+
+class PreviewWorker:
+    """后台预览线程：每次提交生成新的代号，只渲染最新的请求，过期的结果直接丢弃
+
+    每个请求先回调一次低分辨率草稿，再回调精细预览；
+    on_result(代号, 图片, 错误信息) 在工作线程中调用，界面需自行切回主线程。
+    """
+
+    def __init__(self, on_result, compositor=None):
+        self.on_result = on_result
+        self.compositor = compositor or line_tiles.IncrementalCompositor()
+        self.draft_compositor = line_tiles.IncrementalCompositor(self.compositor.tile_cache)
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._pending = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, params):
+        """提交预览请求（render_preview的参数字典，None表示没有可预览的内容），返回代号"""
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, params)  # 覆盖尚未开始的旧请求
+            self._cond.notify()
+            return self._generation
+
+    def is_current(self, token):
+        """代号是否仍是最新的请求"""
+        return token == self._generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                token, params = self._pending
+                self._pending = None
+
+            image, error = None, None
+            try:
+                if params is not None:
+                    image = render_preview(compositor=self.compositor,
+                                           should_cancel=lambda: not self.is_current(token),
+                                           draft_callback=lambda draft: self._deliver(token, draft, None),
+                                           draft_compositor=self.draft_compositor, **params)
+            except PreviewCancelled:
+                continue
+            except Exception as e:
+                error = str(e)
+
+            self._deliver(token, image, error)
+
+    def _deliver(self, token, image, error):
+        """只回调仍是最新请求的结果"""
+        if self.is_current(token):
+            self.on_result(token, image, error)
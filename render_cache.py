@@ -0,0 +1,244 @@
+"""渲染结果磁盘缓存：按渲染参数的哈希保存编码后的图片，相同输入直接返回缓存的字节串
+
+写入先写临时文件再原子替换，多个进程共用同一目录也不会读到半个文件；
+总大小超过上限时按最近使用时间（文件mtime，命中时刷新）淘汰最旧的条目。
+"""
+import threading
+import tempfile
+import hashlib
+import shutil
+import json
+import os
+
+import encoder
+import font_cache
+import font_index
+
+# 缓存格式版本，渲染结果的算法改变时加1让旧条目失效
+CACHE_VERSION = 3
+
+# 缓存目录，可用环境变量 TEXT2PIC_CACHE 设置，设为空字符串或0表示不使用缓存
+CACHE_DIR = os.environ.get("TEXT2PIC_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "text2pic"))
+if CACHE_DIR == "0":
+    CACHE_DIR = ""
+
+# 缓存总大小上限（MB）的默认值，可用环境变量 TEXT2PIC_CACHE_MB 设置
+DEFAULT_CACHE_MB = 256
+
+# 缓存总大小上限（字节），第一次用到时由cache_max_bytes()读取环境变量
+CACHE_MAX_BYTES = None
+
+# 淘汰时清理到上限的这个比例，避免每次写入都触发淘汰
+EVICT_TARGET = 0.9
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def set_cache_dir(path):
+    """设置缓存目录（None或空字符串表示不使用缓存）"""
+    global CACHE_DIR
+    CACHE_DIR = path or ""
+
+
+def cache_max_bytes():
+    """缓存总大小上限（字节）；环境变量 TEXT2PIC_CACHE_MB 不是非负整数时打印警告并使用默认值"""
+    global CACHE_MAX_BYTES
+    if CACHE_MAX_BYTES is None:
+        value = os.environ.get("TEXT2PIC_CACHE_MB", "").strip()
+        megabytes = DEFAULT_CACHE_MB
+        if value:
+            try:
+                megabytes = int(value)
+                if megabytes < 0:
+                    raise ValueError(value)
+            except ValueError:
+                print(f"警告: 环境变量 TEXT2PIC_CACHE_MB 的值无效（{value}），使用默认值 {DEFAULT_CACHE_MB} MB")
+                megabytes = DEFAULT_CACHE_MB
+        CACHE_MAX_BYTES = megabytes * 1024 * 1024
+    return CACHE_MAX_BYTES
+
+
+def _font_signature(font_path):
+    """字体文件的路径、大小和修改时间（字体文件更新后缓存失效）"""
+    try:
+        stat = os.stat(font_path)
+        return [font_path, stat.st_size, int(stat.st_mtime)]
+    except OSError:
+        return [font_path, None, None]
+
+
+def render_key(text, width, height, format_type, text_color, bg_color, bg_transparent, font_size,
+               page_mode="固定尺寸", profile=None, font_path=None, effects=None):
+    """渲染参数的SHA-256哈希（十六进制），作为缓存键"""
+    params = {
+        "version": CACHE_VERSION,
+        "text": text,
+        "width": width,
+        "height": height,
+        "format": format_type,
+        "text_color": list(text_color[:3]),
+        "bg_color": list(bg_color[:3]),
+        "transparent": bool(bg_transparent),
+        "font": _font_signature(font_path or font_cache.default_font()[0]),
+        "fallback_fonts": font_index.get_index().signature(),
+        "font_size": int(font_size),
+        "page_mode": page_mode,
+        "profile": encoder.resolve_profile(format_type, profile),
+        "encoder": encoder.encoder_options(format_type, profile),
+    }
+    if effects is not None and effects.enabled:
+        # 未启用效果时不加入键，已有的缓存条目仍然有效
+        params["effects"] = effects.to_dict()
+    data = json.dumps(params, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class RenderCache:
+    """内容寻址的磁盘缓存（按键的前两位分子目录存放）"""
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes if max_bytes is not None else cache_max_bytes()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None  # 当前总大小的估计值，首次写入时扫描目录得到
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".bin")
+
+    def get(self, key):
+        """读取缓存的字节串，未命中时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # 刷新最近使用时间
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """原子写入字节串"""
+        self._write(key, lambda f: f.write(data))
+        self._account(len(data))
+
+    def put_file(self, key, filename):
+        """把已保存的文件复制到缓存"""
+        def copy(f):
+            with open(filename, "rb") as source:
+                shutil.copyfileobj(source, f)
+        self._write(key, copy)
+        self._account(os.path.getsize(filename))
+
+    def get_or_create(self, key, create):
+        """命中时返回缓存的字节串，否则调用create()生成并写入缓存"""
+        data = self.get(key)
+        if data is None:
+            data = create()
+            self.put(key, data)
+        return data
+
+    def _write(self, key, write):
+        """先写同目录下的临时文件，再用os.replace原子替换"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _entries(self):
+        """列出所有缓存条目 [(修改时间, 大小, 路径), ...]"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".bin"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _account(self, added):
+        """更新总大小估计值，超过上限时淘汰"""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """按最近使用时间淘汰最旧的条目（调用方持有锁）"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TARGET
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._size = total
+
+    def clear(self):
+        """删除所有缓存条目"""
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def get_cache():
+    """当前缓存目录对应的进程共享缓存，未启用缓存时返回None"""
+    if not CACHE_DIR:
+        return None
+    with _caches_lock:
+        cache = _caches.get(CACHE_DIR)
+        if cache is None:
+            cache = _caches[CACHE_DIR] = RenderCache(CACHE_DIR)
+        return cache
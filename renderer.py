@@ -0,0 +1,518 @@
+"""无界面渲染引擎：文字转图片的核心逻辑，不依赖tkinter"""
+from PIL import Image, ImageDraw
+import math
+import os
+
+import encoder
+import font_cache
+import glyph_cache
+import instrumentation
+import layout
+
+# 预设分辨率（界面下拉框与命令行共用）
+PRESET_RESOLUTIONS = ["1920×1080 (Full HD)", "1280×720 (HD)", "2560×1440 (2K)",
+                      "3840×2160 (4K)", "800×600 (SVGA)", "1024×768 (XGA)"]
+
+# 自定义分辨率的有效范围
+MIN_RESOLUTION = 100
+MAX_RESOLUTION = 10000
+
+# 自动高度模式下各格式支持的最大高度
+MAX_AUTO_HEIGHT = {"JPG": 65500, "WEBP": 16383, "GIF": 65535}
+MAX_AUTO_HEIGHT_DEFAULT = 65500
+
+# 页面模式
+PAGE_MODES = ["固定尺寸", "自动高度", "分页"]
+
+# 排版参数：页边距和行距倍数
+MARGIN = 20
+LINE_SPACING = 1.3
+
+# 格式对应的文件扩展名
+FORMAT_EXTENSIONS = {
+    "JPG": ".jpg",
+    "PNG": ".png",
+    "BMP": ".bmp",
+    "GIF": ".gif",
+    "WEBP": ".webp"
+}
+
+
+def parse_resolution(value):
+    """解析分辨率字符串（"1920×1080 (Full HD)" 或 "1920x1080"），返回(width, height)元组"""
+    # 先去掉括号中的说明文字（如 "XGA" 中的X不是分隔符）
+    size = value.split("(")[0]
+    parts = size.replace("x", "×").replace("X", "×").split("×")
+    if len(parts) != 2:
+        raise ValueError(f"无法解析分辨率: {value}")
+    try:
+        width = int(parts[0].strip())
+        height = int(parts[1].strip())
+    except (ValueError, IndexError):
+        raise ValueError(f"无法解析分辨率: {value}")
+    if width < MIN_RESOLUTION or width > MAX_RESOLUTION or height < MIN_RESOLUTION or height > MAX_RESOLUTION:
+        raise ValueError("分辨率超出有效范围")
+    return (width, height)
+
+
+def parse_color(value):
+    """解析十六进制颜色字符串（"#RRGGBB"），返回RGB元组"""
+    value = value.strip().lstrip("#")
+    if len(value) != 6:
+        raise ValueError(f"无效的颜色: #{value}")
+    try:
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise ValueError(f"无效的颜色: #{value}")
+
+
+def load_font(font_size):
+    """加载系统字体（经由共享字体缓存），失败时使用默认字体"""
+    return font_cache.get_font(font_size)
+
+
+class TextLayout:
+    """排版结果：折行后的各行、行高和行距（与画布高度无关）"""
+
+    def __init__(self, font, font_size, lines, line_height, spacing=LINE_SPACING):
+        self.font = font
+        self.font_size = font_size
+        self.lines = lines  # [(行文字, 行宽), ...]
+        self.line_height = line_height
+        self.spacing = spacing
+
+    @property
+    def line_advance(self):
+        """相邻两行基线之间的距离"""
+        return self.line_height * self.spacing
+
+    @property
+    def total_height(self):
+        """全部文字所占高度"""
+        return len(self.lines) * self.line_advance
+
+    def __getstate__(self):
+        """序列化时只保存字体参数，传给工作进程后从字体缓存重新获取字体"""
+        state = self.__dict__.copy()
+        font = state.pop("font")
+        path = getattr(font, "path", None)
+        state["font_spec"] = (path, font.index) if isinstance(path, str) else None
+        return state
+
+    def __setstate__(self, state):
+        font_spec = state.pop("font_spec")
+        self.__dict__.update(state)
+        if font_spec is None:
+            self.font = load_font(self.font_size)
+        else:
+            self.font = font_cache.font_cache.get_font(font_spec[0], self.font_size, font_spec[1])
+
+    def subset(self, first, last):
+        """只包含第first到last-1行的排版结果"""
+        return TextLayout(self.font, self.font_size, self.lines[first:last], self.line_height, self.spacing)
+
+    def lines_per_page(self, page_height):
+        """一页（上下各留边距）能容纳的行数，至少为1"""
+        usable = page_height - 2 * MARGIN - self.line_height
+        return max(1, int(usable // self.line_advance) + 1)
+
+
+def measure_line_height(font, font_size):
+    """字体的行高（"Ag"的高度）"""
+    # 计算行高（使用更可靠的方法）
+    try:
+        if hasattr(font, 'getbbox'):
+            bbox = font.getbbox('Ag')
+            return bbox[3] - bbox[1]
+        elif hasattr(font, 'getsize'):
+            return font.getsize('Ag')[1]
+        else:
+            return font_size + 10  # 默认值
+    except:
+        return font_size + 10
+
+
+def clamp_font_size(font_size):
+    """限制字体大小范围"""
+    return max(8, min(int(font_size), 300))
+
+
+def compute_layout(text, width, font_size_param, trace=None, max_height=None):
+    """加载字体并对文字折行，返回TextLayout；
+    指定max_height时排满该高度（再多两行）即停止，用于只需要可见部分的场合（如预览）"""
+    trace = instrumentation.ensure_trace(trace)
+
+    # 使用指定的字体大小
+    font_size = clamp_font_size(font_size_param)
+
+    # 尝试使用系统字体，如果失败则使用默认字体
+    with trace.stage("font"):
+        font = load_font(font_size)
+
+    line_height = measure_line_height(font, font_size)
+
+    max_lines = None
+    if max_height is not None:
+        max_lines = int(max_height // (line_height * LINE_SPACING)) + 2
+
+    with trace.stage("layout"):
+        # 处理多行文字
+        lines = [line.strip() for line in text.split('\n') if line.strip()]  # 过滤空行
+        if not lines:
+            lines = [text.strip()] if text.strip() else [" "]  # 如果全是空行，至少显示一个空格
+
+        # 自动换行（左右各留边距）
+        lines = layout.wrap_text(lines, font, width - 2 * MARGIN, max_lines, trace)
+    trace.count("lines", len(lines))
+
+    return TextLayout(font, font_size, lines, line_height)
+
+
+class RelativeLayout:
+    """与分辨率无关的排版：在参考宽度上折行一次，之后可缩放到任意宽度再光栅化
+
+    缩放时字号按宽度比例变化，断行位置和行的相对位置不变；只在目标字号下重新测量各行宽度（用于居中），
+    因字形取整而放不下的个别行才在目标字号下重新折行。
+    """
+
+    def __init__(self, text_layout, width):
+        self.reference = text_layout
+        self.width = width
+        self.font_size = text_layout.font_size
+        self.lines = [line for line, _ in text_layout.lines]
+
+    def font_size_at(self, width):
+        """目标宽度下的字号"""
+        return clamp_font_size(round(self.font_size * width / self.width))
+
+    def at_width(self, width, trace=None):
+        """缩放到目标宽度的排版结果（TextLayout）"""
+        if width == self.width:
+            return self.reference
+        trace = instrumentation.ensure_trace(trace)
+        font_size = self.font_size_at(width)
+        with trace.stage("font"):
+            font = load_font(font_size)
+        with trace.stage("layout"):
+            # 已断好的行通常放得下，wrap_text只测量宽度（结果进入共享测量缓存）
+            lines = layout.wrap_text(self.lines, font, width - 2 * MARGIN, trace=trace)
+        trace.count("lines", len(lines))
+        return TextLayout(font, font_size, lines, measure_line_height(font, font_size), self.reference.spacing)
+
+
+def compute_relative_layout(text, width, font_size_param, trace=None):
+    """在参考宽度上排版，返回可缩放到任意宽度的RelativeLayout；font_size_param是参考宽度下的字号"""
+    return RelativeLayout(compute_layout(text, width, font_size_param, trace), width)
+
+
+def create_canvas(width, height, format_type, bg_color, bg_transparent):
+    """创建图片（根据背景颜色和透明选项）"""
+    if format_type == "PNG" and bg_transparent:
+        # PNG格式且选择透明背景
+        return Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    elif format_type == "PNG":
+        # PNG格式但不透明，使用RGBA模式
+        return Image.new("RGBA", (width, height), (*bg_color[:3], 255))
+    else:
+        # 其他格式使用RGB模式
+        return Image.new("RGB", (width, height), bg_color[:3])
+
+
+def create_mask_canvas(width, height):
+    """创建单通道覆盖率画布（0为背景，255为文字），内存只有RGBA画布的四分之一"""
+    return Image.new("L", (width, height), 0)
+
+
+def mask_palette(text_color, bg_color, bg_transparent):
+    """覆盖率画布的调色板，返回 (调色板数据, 原始模式)
+
+    第i个颜色是背景色和文字颜色按i/255混合的结果；透明背景时颜色固定为文字颜色，不透明度为i。
+    """
+    palette = []
+    if bg_transparent:
+        for i in range(256):
+            palette.extend((*text_color[:3], i))
+        return palette, "RGBA"
+    for i in range(256):
+        palette.extend((bg * (255 - i) + fg * i + 127) // 255 for bg, fg in zip(bg_color[:3], text_color[:3]))
+    return palette, "RGB"
+
+
+def colorize_mask(mask, text_color, bg_color, bg_transparent):
+    """把覆盖率画布原地转换为调色板图片（不复制像素）"""
+    palette, rawmode = mask_palette(text_color, bg_color, bg_transparent)
+    mask.putpalette(palette, rawmode)
+    return mask
+
+
+def draw_layout_lines(image, text_layout, first, last, start_y, text_color, use_glyph_cache=True,
+                      progress_callback=None, trace=None, should_cancel=None, origin_y=0, canvas_height=None,
+                      first_top_index=None):
+    """把第first到last-1行绘制到图片上，第first行的顶部位于start_y；每行之前检查should_cancel()
+
+    分条绘制时image只是整幅画布中从origin_y开始的一条，canvas_height为整幅画布的高度，
+    first_top_index=0表示start_y是第0行（而不是第first行）的顶部，使各条的行坐标与整幅绘制完全相同。
+    """
+    trace = instrumentation.ensure_trace(trace)
+    verbose = trace.verbose
+    width, height = image.size
+    if canvas_height is not None:
+        height = canvas_height
+    draw = ImageDraw.Draw(image)
+    font = text_layout.font
+
+    # 根据图片模式确定文字颜色格式（覆盖率画布上文字为255）
+    if image.mode == "L":
+        text_color_rgba = 255
+    elif image.mode == "RGBA":
+        text_color_rgba = (*text_color[:3], 255)
+    else:
+        text_color_rgba = tuple(text_color[:3])
+
+    count = last - first
+    top_index = first if first_top_index is None else first_top_index
+    last_percent = -1
+    skipped = 0
+    for i in range(first, last):
+        if should_cancel is not None and should_cancel():
+            raise RenderCancelled()
+        line, text_width = text_layout.lines[i]
+        if not line.strip():
+            continue
+
+        y = start_y + (i - top_index) * text_layout.line_advance
+
+        # 确保y坐标在图片范围内
+        if y < 0 or y >= height:
+            skipped += 1
+            if verbose:
+                trace.log(f"警告: 行{i}的y坐标{y}超出范围，跳过")
+            continue
+
+        try:
+            # 居中绘制文字（行宽由排版阶段给出，无需重复测量）
+            text_x = max(MARGIN, (width - text_width) / 2)  # 至少距离左边20像素
+
+            if use_glyph_cache:
+                glyph_cache.glyph_atlas.draw_text(draw, (text_x, y - origin_y), line, text_color_rgba, font)
+            else:
+                glyph_cache.draw_runs(draw, (text_x, y - origin_y), line, text_color_rgba, font)
+            if verbose:
+                trace.log(f"绘制文字行{i}: '{line[:20]}...' 位置: ({text_x}, {y})")
+
+        except Exception as e:
+            trace.count("line_errors")
+            if verbose:
+                trace.log(f"绘制行{i}时出错: {e}")
+
+        # 进度只在整数百分比变化时回调，避免逐行回调的开销
+        if progress_callback:
+            percent = int(60 + (i - first + 1) / count * 30)
+            if percent != last_percent:
+                last_percent = percent
+                progress_callback(percent)
+
+    trace.count("drawn_lines", count - skipped)
+    if skipped:
+        trace.count("skipped_lines", skipped)
+
+
+class RenderCancelled(Exception):
+    """渲染被取消（在绘制每行之前检查）"""
+
+
+def _check_colors(text_color, bg_color, trace=None):
+    """验证颜色值，格式错误时使用默认颜色（记入trace的invalid_colors计数）"""
+    trace = instrumentation.ensure_trace(trace)
+    if not isinstance(text_color, (tuple, list)) or len(text_color) < 3:
+        trace.count("invalid_colors")
+        trace.log(f"警告: 文字颜色格式错误: {text_color}，使用默认黑色")
+        text_color = (0, 0, 0)
+    if not isinstance(bg_color, (tuple, list)) or len(bg_color) < 3:
+        trace.count("invalid_colors")
+        trace.log(f"警告: 背景颜色格式错误: {bg_color}，使用默认白色")
+        bg_color = (255, 255, 255)
+    return text_color, bg_color
+
+
+def render_text_image(text, width, height, format_type, text_color, bg_color, bg_transparent, font_size_param,
+                      progress_callback=None, use_glyph_cache=True, trace=None, should_cancel=None,
+                      use_mask_canvas=True, effects=None):
+    """生成文字图片（use_glyph_cache为True时通过字形缓存贴图绘制；trace记录各阶段耗时；
+    should_cancel()返回True时抛出RenderCancelled；use_mask_canvas为True时返回调色板图片；
+    effects为effects.TextEffects时在覆盖率遮罩上合成描边、阴影和渐变，返回RGB/RGBA图片）"""
+    if progress_callback is None:
+        progress_callback = lambda value: None
+    trace = instrumentation.ensure_trace(trace)
+
+    trace.log(f"生成图片 - 文字长度: {len(text)}, 分辨率: {width}x{height}, 字体大小: {font_size_param}, 文字颜色: {text_color}, 背景颜色: {bg_color}")
+
+    # 进度: 0-30% - 准备图片画布
+    progress_callback(10)
+
+    # 进度: 30-60% - 计算文字布局
+    text_layout = compute_layout(text, width, font_size_param, trace)
+    return render_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                         progress_callback, use_glyph_cache, trace, should_cancel, use_mask_canvas, effects)
+
+
+def render_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                  progress_callback=None, use_glyph_cache=True, trace=None, should_cancel=None,
+                  use_mask_canvas=True, effects=None):
+    """把已排版的文字绘制到指定尺寸的新画布上（垂直居中）
+
+    use_mask_canvas为True时先绘制到单通道覆盖率画布，再原地转换为调色板（P模式）图片；
+    JPG/WEBP等不适合调色板的格式在编码时才转换为RGB/RGBA。
+    """
+    if progress_callback is None:
+        progress_callback = lambda value: None
+    trace = instrumentation.ensure_trace(trace)
+    trace.info.update({"width": width, "height": height, "format": format_type})
+
+    text_color, bg_color = _check_colors(text_color, bg_color, trace)
+    if effects is not None and effects.enabled:
+        use_mask_canvas = True  # 效果在覆盖率遮罩上合成
+    else:
+        effects = None
+    with trace.stage("canvas"):
+        if use_mask_canvas:
+            image = create_mask_canvas(width, height)
+        else:
+            image = create_canvas(width, height, format_type, bg_color, bg_transparent)
+    progress_callback(50)
+
+    # 计算总高度和起始位置，确保在图片范围内
+    total_height = text_layout.total_height
+    start_y = max(MARGIN, (height - total_height) / 2)  # 至少距离顶部20像素
+
+    trace.log(f"文字行数: {len(text_layout.lines)}, 行高: {text_layout.line_height}, 总高度: {total_height}, 起始Y: {start_y}")
+
+    progress_callback(60)
+
+    # 进度: 60-90% - 渲染文字
+    with trace.stage("raster"):
+        draw_layout_lines(image, text_layout, 0, len(text_layout.lines), start_y, text_color,
+                          use_glyph_cache, progress_callback, trace, should_cancel)
+
+    if effects is not None:
+        with trace.stage("effects"):
+            image = effects.apply(image, text_color, bg_color, format_type == "PNG" and bg_transparent,
+                                  text_box=text_block_box(text_layout, width, start_y))
+    elif use_mask_canvas:
+        with trace.stage("colorize"):
+            colorize_mask(image, text_color, bg_color, format_type == "PNG" and bg_transparent)
+
+    progress_callback(90)
+
+    # 进度: 90-100% - 完成处理
+    progress_callback(100)
+
+    trace.log(f"图片生成完成: {trace.summary()}")
+    return image
+
+
+def text_block_box(text_layout, width, start_y):
+    """文字块在画布中的范围 (左, 上, 右, 下)，文字渐变沿它展开"""
+    widest = max((line_width for _, line_width in text_layout.lines), default=0)
+    left = max(MARGIN, (width - widest) / 2)
+    return (int(left), int(start_y), int(math.ceil(left + widest)), int(math.ceil(start_y + text_layout.total_height)))
+
+
+def auto_height(text_layout, format_type):
+    """自动高度模式下刚好容纳全部文字的画布高度"""
+    height = int(math.ceil(text_layout.total_height + 2 * MARGIN))
+    height = max(MIN_RESOLUTION, height)
+    limit = MAX_AUTO_HEIGHT.get(format_type, MAX_AUTO_HEIGHT_DEFAULT)
+    if height > limit:
+        raise ValueError(f"文字过长，自动高度 {height} 超过{format_type}格式上限 {limit}，请使用分页模式")
+    return height
+
+
+def render_auto_height(text, width, format_type, text_color, bg_color, bg_transparent, font_size_param,
+                       progress_callback=None, use_glyph_cache=True, trace=None, should_cancel=None,
+                       use_mask_canvas=True, effects=None):
+    """自动高度模式：画布高度随文字增长，返回图片"""
+    text_layout = compute_layout(text, width, font_size_param, trace)
+    height = auto_height(text_layout, format_type)
+    return render_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                         progress_callback, use_glyph_cache, trace, should_cancel, use_mask_canvas, effects)
+
+
+class PagedDocument:
+    """分页文档：排版只做一次，页面在迭代时逐页生成，内存中最多只有一页"""
+
+    def __init__(self, text, width, height, format_type, text_color, bg_color, bg_transparent, font_size_param,
+                 use_glyph_cache=True, trace=None, effects=None):
+        self.width = width
+        self.height = height
+        self.format_type = format_type
+        self.text_color, self.bg_color = _check_colors(text_color, bg_color, trace)
+        self.bg_transparent = bg_transparent
+        self.use_glyph_cache = use_glyph_cache
+        self.effects = effects
+        self.layout = compute_layout(text, width, font_size_param, trace)
+        self.per_page = self.layout.lines_per_page(height)
+
+    @property
+    def page_count(self):
+        """总页数"""
+        return max(1, math.ceil(len(self.layout.lines) / self.per_page))
+
+    def page_range(self, index):
+        """第index页包含的行范围 (first, last)"""
+        first = index * self.per_page
+        return first, min(first + self.per_page, len(self.layout.lines))
+
+    def page_layout(self, index):
+        """第index页的排版结果（只含该页的行，便于传给工作进程）"""
+        first, last = self.page_range(index)
+        return self.layout.subset(first, last)
+
+    def render_page(self, index):
+        """生成第index页（从0开始）"""
+        return render_page_layout(self.page_layout(index), self.width, self.height, self.format_type,
+                                  self.text_color, self.bg_color, self.bg_transparent, self.use_glyph_cache,
+                                  effects=self.effects)
+
+    def iter_pages(self):
+        """按顺序逐页生成图片"""
+        for index in range(self.page_count):
+            yield self.render_page(index)
+
+
+def render_page_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                       use_glyph_cache=True, trace=None, use_mask_canvas=True, effects=None):
+    """把一页的排版结果从顶部边距开始绘制到新画布上"""
+    trace = instrumentation.ensure_trace(trace)
+    if effects is not None and effects.enabled:
+        use_mask_canvas = True
+    else:
+        effects = None
+    with trace.stage("canvas"):
+        if use_mask_canvas:
+            image = create_mask_canvas(width, height)
+        else:
+            image = create_canvas(width, height, format_type, bg_color, bg_transparent)
+    with trace.stage("raster"):
+        draw_layout_lines(image, text_layout, 0, len(text_layout.lines), MARGIN, text_color, use_glyph_cache,
+                          trace=trace)
+    if effects is not None:
+        with trace.stage("effects"):
+            image = effects.apply(image, text_color, bg_color, format_type == "PNG" and bg_transparent,
+                                  text_box=text_block_box(text_layout, width, MARGIN))
+    elif use_mask_canvas:
+        with trace.stage("colorize"):
+            colorize_mask(image, text_color, bg_color, format_type == "PNG" and bg_transparent)
+    return image
+
+
+def page_filename(filename, index, count):
+    """分页输出的文件名：name_001.png"""
+    base, ext = os.path.splitext(filename)
+    digits = max(3, len(str(count)))
+    return f"{base}_{index + 1:0{digits}d}{ext}"
+
+
+def save_image(image, filename, format_type, bg_color=(255, 255, 255), profile=None, trace=None):
+    """按格式和编码档位保存图片，返回EncodeResult"""
+    return encoder.save_image(image, filename, format_type, profile, bg_color, trace=trace)
@@ -0,0 +1,396 @@
+"""本地渲染服务：在localhost上通过HTTP接收渲染请求，返回编码后的图片
+
+工作进程池预先加载字体并预热字形缓存；同时到达的请求按空闲工作进程平均分批，只有一个空闲工作进程时
+才在合批窗口内合并为一批，排队请求数有上限，队列满时返回503让调用方稍后重试。
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+import threading
+import queue
+import math
+import time
+import json
+import io
+import os
+
+import effects
+import encoder
+import font_cache
+import font_index
+import render_cache
+import renderer
+import strips
+
+# 预热时预先加载的字号
+WARM_FONT_SIZES = [12, 16, 20, 24, 32, 40, 48, 64]
+
+# 返回图片的Content-Type
+CONTENT_TYPES = {"PNG": "image/png", "JPG": "image/jpeg", "BMP": "image/bmp", "GIF": "image/gif",
+                 "WEBP": "image/webp"}
+
+# 请求中可用的页面模式（分页会产生多张图片，服务只返回单张图片）
+SERVICE_PAGE_MODES = {"fixed": "固定尺寸", "auto": "自动高度"}
+
+# 最近多少个请求参与延迟分位数统计
+LATENCY_WINDOW = 1000
+
+
+class ServiceBusy(Exception):
+    """请求队列已满"""
+
+
+def _warm_worker(font_sizes, cache_dir, memory_budget):
+    """工作进程初始化：加载常用字号并渲染一次，让字体和字形缓存在第一个请求前就绪"""
+    render_cache.set_cache_dir(cache_dir)
+    strips.MEMORY_BUDGET = memory_budget
+    for size in font_sizes:
+        font_cache.get_font(size)
+    renderer.render_text_image("预热 Warm-up 0123456789", 320, 200, "PNG", (0, 0, 0), (255, 255, 255),
+                               False, font_sizes[0] if font_sizes else 40)
+
+
+def parse_job(params):
+    """校验请求参数（JSON对象），返回渲染任务字典；参数无效时抛出ValueError"""
+    if not isinstance(params, dict):
+        raise ValueError("请求体必须是JSON对象")
+    text = params.get("text", "")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("文字内容不能为空")
+
+    if "resolution" in params:
+        width, height = renderer.parse_resolution(params["resolution"])
+    else:
+        try:
+            width, height = int(params.get("width", 1920)), int(params.get("height", 1080))
+        except (TypeError, ValueError):
+            raise ValueError("宽度和高度必须是整数")
+        if not (renderer.MIN_RESOLUTION <= width <= renderer.MAX_RESOLUTION and
+                renderer.MIN_RESOLUTION <= height <= renderer.MAX_RESOLUTION):
+            raise ValueError(f"分辨率必须在{renderer.MIN_RESOLUTION}到{renderer.MAX_RESOLUTION}之间")
+
+    format_type = str(params.get("format", "PNG")).upper()
+    if format_type not in renderer.FORMAT_EXTENSIONS:
+        raise ValueError(f"不支持的格式: {format_type}")
+    try:
+        font_size = int(params.get("font_size", 40))
+    except (TypeError, ValueError):
+        raise ValueError("文字大小必须是整数")
+    page_mode = params.get("page_mode", "fixed")
+    if page_mode not in SERVICE_PAGE_MODES:
+        raise ValueError(f"不支持的页面模式: {page_mode}")
+    profile = params.get("profile")
+    if profile is not None and (not isinstance(profile, str) or profile not in encoder.profile_names(format_type)):
+        raise ValueError(f"{format_type}不支持的编码档位: {profile}，可选: {'/'.join(encoder.profile_names(format_type))}")
+    effect_params = params.get("effects") or {}
+    if not isinstance(effect_params, dict):
+        raise ValueError("effects必须是JSON对象")
+
+    return {
+        "text": text.strip(),
+        "width": width,
+        "height": height,
+        "format_type": format_type,
+        "text_color": renderer.parse_color(params.get("text_color", "#000000")),
+        "bg_color": renderer.parse_color(params.get("bg_color", "#FFFFFF")),
+        "bg_transparent": format_type == "PNG" and bool(params.get("transparent", False)),
+        "font_size": font_size,
+        "page_mode": SERVICE_PAGE_MODES[page_mode],
+        "profile": profile,
+        "effects": effects.from_options(effect_params),
+    }
+
+
+def render_job(job):
+    """渲染并编码一个任务，返回图片字节串（相同参数命中磁盘缓存时不重新渲染）"""
+    cache = render_cache.get_cache()
+    if cache is None:
+        return _encode_job(job)
+    return cache.get_or_create(job_key(job), lambda: _encode_job(job))
+
+
+def job_key(job):
+    """任务的缓存键"""
+    return render_cache.render_key(job["text"], job["width"], job["height"], job["format_type"], job["text_color"],
+                                   job["bg_color"], job["bg_transparent"], job["font_size"], job["page_mode"],
+                                   job["profile"], effects=job["effects"])
+
+
+def _encode_job(job):
+    """渲染并编码一个任务"""
+    image = strips.render_or_strips(job["text"], job["width"], job["height"], job["format_type"], job["text_color"],
+                                    job["bg_color"], job["bg_transparent"], job["font_size"],
+                                    auto_height=(job["page_mode"] == "自动高度"), effects=job["effects"])
+    if isinstance(image, strips.StripDocument):
+        # 超出内存预算的画布逐条渲染，只在内存中保留编码结果
+        buffer = io.BytesIO()
+        image.write(buffer, job["profile"])
+        return buffer.getvalue()
+    return encoder.encode_image(image, job["format_type"], job["profile"], job["bg_color"])
+
+
+def _render_batch(jobs):
+    """工作进程：依次渲染一批任务，返回 [(图片字节串, 错误信息), ...]"""
+    results = []
+    for job in jobs:
+        try:
+            results.append((render_job(job), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+class RenderService:
+    """预热的渲染进程池 + 有界请求队列 + 请求合批"""
+
+    def __init__(self, workers=None, max_queue=64, max_batch=8, batch_window=0.005,
+                 warm_font_sizes=WARM_FONT_SIZES):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._queue = queue.Queue(maxsize=max_queue)
+        # 同时在途的批次数不超过工作进程数，其余请求在队列中等待
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._busy = 0  # 在途批次数（占用的工作进程数）
+        # 先在本进程刷新并保存字体索引，工作进程直接读取，不必各自解析字体文件
+        font_index.get_index().scan()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                             initargs=(list(warm_font_sizes), render_cache.CACHE_DIR,
+                                                       strips.memory_budget()))
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.cache_hits = 0
+        self.output_bytes = 0
+        self._running = True
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, job):
+        """提交任务，返回Future（结果为图片字节串）；队列满时抛出ServiceBusy"""
+        future = Future()
+        # 命中磁盘缓存的请求直接在调用线程返回，不占用队列和工作进程
+        data = self._cached(job)
+        if data is not None:
+            with self._lock:
+                self.submitted += 1
+                self.cache_hits += 1
+                self._latencies.append(0.0)
+                self.completed += 1
+                self.output_bytes += len(data)
+            future.set_result(data)
+            return future
+        try:
+            self._queue.put_nowait((job, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusy("渲染队列已满，请稍后重试")
+        with self._lock:
+            self.submitted += 1
+        return future
+
+    def _cached(self, job):
+        """查找磁盘缓存，未启用缓存或未命中时返回None"""
+        cache = render_cache.get_cache()
+        if cache is None:
+            return None
+        return cache.get(job_key(job))
+
+    def render(self, job, timeout=None):
+        """提交任务并等待结果"""
+        return self.submit(job).result(timeout)
+
+    def _next_batch(self):
+        """取出一批任务：拿到第一个后在合批窗口内继续收集，直到达到批大小上限"""
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return None
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self._batch_limit(len(batch)):
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _batch_limit(self, taken):
+        """本批最多取多少个任务：已取出和排队的任务按空闲工作进程（含本批占用的）平均分配，向上取整；
+        只剩本批一个空闲工作进程时才合并到max_batch，其他工作进程空闲时不把请求挤进同一批"""
+        with self._lock:
+            free = self.workers - self._busy  # 本批尚未计入_busy
+        if free <= 1:
+            return self.max_batch
+        return min(self.max_batch, math.ceil((taken + self._queue.qsize()) / free))
+
+    def _dispatch(self):
+        """分发线程：有空闲工作进程时才取下一批，队列因此形成背压"""
+        while self._running:
+            self._slots.acquire()
+            batch = self._next_batch()
+            if batch is None:
+                self._slots.release()
+                break
+            with self._lock:
+                self.batches += 1
+                self._busy += 1
+            try:
+                pool_future = self._executor.submit(_render_batch, [job for job, _, _ in batch])
+            except Exception as e:
+                self._release_slot()
+                self._finish(batch, [(None, str(e))] * len(batch))
+                continue
+            pool_future.add_done_callback(lambda f, batch=batch: self._on_batch_done(batch, f))
+
+    def _release_slot(self):
+        with self._lock:
+            self._busy -= 1
+        self._slots.release()
+
+    def _on_batch_done(self, batch, pool_future):
+        self._release_slot()
+        try:
+            results = pool_future.result()
+        except Exception as e:
+            results = [(None, str(e))] * len(batch)
+        self._finish(batch, results)
+
+    def _finish(self, batch, results):
+        """把批次结果分发给各请求的Future并更新计数"""
+        now = time.perf_counter()
+        for (job, future, queued_at), (data, error) in zip(batch, results):
+            with self._lock:
+                self._latencies.append(now - queued_at)
+                if error is None:
+                    self.completed += 1
+                    self.output_bytes += len(data)
+                else:
+                    self.failed += 1
+            if error is None:
+                future.set_result(data)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def stats(self):
+        """吞吐量和延迟统计"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            uptime = time.time() - self.started
+            finished = self.completed + self.failed
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 6) if latencies else 0.0
+
+            return {
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "uptime": round(uptime, 3),
+                "queued": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "cache_hits": self.cache_hits,
+                "avg_batch": round((finished - self.cache_hits) / self.batches, 3) if self.batches else 0.0,
+                "throughput": round(self.completed / uptime, 3) if uptime else 0.0,
+                "latency_p50": percentile(0.5),
+                "latency_p95": percentile(0.95),
+                "latency_max": round(latencies[-1], 6) if latencies else 0.0,
+                "output_bytes": self.output_bytes,
+                "cache_dir": render_cache.CACHE_DIR or None,
+            }
+
+    def close(self):
+        """停止分发并关闭进程池"""
+        self._running = False
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._executor.shutdown(wait=False)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """POST /render 渲染图片，GET /stats 返回统计信息"""
+
+    server_version = "text2pic"
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.render_service.stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/render":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = parse_job(json.loads(self.rfile.read(length) or b"null"))
+            data = self.server.render_service.render(job, timeout=self.server.request_timeout)
+        except ServiceBusy as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        except ValueError as e:  # 包括JSON解析错误
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(job["format_type"], "application/octet-stream"))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host="127.0.0.1", port=8765, service=None, request_timeout=60, verbose=False):
+    """创建HTTP服务器（未启动），通过 server.render_service 访问渲染服务"""
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.render_service = service or RenderService()
+    server.request_timeout = request_timeout
+    server.verbose = verbose
+    return server
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, max_queue=64, max_batch=8, verbose=False):
+    """启动服务直到按Ctrl+C"""
+    service = RenderService(workers=workers, max_queue=max_queue, max_batch=max_batch)
+    server = make_server(host, port, service, verbose=verbose)
+    print(f"渲染服务已启动: http://{host}:{server.server_address[1]}/render ({service.workers} 个工作进程)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        print(f"渲染服务已停止: {json.dumps(service.stats(), ensure_ascii=False)}")
@@ -0,0 +1,343 @@
+"""分条渲染：排版一次，按水平条带逐条光栅化并流式写入PNG/BMP/TIFF，内存占用只取决于条带大小
+
+超过内存预算的大画布自动走这条路径（只支持能按行写入的格式，其他格式仍整幅渲染）。
+条带是覆盖率画布（L模式），像素值直接作为调色板索引写出，不做任何着色转换；
+有文字效果时每条上下多渲染效果外扩的行数，合成后裁回条带，写出RGB/RGBA像素。
+"""
+from PIL import Image
+import struct
+import math
+import zlib
+import time
+import os
+
+import encoder
+import instrumentation
+import renderer
+
+# 支持流式写入的格式
+STRIP_FORMATS = {"PNG", "BMP", "TIFF"}
+
+# 默认条带高度（行数，必须是偶数，见draw_layout_lines的坐标取整）
+STRIP_HEIGHT = 512
+
+# 整幅渲染内存预算（MB）的默认值，可用环境变量 TEXT2PIC_MEMORY_MB 设置
+DEFAULT_MEMORY_MB = 256
+
+# 整幅渲染的内存预算（字节），第一次用到时由memory_budget()读取环境变量
+MEMORY_BUDGET = None
+
+# 各编码档位对应的zlib压缩级别
+ZLIB_LEVELS = {"快速": 1, "均衡": 6, "最小": 9}
+
+
+def set_memory_budget(megabytes):
+    """设置整幅渲染的内存预算（MB）"""
+    global MEMORY_BUDGET
+    MEMORY_BUDGET = int(megabytes) * 1024 * 1024
+
+
+def memory_budget():
+    """整幅渲染的内存预算（字节）；环境变量 TEXT2PIC_MEMORY_MB 不是非负整数时打印警告并使用默认值"""
+    global MEMORY_BUDGET
+    if MEMORY_BUDGET is None:
+        value = os.environ.get("TEXT2PIC_MEMORY_MB", "").strip()
+        megabytes = DEFAULT_MEMORY_MB
+        if value:
+            try:
+                megabytes = int(value)
+                if megabytes < 0:
+                    raise ValueError(value)
+            except ValueError:
+                print(f"警告: 环境变量 TEXT2PIC_MEMORY_MB 的值无效（{value}），使用默认值 {DEFAULT_MEMORY_MB} MB")
+                megabytes = DEFAULT_MEMORY_MB
+        MEMORY_BUDGET = megabytes * 1024 * 1024
+    return MEMORY_BUDGET
+
+
+def estimate_bytes(width, height, format_type, effects=None):
+    """整幅渲染的峰值内存估计：覆盖率画布，JPG/WEBP编码前或合成效果时还要展开为RGB/RGBA"""
+    per_pixel = 1 if format_type in encoder.PALETTE_FORMATS and not effects else 5
+    return width * height * per_pixel
+
+
+def use_strips(width, height, format_type, effects=None):
+    """画布超过内存预算且格式支持流式写入时返回True"""
+    return format_type in STRIP_FORMATS and estimate_bytes(width, height, format_type, effects) > memory_budget()
+
+
+class StripDocument:
+    """分条渲染的图片：保存排版结果，保存时才逐条光栅化，内存中最多只有一条"""
+
+    def __init__(self, text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                 start_y, band_height=STRIP_HEIGHT, use_glyph_cache=True, effects=None):
+        self.layout = text_layout
+        self.width = width
+        self.height = height
+        self.format_type = format_type
+        self.text_color, self.bg_color = renderer._check_colors(text_color, bg_color)
+        self.bg_transparent = format_type in ("PNG", "TIFF") and bg_transparent
+        self.start_y = start_y
+        self.band_height = max(2, band_height - band_height % 2)
+        self.use_glyph_cache = use_glyph_cache
+        self.effects = effects if effects is not None and effects.enabled else None
+        self.text_box = renderer.text_block_box(text_layout, width, start_y)
+
+    @property
+    def band_count(self):
+        return math.ceil(self.height / self.band_height)
+
+    @property
+    def band_mode(self):
+        """条带的图片模式：无效果时为覆盖率（按调色板写出），有效果时为RGB或RGBA"""
+        if self.effects is None:
+            return "P"
+        return "RGBA" if self.bg_transparent else "RGB"
+
+    def palette(self):
+        """条带像素（覆盖率）对应的调色板 (数据, 原始模式)"""
+        return renderer.mask_palette(self.text_color, self.bg_color, self.bg_transparent)
+
+    def line_range(self, top, bottom):
+        """可能与 [top, bottom) 相交的行范围（上下各留一个字号的余量，容纳超出行框的字形）"""
+        advance = self.layout.line_advance
+        pad = self.layout.font_size
+        first = max(0, int((top - pad - self.start_y) // advance))
+        last = min(len(self.layout.lines), int(math.ceil((bottom + pad - self.start_y) / advance)) + 1)
+        return first, max(first, last)
+
+    def render_mask(self, top, bottom):
+        """光栅化画布中 [top, bottom) 的行，返回L模式的覆盖率图片（top必须是偶数）"""
+        band = renderer.create_mask_canvas(self.width, bottom - top)
+        first, last = self.line_range(top, bottom)
+        renderer.draw_layout_lines(band, self.layout, first, last, self.start_y, self.text_color, self.use_glyph_cache,
+                                   origin_y=top, canvas_height=self.height, first_top_index=0)
+        return band
+
+    def render_band(self, top):
+        """光栅化从top开始的一条：无效果时返回L模式的覆盖率图片，有效果时返回合成后的RGB/RGBA图片"""
+        bottom = min(top + self.band_height, self.height)
+        if self.effects is None:
+            return self.render_mask(top, bottom)
+        # 上下多渲染效果外扩的行数，跨越条带边界的描边和阴影与整幅渲染一致
+        pad = self.effects.padding
+        mask_top = max(0, top - pad)
+        mask_top -= mask_top % 2
+        mask_bottom = min(self.height, bottom + pad)
+        image = self.effects.apply(self.render_mask(mask_top, mask_bottom), self.text_color, self.bg_color,
+                                   self.bg_transparent, origin_y=mask_top, canvas_height=self.height,
+                                   text_box=self.text_box)
+        return image.crop((0, top - mask_top, self.width, bottom - mask_top))
+
+    def iter_bands(self, progress_callback=None, should_cancel=None):
+        """按从上到下的顺序逐条产出 (top, 条带)"""
+        for index in range(self.band_count):
+            if should_cancel is not None and should_cancel():
+                raise renderer.RenderCancelled()
+            top = index * self.band_height
+            yield top, self.render_band(top)
+            if progress_callback:
+                progress_callback((index + 1) / self.band_count * 100)
+
+    def to_image(self):
+        """拼接为整幅图片（仅用于小图或调试）"""
+        if self.effects is not None:
+            image = Image.new(self.band_mode, (self.width, self.height))
+        else:
+            image = renderer.create_mask_canvas(self.width, self.height)
+        for top, band in self.iter_bands():
+            image.paste(band, (0, top))
+        if self.effects is not None:
+            return image
+        return renderer.colorize_mask(image, self.text_color, self.bg_color, self.bg_transparent)
+
+    def write(self, fp, profile=None, progress_callback=None, should_cancel=None):
+        """逐条光栅化并写入可定位的二进制文件对象"""
+        STRIP_WRITERS[self.format_type](self, fp, profile, self.iter_bands(progress_callback, should_cancel))
+
+    def save(self, filename, profile=None, progress_callback=None, should_cancel=None, trace=None):
+        """逐条写入文件，返回EncodeResult；trace不为None时记录分条渲染和编码的总耗时"""
+        start = time.perf_counter()
+        with open(filename, "wb") as fp:
+            self.write(fp, profile, progress_callback, should_cancel)
+        seconds = time.perf_counter() - start
+        size_bytes = os.path.getsize(filename)
+        if trace is not None:
+            trace.stages["strips"] = trace.stages.get("strips", 0.0) + seconds
+            trace.info["output_bytes"] = size_bytes
+            trace.count("bands", self.band_count)
+        return encoder.EncodeResult(filename, size_bytes, seconds, encoder.resolve_profile(self.format_type, profile))
+
+
+def _png_chunk(fp, chunk_type, data):
+    fp.write(struct.pack(">I", len(data)))
+    fp.write(chunk_type)
+    fp.write(data)
+    fp.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def write_png(document, fp, profile, bands):
+    """8位调色板PNG（有效果时为RGB/RGBA）：每行不做滤波，逐条压缩写入IDAT"""
+    mode = document.band_mode
+    fp.write(b"\x89PNG\r\n\x1a\n")
+    color_type = {"P": 3, "RGB": 2, "RGBA": 6}[mode]
+    _png_chunk(fp, b"IHDR", struct.pack(">IIBBBBB", document.width, document.height, 8, color_type, 0, 0, 0))
+    if mode == "P":
+        palette, rawmode = document.palette()
+        if rawmode == "RGBA":
+            _png_chunk(fp, b"PLTE", bytes(v for i, v in enumerate(palette) if i % 4 != 3))
+            _png_chunk(fp, b"tRNS", bytes(palette[3::4]))
+        else:
+            _png_chunk(fp, b"PLTE", bytes(palette))
+
+    level = ZLIB_LEVELS.get(encoder.resolve_profile("PNG", profile), 6)
+    compressor = zlib.compressobj(level)
+    stride = document.width * {"P": 1, "RGB": 3, "RGBA": 4}[mode]
+    for _, band in bands:
+        data = band.tobytes()
+        rows = bytearray()
+        for offset in range(0, len(data), stride):
+            rows.append(0)  # 滤波类型：无
+            rows += data[offset:offset + stride]
+        compressed = compressor.compress(bytes(rows))
+        if compressed:
+            _png_chunk(fp, b"IDAT", compressed)
+    _png_chunk(fp, b"IDAT", compressor.flush())
+    _png_chunk(fp, b"IEND", b"")
+
+
+def write_bmp(document, fp, profile, bands):
+    """8位调色板BMP（有效果时为24位）：行从下到上存放，每条写到文件中对应的位置"""
+    width, height = document.width, document.height
+    paletted = document.band_mode == "P"
+    row_bytes = width if paletted else width * 3
+    stride = (row_bytes + 3) & ~3
+    header_size = 14 + 40 + (256 * 4 if paletted else 0)
+    fp.write(b"BM" + struct.pack("<IHHI", header_size + stride * height, 0, 0, header_size))
+    fp.write(struct.pack("<IiiHHIIiiII", 40, width, height, 1, 8 if paletted else 24, 0, stride * height,
+                         2835, 2835, 256 if paletted else 0, 0))
+    if paletted:
+        palette, _ = document.palette()
+        fp.write(bytes(v for i in range(256) for v in (palette[i * 3 + 2], palette[i * 3 + 1], palette[i * 3], 0)))
+    padding = b"\x00" * (stride - row_bytes)
+    for top, band in bands:
+        data = band.tobytes() if paletted else band.tobytes("raw", "BGR")
+        rows = [data[offset:offset + row_bytes] + padding for offset in range(0, len(data), row_bytes)]
+        rows.reverse()
+        fp.seek(header_size + (height - top - len(rows)) * stride)
+        fp.write(b"".join(rows))
+
+
+def write_tiff(document, fp, profile, bands):
+    """TIFF（Deflate压缩，每条一个strip）：不透明时为8位调色板，透明背景时为RGBA，有效果时为RGB/RGBA"""
+    width, height = document.width, document.height
+    mode = document.band_mode
+    if mode == "P":
+        palette, rawmode = document.palette()
+        if rawmode == "RGBA":
+            mode = "RGBA"  # 透明背景的覆盖率条带先按调色板展开
+    transparent = mode == "RGBA"
+    samples = len(mode) if mode != "P" else 1
+    level = ZLIB_LEVELS.get(encoder.resolve_profile("PNG", profile), 6)
+
+    fp.write(b"II*\x00\x00\x00\x00\x00")  # IFD偏移最后回填
+    offsets, counts = [], []
+    for _, band in bands:
+        if band.mode == "L" and mode != "P":
+            band.putpalette(palette, rawmode)
+            band = band.convert(mode)
+        data = zlib.compress(band.tobytes(), level)
+        offsets.append(fp.tell())
+        counts.append(len(data))
+        fp.write(data)
+
+    def write_array(fmt, values):
+        """把超过4字节的标签值写到文件中，返回偏移"""
+        if fp.tell() % 2:
+            fp.write(b"\x00")
+        offset = fp.tell()
+        fp.write(struct.pack(f"<{len(values)}{fmt}", *values))
+        return offset
+
+    SHORT, LONG = 3, 4
+    entries = []
+
+    def add(tag, field_type, values):
+        if field_type == SHORT and len(values) <= 2:
+            value = struct.pack(f"<{len(values)}H", *values).ljust(4, b"\x00")
+        elif field_type == LONG and len(values) == 1:
+            value = struct.pack("<I", values[0])
+        else:
+            value = struct.pack("<I", write_array("H" if field_type == SHORT else "I", values))
+        entries.append(struct.pack("<HHI", tag, field_type, len(values)) + value)
+
+    add(256, LONG, [width])
+    add(257, LONG, [height])
+    add(258, SHORT, [8] * samples)
+    add(259, SHORT, [8])  # Deflate
+    add(262, SHORT, [3 if mode == "P" else 2])  # 调色板 / RGB
+    add(273, LONG, offsets)
+    add(277, SHORT, [samples])
+    add(278, LONG, [document.band_height])
+    add(279, LONG, counts)
+    if transparent:
+        add(338, SHORT, [2])  # 非预乘透明通道
+    elif mode == "P":
+        # 调色板：先全部红色、再绿色、再蓝色，16位
+        add(320, SHORT, [palette[i * 3 + c] * 257 for c in range(3) for i in range(256)])
+
+    if fp.tell() % 2:
+        fp.write(b"\x00")
+    ifd_offset = fp.tell()
+    fp.write(struct.pack("<H", len(entries)))
+    fp.write(b"".join(entries))
+    fp.write(struct.pack("<I", 0))
+    fp.seek(4)
+    fp.write(struct.pack("<I", ifd_offset))
+
+
+STRIP_WRITERS = {"PNG": write_png, "BMP": write_bmp, "TIFF": write_tiff}
+
+
+def strip_document(text, width, height, format_type, text_color, bg_color, bg_transparent, font_size_param,
+                   auto_height=False, trace=None, band_height=STRIP_HEIGHT, effects=None):
+    """排版并返回StripDocument（与render_text_image/render_auto_height的画面相同）"""
+    trace = instrumentation.ensure_trace(trace)
+    text_layout = renderer.compute_layout(text, width, font_size_param, trace)
+    if auto_height:
+        height = renderer.auto_height(text_layout, format_type)
+    return _document_for_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                                trace, band_height, effects)
+
+
+def _document_for_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent, trace,
+                         band_height=STRIP_HEIGHT, effects=None):
+    # 垂直居中，与render_layout相同
+    start_y = max(renderer.MARGIN, (height - text_layout.total_height) / 2)
+    trace.info.update({"width": width, "height": height, "format": format_type, "strips": True})
+    return StripDocument(text_layout, width, height, format_type, text_color, bg_color, bg_transparent, start_y,
+                         band_height, effects=effects)
+
+
+def render_or_strips(text, width, height, format_type, text_color, bg_color, bg_transparent, font_size_param,
+                     auto_height=False, progress_callback=None, trace=None, should_cancel=None, effects=None):
+    """排版后按内存预算选择：预算内整幅渲染返回图片，超出预算返回StripDocument（保存时逐条渲染）"""
+    trace = instrumentation.ensure_trace(trace)
+    text_layout = renderer.compute_layout(text, width, font_size_param, trace)
+    if auto_height:
+        height = renderer.auto_height(text_layout, format_type)
+    return layout_or_strips(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                            progress_callback, trace, should_cancel, effects)
+
+
+def layout_or_strips(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                     progress_callback=None, trace=None, should_cancel=None, effects=None):
+    """已排版的文字按内存预算选择整幅渲染（返回图片）或分条渲染（返回StripDocument）"""
+    trace = instrumentation.ensure_trace(trace)
+    if use_strips(width, height, format_type, effects):
+        if progress_callback:
+            progress_callback(100)
+        return _document_for_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                                    trace, effects=effects)
+    return renderer.render_layout(text_layout, width, height, format_type, text_color, bg_color, bg_transparent,
+                                  progress_callback, trace=trace, should_cancel=should_cancel, effects=effects)
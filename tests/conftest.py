@@ -0,0 +1,30 @@
+"""测试：模块都在仓库根目录，从这里导入"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import font_index
+import instrumentation
+import render_cache
+import strips
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(tmp_path, monkeypatch):
+    """字体索引和渲染缓存写到临时目录；命令行和批量转换改动的模块设置在测试结束后恢复"""
+    index_path = str(tmp_path / "font_index.json")
+    cache_dir = str(tmp_path / "cache")
+    # 环境变量给工作进程和重新读取设置的代码用，模块变量给已导入的模块用
+    monkeypatch.setenv("TEXT2PIC_FONT_INDEX", index_path)
+    monkeypatch.setenv("TEXT2PIC_CACHE", cache_dir)
+    monkeypatch.setattr(font_index, "INDEX_PATH", index_path)
+    monkeypatch.setattr(font_index, "_index", font_index.FontIndex(index_path))
+    monkeypatch.setattr(render_cache, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(render_cache, "_caches", {})
+    monkeypatch.setattr(render_cache, "CACHE_MAX_BYTES", render_cache.CACHE_MAX_BYTES)
+    monkeypatch.setattr(strips, "MEMORY_BUDGET", strips.MEMORY_BUDGET)
+    monkeypatch.setattr(instrumentation, "VERBOSE", instrumentation.VERBOSE)
+    monkeypatch.setattr(instrumentation, "TIMINGS_DIR", instrumentation.TIMINGS_DIR)
@@ -0,0 +1,62 @@
+"""动画不支持的选项组合报错，而不是静默忽略"""
+import pytest
+
+import animation
+import batch
+import bulk
+import effects
+import main
+import strips
+
+OPTIONS = {"width": 320, "height": 200, "format_type": "GIF", "text_color": (0, 0, 0), "bg_color": (255, 255, 255),
+           "bg_transparent": False, "font_size": 24, "animation": "打字机"}
+
+
+@pytest.mark.parametrize("extra", [
+    {"effects": effects.from_options({"outline": 2})},
+    {"bg_transparent": True},
+    {"all_presets": True},
+])
+def test_batch_rejects_unsupported_animation_options(tmp_path, extra):
+    with pytest.raises(ValueError):
+        batch.render_text("动画", str(tmp_path), "clip", dict(OPTIONS, **extra))
+    assert not (tmp_path / "clip.gif").exists()
+
+
+@pytest.mark.parametrize("columns", [{"outline": "2"}, {"transparent": "yes"}])
+def test_bulk_rejects_unsupported_animation_columns(tmp_path, columns):
+    row = dict({"text": "动画", "animate": "typewriter"}, **columns)
+    with pytest.raises(ValueError):
+        bulk.row_job(1, row, dict(OPTIONS, animation=None), str(tmp_path))
+
+
+def test_cli_rejects_animation_with_effects(tmp_path, capsys):
+    source = tmp_path / "a.txt"
+    source.write_text("动画", encoding="utf-8")
+    argv = ["batch", str(source), "-o", str(tmp_path / "out"), "-f", "GIF", "--animate", "typewriter"]
+    assert main.cli(argv + ["--outline", "2"]) == 2
+    assert "动画不支持文字效果" in capsys.readouterr().err
+    assert main.cli(argv + ["--no-cache"]) == 0
+
+
+def test_long_webp_rejected_before_rendering(tmp_path, monkeypatch):
+    monkeypatch.setattr(strips, "MEMORY_BUDGET", 64 * 1024 * 1024)
+    options = dict(OPTIONS, format_type="WEBP", width=1920, height=1080, animation_duration=60)
+    with pytest.raises(ValueError, match="WEBP动画"):
+        batch.render_text("动画", str(tmp_path), "clip", options)
+    assert not (tmp_path / "clip.webp").exists()
+    row = {"text": "动画", "animate": "scroll", "format": "WEBP", "resolution": "1920x1080", "duration": "60"}
+    with pytest.raises(ValueError, match="WEBP动画"):
+        bulk.row_job(1, row, dict(OPTIONS, animation=None), str(tmp_path))
+    # GIF逐帧写入，不受内存预算限制；短的WEBP动画在预算内
+    animation.check_options(format_type="GIF", width=1920, height=1080, duration=60)
+    animation.check_options(format_type="WEBP", width=320, height=200, duration=4)
+
+
+def test_cli_rejects_long_webp(tmp_path, capsys):
+    source = tmp_path / "a.txt"
+    source.write_text("动画", encoding="utf-8")
+    argv = ["batch", str(source), "-o", str(tmp_path / "out"), "-f", "WEBP", "--animate", "scroll",
+            "--duration", "600", "--memory-budget", "64"]
+    assert main.cli(argv) == 2
+    assert "WEBP动画" in capsys.readouterr().err
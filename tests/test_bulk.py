@@ -0,0 +1,45 @@
+"""数据批量转换：输出名校验和检查点"""
+import json
+import os
+
+import pytest
+
+import bulk
+import main
+import render_cache
+
+DEFAULTS = {"width": 640, "height": 480, "format_type": "PNG"}
+
+
+@pytest.mark.parametrize("output, expected", [
+    ("..notes.png", "..notes"),
+    ("sub/dir/card.png", "sub/dir/card"),
+    ("sub/../card", "card"),
+])
+def test_output_name_inside_output_dir(tmp_path, output, expected):
+    _, name, _ = bulk.row_job(1, {"text": "文字", "output": output}, DEFAULTS, str(tmp_path))
+    assert name.replace("\\", "/") == expected
+
+
+@pytest.mark.parametrize("output", ["../x.png", "sub/../../x.png", "/etc/x.png", ".", "sub/.."])
+def test_output_name_escaping_output_dir(tmp_path, output):
+    with pytest.raises(ValueError):
+        bulk.row_job(1, {"text": "文字", "output": output}, DEFAULTS, str(tmp_path))
+
+
+def test_resume_restores_counters(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(render_cache, "CACHE_DIR", "")
+    input_path = tmp_path / "rows.csv"
+    input_path.write_text("text,output\n第一行,a\n,b\n第三行,c\n第四行,d\n", encoding="utf-8")
+    output_dir = tmp_path / "out"
+    argv = ["bulk", str(input_path), "-o", str(output_dir), "-r", "320x200", "-j", "1", "--no-cache"]
+    assert main.cli(argv) == 1
+    assert "成功 3 行, 失败 1 行" in capsys.readouterr().out
+
+    # 模拟在第2行之后中断：第1行成功、第2行（文字为空）失败
+    checkpoint = {"input": os.path.abspath(input_path), "next_row": 3, "succeeded": 1, "failed": 1}
+    (output_dir / bulk.CHECKPOINT_NAME).write_text(json.dumps(checkpoint), encoding="utf-8")
+    assert main.cli(argv + ["--resume"]) == 1
+    assert "成功 3 行, 失败 1 行, 从检查点跳过 2 行" in capsys.readouterr().out
+    saved = json.loads((output_dir / bulk.CHECKPOINT_NAME).read_text(encoding="utf-8"))
+    assert (saved["next_row"], saved["succeeded"], saved["failed"]) == (5, 3, 1)
@@ -0,0 +1,23 @@
+"""环境变量中的大小设置：在第一次用到时读取，值无效时使用默认值而不是导入失败"""
+import render_cache
+import strips
+
+
+def test_cache_mb_invalid_falls_back(monkeypatch, capsys):
+    monkeypatch.setenv("TEXT2PIC_CACHE_MB", "lots")
+    monkeypatch.setattr(render_cache, "CACHE_MAX_BYTES", None)
+    assert render_cache.cache_max_bytes() == render_cache.DEFAULT_CACHE_MB * 1024 * 1024
+    assert "TEXT2PIC_CACHE_MB" in capsys.readouterr().out
+
+
+def test_cache_mb_from_environment(monkeypatch):
+    monkeypatch.setenv("TEXT2PIC_CACHE_MB", "64")
+    monkeypatch.setattr(render_cache, "CACHE_MAX_BYTES", None)
+    assert render_cache.RenderCache("unused").max_bytes == 64 * 1024 * 1024
+
+
+def test_memory_mb_invalid_falls_back(monkeypatch, capsys):
+    monkeypatch.setenv("TEXT2PIC_MEMORY_MB", "1.5")
+    monkeypatch.setattr(strips, "MEMORY_BUDGET", None)
+    assert strips.memory_budget() == strips.DEFAULT_MEMORY_MB * 1024 * 1024
+    assert "TEXT2PIC_MEMORY_MB" in capsys.readouterr().out
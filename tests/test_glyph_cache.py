@@ -0,0 +1,17 @@
+"""字形缓存贴图与ImageDraw.text直接绘制逐像素一致"""
+from PIL import ImageChops
+import pytest
+
+import renderer
+
+TEXT = "Hello, World! 居中的一行\nTypography AVAWAy 0123\niiiii llll Wa.Te,"
+
+
+@pytest.mark.parametrize("width, height", [(801, 301), (803, 300), (1279, 719)])
+@pytest.mark.parametrize("font_size", [13, 24, 41])
+def test_centred_text_matches_direct_drawing(width, height, font_size):
+    # 奇数宽高让居中的行起点落在半像素上
+    images = [renderer.render_text_image(TEXT, width, height, "PNG", (0, 0, 0), (255, 255, 255), False, font_size,
+                                         use_glyph_cache=use_glyph_cache)
+              for use_glyph_cache in (True, False)]
+    assert ImageChops.difference(images[0].convert("RGB"), images[1].convert("RGB")).getbbox() is None
@@ -0,0 +1,66 @@
+"""界面保存：转换后换了格式时，渲染缓存按保存时的格式读写"""
+import tkinter.filedialog
+import types
+
+import gui
+import render_cache
+import renderer
+
+PNG_MAGIC = b"\x89PNG"
+JPG_MAGIC = b"\xff\xd8"
+
+
+class _Var:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _Widget:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _Encoder:
+    """同步执行保存任务"""
+
+    def submit(self, job, on_progress=None, on_done=None):
+        job(lambda value: None)
+
+
+def _fake_app(image, params, format_type):
+    return types.SimpleNamespace(generated_image=image, render_params=params, last_trace=None,
+                                 image_format=_Var(format_type), encoder_profile=_Var("均衡"),
+                                 bg_color=params["bg_color"], save_button=_Widget(), progress_bar=_Widget(),
+                                 convert_button=_Widget(), status_label=_Widget(), root=_Widget(),
+                                 background_encoder=_Encoder(), update_save_progress=None)
+
+
+def _save(app, filename, monkeypatch):
+    monkeypatch.setattr(tkinter.filedialog, "asksaveasfilename", lambda **kwargs: str(filename))
+    gui.TextToImageApp.on_save_click(app)
+    return filename.read_bytes()
+
+
+def test_format_changed_between_convert_and_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    params = {"text": "保存格式 Save format", "width": 320, "height": 200, "format_type": "PNG",
+              "text_color": (0, 0, 0), "bg_color": (255, 255, 255), "bg_transparent": False, "font_size": 24,
+              "page_mode": "固定尺寸", "effects": None}
+    image = renderer.render_text_image(params["text"], 320, 200, "PNG", (0, 0, 0), (255, 255, 255), False, 24)
+
+    # 按转换时的格式保存一次，PNG结果写入缓存
+    assert _save(_fake_app(image, params, "PNG"), tmp_path / "a.png", monkeypatch).startswith(PNG_MAGIC)
+
+    # 转换后改选JPG再保存：不能命中PNG的缓存条目
+    assert _save(_fake_app(image, params, "JPG"), tmp_path / "b.jpg", monkeypatch).startswith(JPG_MAGIC)
+
+    # JPG的结果也不能写到PNG的键下
+    cache = render_cache.get_cache()
+    png_key = render_cache.render_key(profile="均衡", **params)
+    jpg_key = render_cache.render_key(profile="均衡", **dict(params, format_type="JPG"))
+    assert cache.get(png_key).startswith(PNG_MAGIC)
+    assert cache.get(jpg_key).startswith(JPG_MAGIC)
+    assert _save(_fake_app(image, params, "PNG"), tmp_path / "c.png", monkeypatch).startswith(PNG_MAGIC)
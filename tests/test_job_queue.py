@@ -0,0 +1,81 @@
+"""转换任务队列：优先级和取消"""
+import threading
+
+import job_queue
+
+
+def test_interactive_job_runs_before_queued_batch_job():
+    queue = job_queue.JobQueue(workers=1)
+    release = threading.Event()
+    order = []
+
+    def record(name):
+        def func(job):
+            order.append(name)
+        return func
+
+    # 先占住唯一的工作线程，让后面的任务排队
+    blocker = queue.submit(lambda job: release.wait(10), "blocker")
+    batch = queue.submit(record("batch"), "batch", job_queue.PRIORITY_BATCH)
+    interactive = queue.submit(record("interactive"), "interactive", job_queue.PRIORITY_INTERACTIVE)
+    release.set()
+
+    done = threading.Event()
+    queue.on_update = lambda job: job is batch and job.status == job_queue.JOB_DONE and done.set()
+    if batch.status != job_queue.JOB_DONE:
+        assert done.wait(10)
+    assert order == ["interactive", "batch"]
+    assert blocker.status == interactive.status == job_queue.JOB_DONE
+
+
+def test_cancel_during_run_ignoring_flag_stays_cancelled():
+    queue = job_queue.JobQueue(workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def func(job):
+        # 不检查should_cancel()的任务
+        started.set()
+        release.wait(10)
+        return "result"
+
+    finished = threading.Event()
+    queue.on_update = lambda job: job.finished is not None and finished.set()
+    job = queue.submit(func, "ignores cancel")
+    assert started.wait(10)
+    queue.cancel(job.job_id)
+    release.set()
+    assert finished.wait(10)
+    assert job.status == job_queue.JOB_CANCELLED
+    assert job.result is None
+
+
+def test_cancel_racing_with_job_start():
+    # 工作线程检查should_cancel()之后、改为转换中之前，另一个线程取消任务：
+    # 一旦报告为已取消，之后不能再变成转换中或已完成
+    updates = []
+    queue = job_queue.JobQueue(workers=1)
+    release = threading.Event()
+    blocker = queue.submit(lambda job: release.wait(10), "blocker")
+    cancelled = threading.Event()
+    job = queue.submit(lambda job: cancelled.wait(10) and "result", "racing")
+    queue.on_update = lambda updated: updated is job and updates.append(updated.status)
+    check = job.should_cancel
+
+    def should_cancel():
+        result = check()
+        canceller = threading.Thread(target=lambda: queue.cancel(job.job_id) and cancelled.set())
+        canceller.start()
+        canceller.join(0.2)
+        return result
+
+    job.should_cancel = should_cancel
+    release.set()
+    for _ in range(1000):
+        if job.finished is not None and blocker.finished is not None:
+            break
+        threading.Event().wait(0.01)
+    assert updates[-1] == job.status == job_queue.JOB_CANCELLED
+    after = updates[updates.index(job_queue.JOB_CANCELLED) + 1:]
+    assert job_queue.JOB_RUNNING not in after and job_queue.JOB_DONE not in after, updates
+    assert job.result is None
@@ -0,0 +1,23 @@
+"""步进宽度缓存：按字体和字号的LRU上限"""
+from collections import OrderedDict
+
+import font_cache
+import layout
+
+
+def test_advance_caches_bounded_lru(monkeypatch):
+    monkeypatch.setattr(layout, "MAX_ADVANCE_CACHES", 3)
+    monkeypatch.setattr(layout, "_advance_caches", OrderedDict())
+    monkeypatch.setattr(layout, "_advance_evictions", 0)
+    fonts = [font_cache.get_font(size) for size in (10, 11, 12, 13)]
+    first = layout.get_advance_cache(fonts[0])
+    layout.get_advance_cache(fonts[1])
+    layout.get_advance_cache(fonts[2])
+    # 再次使用第一个字体，它成为最近使用的，淘汰的是第二个
+    assert layout.get_advance_cache(fonts[0]) is first
+    layout.get_advance_cache(fonts[3])
+    stats = layout.advance_cache_stats()
+    assert stats == {"size": 3, "maxsize": 3, "evictions": 1}
+    assert layout.get_advance_cache(fonts[0]) is first
+    assert layout.get_advance_cache(fonts[1]).width_of("A") == fonts[1].getlength("A")
+    assert layout.advance_cache_stats()["evictions"] == 2
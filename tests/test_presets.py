@@ -0,0 +1,27 @@
+"""全部预设：字号和文字效果按宽度等比缩放"""
+from PIL import Image
+
+import effects
+import presets
+
+OUTLINE = (255, 0, 0)
+
+
+def _outline_width(path):
+    """图片中间一行里文字左侧描边的像素数"""
+    image = Image.open(path).convert("RGB")
+    row = [image.getpixel((x, image.height // 2)) for x in range(image.width)]
+    start = next(x for x, (r, g, b) in enumerate(row) if r > 200 and g < 80 and b < 80)
+    end = next(x for x in range(start, len(row)) if row[x][0] < 128)
+    return end - start
+
+
+def test_outline_scales_with_preset_width(tmp_path):
+    options = {"width": 400, "font_size": 60, "format_type": "PNG", "text_color": (0, 0, 0),
+               "bg_color": (255, 255, 255), "bg_transparent": False, "page_mode": "固定尺寸",
+               "effects": effects.from_options({"outline": 4, "outline_color": OUTLINE})}
+    results = presets.render_presets("l", str(tmp_path), "bar", options, resolutions=["400x300", "1200x900"],
+                                     workers=1)
+    widths = {width: _outline_width(filename) for width, _, filename, error in results if not error}
+    assert set(widths) == {400, 1200}
+    assert abs(widths[1200] - 3 * widths[400]) <= 2, widths
@@ -0,0 +1,57 @@
+"""渲染服务：合批策略和请求参数校验"""
+import http.client
+import threading
+import json
+
+import pytest
+
+import render_cache
+import service
+
+
+def test_concurrent_requests_spread_across_workers(monkeypatch):
+    # 不用磁盘缓存，每个请求都进入队列
+    monkeypatch.setattr(render_cache, "CACHE_DIR", "")
+    # 合批窗口足够长，所有请求都能在同一个窗口内到达
+    render_service = service.RenderService(workers=4, batch_window=0.2, warm_font_sizes=[24])
+    try:
+        jobs = [service.parse_job({"text": f"请求 {i}", "width": 320, "height": 200, "font_size": 24})
+                for i in range(8)]
+        futures = [render_service.submit(job) for job in jobs]
+        for future in futures:
+            assert future.result(60)
+        stats = render_service.stats()
+        # 8个请求分给4个工作进程，不合并成同一批
+        assert stats["completed"] == 8
+        assert stats["batches"] >= 4
+        assert stats["busy_workers"] == 0
+    finally:
+        render_service.close()
+
+
+@pytest.mark.parametrize("profile", ["没有这个档位", ["最小"], 9, "无损"])
+def test_invalid_profile_is_rejected(profile):
+    # 无损只是WEBP的档位
+    with pytest.raises(ValueError):
+        service.parse_job({"text": "档位", "format": "PNG", "profile": profile})
+
+
+def test_invalid_profile_returns_400():
+    # 参数在提交给渲染服务之前校验，用不到真正的工作进程池
+    server = service.make_server(port=0, service=object())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+        connection.request("POST", "/render", json.dumps({"text": "档位", "profile": ["最小"]}))
+        response = connection.getresponse()
+        assert response.status == 400
+        assert "档位" in json.loads(response.read())["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_valid_profile_is_accepted():
+    assert service.parse_job({"text": "档位", "format": "WEBP", "profile": "无损"})["profile"] == "无损"
+    assert service.parse_job({"text": "档位"})["profile"] is None